@@ -4,7 +4,7 @@ Project Name: web_crawler
 File Created: 2025.06.09
 Author: ZhangYuetao
 File Name: config.py
-Update: 2025.06.16
+Update: 2026.10.18
 """
 
 import os
@@ -17,10 +17,19 @@ USER_AGENTS_PATH = 'settings/lake/user_agents.txt'
 PROXIES_PATH = 'settings/lake/proxies.txt'
 
 USED_URLS_DIR_PATH = 'history'
+MEDIA_INDEX_PATH = 'history/media_index.db'
+PHASH_INDEX_DIR_PATH = 'history/phash_index'
+HTTP_CACHE_PATH = 'history/http_cache.db'
+HISTORY_DB_PATH = 'history/history.db'
+HISTORY_INDEX_DIR_PATH = 'history/url_index'
+PAGE_ARCHIVE_DIR_PATH = 'history/page_archive'
 LOG_FOLDER_PATH = 'logs'
 
 BASIC_SETTING_PATH = 'settings/basic_setting.toml'
 CHROME_SETTING_PATH = 'settings/chrome_setting.toml'
+NETWORK_SETTING_PATH = 'settings/network_setting.toml'
+STORAGE_SETTING_PATH = 'settings/storage_setting.toml'
+MEDIA_SETTING_PATH = 'settings/media_setting.toml'
 LOAD_COOKIES_PATH = 'settings/cookies/load_cookies.toml'
 
 BILIBILI_COOKIE_PATH = 'settings/cookies/www.bilibili_com.txt'
@@ -43,6 +52,76 @@ CHROME_SETTING_DEFAULT_CONFIG = {
     'port': '9222',
 }
 
+NETWORK_SETTING_DEFAULT_CONFIG = {
+    'pool_connections': 16,  # 每个会话缓存的连接池数量
+    'pool_maxsize': 32,  # 每个连接池保持的最大连接数
+    'pool_block': False,  # 连接池耗尽时是否阻塞等待
+    'keep_alive': True,  # 是否复用长连接
+    'max_sessions': 256,  # 最多缓存的会话数量（按 主机+代理 区分）
+    'max_concurrency': 128,  # 并发下载的全局最大任务数
+    'per_host_concurrency': 16,  # 并发下载时单个主机的最大任务数
+    'download_threads': 32,  # 并发下载的线程数（同时执行的下载任务数不超过 max_concurrency 与该值中的较小者）
+    'segment_workers': 16,  # 全部分段下载共用的线程数（同时下载的分段总数）
+    'segment_count': 4,  # 大文件分段下载的分段数量
+    'segment_threshold': 16 * 1024 * 1024,  # 启用分段下载的最小文件大小（字节）
+    'buffer_size': 1024 * 1024,  # 下载写盘缓冲区大小（字节）
+    'buffer_count': 4,  # 每个下载文件可复用的缓冲区数量
+    'image_max_size': 0,  # 图片最大字节数，超过时提前中止下载（0 表示不限制）
+    'bandwidth_limit': 0,  # 本进程全部下载的总带宽上限（字节/秒，0 表示不限速）
+    'bandwidth_burst': 4 * 1024 * 1024,  # 带宽令牌桶允许的突发字节数
+    'default_rate': 0,  # 未单独配置的域名每秒最大请求数（0 表示不限速）
+    'default_burst': 1,  # 未单独配置的域名允许的突发请求数
+    'default_jitter': 0.0,  # 未单独配置的域名每次请求额外的随机等待上限（秒）
+    'adaptive_initial_concurrency': 4,  # 自适应并发的初始单主机并发上限
+    'adaptive_min_concurrency': 1,  # 自适应并发的最小单主机并发上限
+    'adaptive_max_concurrency': 64,  # 自适应并发的最大单主机并发上限
+    'adaptive_increase': 1.0,  # 请求稳定时每轮增加的并发数（加性增长）
+    'adaptive_decrease_factor': 0.5,  # 遇到 429/403/超时时并发上限的缩小倍数（乘性下降）
+    'adaptive_latency_tolerance': 2.0,  # 平均延迟超过最低延迟的倍数时停止增长
+    'retry_max_attempts': 5,  # 下载任务的默认最大尝试次数
+    'retry_base_delay': 1.0,  # 重试指数退避的基数（秒），第 n 次失败后在 [0, 基数 × 2^n] 内随机等待
+    'retry_max_delay': 30.0,  # 重试等待时间的上限（秒）
+    'breaker_failure_threshold': 5,  # 代理或主机连续失败多少次后熔断
+    'breaker_cooldown': 60.0,  # 熔断后暂停使用的时间（秒），之后放行试探请求
+    'ytdlp_workers': 3,  # yt-dlp 并行下载的视频数量（每个线程复用一个 YoutubeDL 实例）
+    'ytdlp_concurrent_fragments': 4,  # yt-dlp 单个视频并发下载的分片数量（DASH/HLS）
+    'rate_limits': {  # 按域名限速（最长后缀匹配），同一域名下的所有线程与浏览器共享额度
+        'jd.com': {'rate': 0.25, 'burst': 1, 'jitter': 2.0},
+        'taobao.com': {'rate': 0.25, 'burst': 1, 'jitter': 2.0},
+        'video.taobao.com': {'rate': 0, 'burst': 1, 'jitter': 0.0},  # 视频 CDN 不限速
+        'tmall.com': {'rate': 0.25, 'burst': 1, 'jitter': 2.0},
+        'douyin.com': {'rate': 0.25, 'burst': 1, 'jitter': 2.0},
+        'tieba.baidu.com': {'rate': 1.0, 'burst': 1, 'jitter': 0.5},
+        'amazon.com': {'rate': 0.25, 'burst': 1, 'jitter': 2.0},
+    },
+}
+
+STORAGE_SETTING_DEFAULT_CONFIG = {
+    'dedup_mode': 'hardlink',  # 内容重复文件的处理方式：hardlink（硬链接）、manifest（仅记录清单）、off（不去重）
+    'phash_mode': 'tag',  # 近重复图片的处理方式：reject（删除）、tag（记录到 near_duplicates.txt）、off（不检查）
+    'phash_algorithm': 'dhash',  # 感知哈希算法：dhash 或 phash
+    'phash_max_distance': 6,  # 判定为近重复的最大汉明距离（64 位）
+    'archive_pages': False,  # 是否将获取到的页面压缩存档，用于修改提取规则后重新解析
+    'archive_level': 3,  # 存档压缩级别（zstd，未安装 zstandard 时使用 zlib）
+    'archive_segment_size': 256 * 1024 * 1024,  # 单个存档分段文件的大小上限（字节）
+    'history_batch_size': 500,  # 历史记录攒够多少条后批量提交到数据库
+    'history_flush_interval': 1.0,  # 历史记录最长多少秒提交一次（0 表示每条立即提交）
+    'id_block_size': 16,  # 每个进程一次从数据库预留的媒体索引数量（崩溃时最多留下这么多空号）
+    'history_merge_threshold': 65536,  # 历史记录哈希索引新增多少条后在后台合并进有序文件
+}
+
+MEDIA_SETTING_DEFAULT_CONFIG = {
+    'classify_workers': 0,  # 视频分类进程数，0 表示使用 CPU 核心数
+    'classify_sample_frames': 5,  # 每个视频均匀抽取的帧数
+    'classify_max_width': 160,  # 抽取的帧缩小后的最大宽度
+    'ir_channel_tolerance': 3.0,  # 判定为红外的通道间平均差异上限
+    'ir_saturation_threshold': 0.05,  # 判定为红外的平均饱和度上限（0~1）
+    'ffmpeg_path': 'ffmpeg',  # ffmpeg 可执行文件路径
+    'postprocess_workers': 0,  # 视频后处理（ffmpeg）进程数，0 表示使用 CPU 核心数
+    'postprocess_queue_size': 8,  # 等待后处理的视频数量上限，超过时下载线程等待
+    'postprocess_mode': 'copy',  # 去除音频的方式：copy（编码兼容 MP4 时直接复制视频流，否则重新编码）、transcode（总是重新编码）
+}
+
 
 def load_config(filepath, default):
     """
@@ -98,21 +177,6 @@ def get_save_history_path(web_name, type_name, way='get', format='images'):
     return os.path.join(dir_path, txt_name)
 
 
-def init_used_urls(used_txt_path):
-    """
-    初始化已使用的 URL 集合。
-
-    :param used_txt_path: 已使用的 URL 文件路径。
-    :return: 已使用的 URL 集合(不存在则返回空集合)。
-    """
-    try:
-        with open(used_txt_path, 'r') as url_file:
-            return set(url.strip() for url in url_file.readlines())
-    except FileNotFoundError:
-        # 如果文件不存在，创建一个空的集合
-        return set()
-
-
 def get_idx(web_name, type_name, format='images'):
     """
     获取已使用的 URL 的索引值。
@@ -132,17 +196,3 @@ def get_idx(web_name, type_name, format='images'):
     except Exception as e:
         print(f"获取已使用的 URL 的索引值失败：{e}")
         return 0
-
-
-def update_idx(web_name, type_name, format='images', idx=0):
-    """
-    更新已使用的 URL 的索引值。
-
-    :param web_name: 网站名称。
-    :param type_name: 类型名称。
-    :param format: 文件格式。
-    :param idx: 新的索引值。
-    """
-    idx_path = os.path.join(USED_URLS_DIR_PATH, web_name, type_name, f'{format}_idx.txt')
-    with open(idx_path, 'w') as f:
-        f.write(str(idx))
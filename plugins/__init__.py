@@ -7,9 +7,14 @@ Project Name: web_crawler
 File Created: 2025.06.18
 Author: ZhangYuetao
 File Name: __init__.py
-Update: 2025.06.18
+Update: 2026.10.18
 """
 
+# 导入 compact_history 模块中的函数
+from .compact_history import (
+    run,
+)
+
 # 导入 open_chrome 模块中的函数
 from .open_chrome import (
     run,
@@ -25,6 +30,9 @@ from .proxy_test import (
 
 # 定义包的公共接口
 __all__ = [
+    # compact_history
+    'run',
+
     # open_chrome
     'run',
 
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: compact_history.py
+Update: 2026.10.18
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将父目录添加到导包路径
+
+import utils
+
+"""
+get 列表整理工具
+功能：
+1. 按 URL 去重 history 下各网站、类型的 get_videos.txt、get_images.txt、get_pages.txt 等
+2. 去掉已处理（used、wrong）的记录
+3. 原子地重写文件，have_pages/have_urls 继续运行时只读取未处理的部分
+请在没有爬虫运行时使用。
+"""
+
+
+def run():
+    """
+    整理全部 get 列表。
+    """
+    remaining = utils.compact_all_get_lists()
+    utils.flush_history()
+    print(f"整理完成，剩余未处理记录 {remaining} 条")
+
+
+if __name__ == "__main__":
+    run()
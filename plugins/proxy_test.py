@@ -4,7 +4,7 @@ Project Name: web_crawler
 File Created: 2024.12.13
 Author: ZhangYuetao
 File Name: proxy_test.py
-Update: 2025.06.16
+Update: 2026.10.18
 """
 
 import sys
@@ -32,7 +32,7 @@ import utils
 # 配置区域 ================================================
 TARGET_URL = "https://www.baidu.com"  # 实际爬取的目标页面
 TIMEOUT = 30  # 单次请求超时时间（秒）
-MAX_WORKERS = 20  # 并发检测线程数
+MAX_WORKERS = 20  # 并发检测线程数上限，实际并发由目标网站的自适应并发上限控制
 PROXY_TYPE_WHITELIST = ['http', 'https', 'socks4', 'socks5']  # 允许的代理类型
 OUTPUT_FILE = "usable_proxies.txt"
 # ========================================================
@@ -90,18 +90,24 @@ def validate_proxy(proxy):
         "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
     }
 
+    limiter = utils.get_adaptive_limiter(TARGET_URL)
+
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            start = time.time()
-            response = requests.get(
-                TARGET_URL,
-                headers=headers,
-                proxies=proxies,
-                timeout=TIMEOUT,
-                allow_redirects=False
-            )
-            latency = round(time.time() - start, 2)
+            with limiter.slot():
+                start = time.time()
+                response = requests.get(
+                    TARGET_URL,
+                    headers=headers,
+                    proxies=proxies,
+                    timeout=TIMEOUT,
+                    allow_redirects=False
+                )
+                latency = round(time.time() - start, 2)
+
+                # 只报告目标网站的响应，代理自身的连接失败或超时不影响目标网站的并发上限
+                limiter.record(status_code=response.status_code, latency=latency)
 
             if response.status_code == 200:
                 if "captcha" in response.text.lower():
@@ -164,6 +170,7 @@ def run():
 
     # 结果处理
     print(f"\n检测完成，可用代理数: {len(usable_proxies)}/{len(raw_proxies)}")
+    print(f"目标网站最终并发上限: {utils.get_adaptive_limits()[urlparse(TARGET_URL).netloc]['limit']}")
     if usable_proxies:
         print("可用代理列表:")
         for p in usable_proxies:
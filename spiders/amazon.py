@@ -4,12 +4,11 @@ Project Name: web_crawler
 File Created: 2025.02.18
 Author: ZhangYuetao
 File Name: amazon.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
-import time
-import random
+import threading
 
 import requests
 from bs4 import BeautifulSoup
@@ -19,28 +18,31 @@ import utils
 import config
 from logger import logger
 
+USED_URLS_LOCK = threading.Lock()        # 用于保护 USED_VIDEO_URLS 的访问与历史记录写入
+
 WEB_NAME = 'amazon'
 
 basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-VIDEO_IDX = config.get_idx(WEB_NAME, type_name, 'videos')
+VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')  # 按块预留视频索引，线程与进程间不重复
 
-USED_VIDEO_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'))
-USED_PAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'goods'))
+USED_VIDEO_URLS = utils.HistorySet(WEB_NAME, type_name, 'videos')
+USED_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'goods')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   video_idx=VIDEO_IDX,
+                   video_idx=VIDEO_IDS.peek(),
                    used_video_urls=USED_VIDEO_URLS, used_page_urls=USED_PAGE_URLS)
 
 
 def add_idx():
     """
     增加视频索引。
+
+    :return: 本次占用的视频索引。
     """
-    global VIDEO_IDX
-    VIDEO_IDX = VIDEO_IDX + 1
+    return VIDEO_IDS.allocate()
 
 
 def search_in_amazon_shops(amazon_goods, max_pages=20, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -62,7 +64,7 @@ def search_in_amazon_shops(amazon_goods, max_pages=20, random_proxy=False, rando
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://www.amazon.com/')
+        utils.driver_get(driver, 'https://www.amazon.com/')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -83,10 +85,10 @@ def search_in_amazon_shops(amazon_goods, max_pages=20, random_proxy=False, rando
             # 加载商品详情页面
             shop_url = f"{amazon_good}/ref=cm_cr_arp_d_paging_btm_next_3" \
                     f"?ie=UTF8&reviewerType=all_reviews&mediaType=media_reviews_only&pageNumber={page+1} "
-            driver.get(shop_url)
-            time.sleep(float(round(random.uniform(4, 6), 1)))
+            utils.driver_get(driver, shop_url)
 
             page_source = driver.page_source
+            utils.archive_page(WEB_NAME, type_name, shop_url, page_source)
             soup = BeautifulSoup(page_source, 'html.parser')
 
             no_reviews_message = soup.find('span', class_='a-size-medium',
@@ -103,7 +105,6 @@ def search_in_amazon_shops(amazon_goods, max_pages=20, random_proxy=False, rando
                 if video_url and video_url.endswith('.mp4'):
                     video_urls.append(video_url)
                     
-        utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'goods'), [amazon_good])
         USED_PAGE_URLS.add(amazon_good)
         
         utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
@@ -128,14 +129,13 @@ def download_videos(video_infos, save_dir):
         logger.warning('urls empty')
         return
 
-    old_idx = VIDEO_IDX
+    old_count = VIDEO_IDS.allocated
 
-    for video_info in video_infos:
-        download_amazon_video(video_info, save_dir)
+    utils.run_downloads(video_infos, download_amazon_video, save_dir)
     
-    config.update_idx(WEB_NAME, type_name, 'videos', VIDEO_IDX)
+    VIDEO_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{VIDEO_IDX - old_idx}个视频（新计数值，VIDEO_IDX={VIDEO_IDX})")
+    logger.info(f"下载全部完成，本次共下载{VIDEO_IDS.allocated - old_count}个视频（新计数值，VIDEO_IDX={VIDEO_IDS.peek()})")
 
 
 def download_amazon_video(video_url, save_dir):
@@ -149,11 +149,14 @@ def download_amazon_video(video_url, save_dir):
         logger.info('视频链接为空，跳过下载。')
         return
 
-    if video_url in USED_VIDEO_URLS:
-        logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if video_url in USED_VIDEO_URLS:
+            logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
+            return
 
-    for i in range(3):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(video_url, max_attempts=3)
+    for i in retry:
         header = {
             'User-Agent': utils.get_random_user_agent(),
         }
@@ -163,43 +166,26 @@ def download_amazon_video(video_url, save_dir):
         }
         
         try:
-            response = requests.get(video_url, headers=header, proxies=proxies, stream=True, timeout=10)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-
-            current_time = utils.get_formatted_timestamp()
-
-            filename = f'{type_name[0].upper()}_amazon{VIDEO_IDX:05d}_{current_time}_RGB.mp4'
-
-            save_path = os.path.join(save_dir, filename)
-
-            # 将视频内容写入文件
-            with open(save_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        file.write(chunk)
-
-            # 判断视频类型
-            try:
-                video_type = utils.check_video_type(save_path)  # 调用前面定义的函数
-            except:
-                video_type = "RGB"
-
-            # 如果是 IR 视频，修改文件名
-            if video_type == "IR":
-                new_filename = filename.replace("_RGB.mp4", "_IR.mp4")
-                new_save_path = os.path.join(save_dir, new_filename)
-                os.rename(save_path, new_save_path)
-                save_path = new_save_path  # 更新路径
-
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'), [video_url])
-            USED_VIDEO_URLS.add(video_url)
-            add_idx()
-
-            logger.info(f"视频已成功下载到 {save_path}")
+            # 下载到 .part 文件（大文件分段并发），失败后的重试或重新运行时断点续传
+            part_path = utils.download_segmented_file(video_url, save_dir, headers=header, proxies=proxies, timeout=10)
+            retry.succeed(proxies)
+
+            video_idx = add_idx()
+            save_path = utils.commit_part_file(part_path, lambda: os.path.join(
+                save_dir, f'{type_name[0].upper()}_amazon{video_idx:05d}_{utils.get_formatted_timestamp()}_RGB.mp4'))
+
+            with USED_URLS_LOCK:
+                USED_VIDEO_URLS.add(video_url)
+
+            # 内容重复且只记入清单时没有生成文件，无需分类
+            if save_path is not None:
+                # 抽帧判断视频类型并在需要时改名为 _IR，由进程池异步完成，不阻塞下载线程
+                utils.submit_video_classification(save_path)
+                logger.info(f"视频已成功下载到 {save_path}")
             break
         except requests.exceptions.RequestException as e:
-            logger.warning(f"第{i}次下载失败: {e}")
-            continue
+            logger.warning(f"第{i + 1}次下载失败: {e}")
+            retry.fail(e, proxies)
 
 
 def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False, 
@@ -218,7 +204,7 @@ def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False,
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
 
     logger.info(f'========== 开始处理: {type_name} ==========')
     try:
@@ -241,8 +227,10 @@ def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False,
     except Exception as e:
         logger.error(f"[{type_name}] 抓取失败: {e}")
     logger.info(f'========== 完成: {type_name} ==========')
-    
+
+    # 等待异步的视频分类与重命名完成后再输出统计
+    utils.wait_video_classification()
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     video_idx=VIDEO_IDX,
-                     new_video_count=VIDEO_IDX-old_video_idx)
+                     video_idx=VIDEO_IDS.peek(),
+                     new_video_count=VIDEO_IDS.allocated - old_video_count)
     
\ No newline at end of file
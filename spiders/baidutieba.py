@@ -4,55 +4,60 @@ Project Name: web_crawler
 File Created: 2025.04.01
 Author: ZhangYuetao
 File Name: baidutieba.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
-import random
-import time
+import threading
 
 import requests
 import zyt_validation_utils
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from pypinyin import lazy_pinyin
 
 import utils
 import config
 from logger import logger
 
+USED_URLS_LOCK = threading.Lock()        # 用于保护 USED_IMAGE_URLS 的访问与历史记录写入
+
 WEB_NAME = 'baidutieba'
 
 basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-IMAGE_IDX = config.get_idx(WEB_NAME, type_name, 'images')
-PAGE_IDX = config.get_idx(WEB_NAME, type_name, 'pages')
+IMAGE_IDS = utils.IdAllocator(WEB_NAME, type_name, 'images')  # 按块预留图片索引，线程与进程间不重复
+PAGE_IDS = utils.IdAllocator(WEB_NAME, type_name, 'pages')  # 按块预留帖子索引，线程与进程间不重复
 
-USED_IMAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'images'))
-USED_PAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'))
+USED_IMAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'images')
+USED_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'pages')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   image_idx=IMAGE_IDX, page_idx=PAGE_IDX, 
+                   image_idx=IMAGE_IDS.peek(), page_idx=PAGE_IDS.peek(), 
                    used_image_urls=USED_IMAGE_URLS, used_page_urls=USED_PAGE_URLS)
 
 
 def add_image_idx():
     """
     增加图片索引。
+
+    :return: 本次占用的图片索引。
     """
-    global IMAGE_IDX
-    IMAGE_IDX = IMAGE_IDX + 1
+    return IMAGE_IDS.allocate()
 
 
 def add_page_idx():
     """
     增加帖子索引。
+
+    :return: 本次占用的帖子索引。
     """
-    global PAGE_IDX
-    PAGE_IDX = PAGE_IDX + 1
+    return PAGE_IDS.allocate()
 
 
 def get_pages(max_page=10, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -74,7 +79,7 @@ def get_pages(max_page=10, random_proxy=False, random_user_agent=False, headless
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://tieba.baidu.com')
+        utils.driver_get(driver, 'https://tieba.baidu.com')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -87,8 +92,12 @@ def get_pages(max_page=10, random_proxy=False, random_user_agent=False, headless
     for i in range(max_page):
         search_url = f"https://tieba.baidu.com/f?kw={type_name}&ie=utf-8&pn={i * 50}"
 
-        driver.get(search_url)
-        time.sleep(3)
+        utils.driver_get(driver, search_url)
+        try:
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "a.j_th_tit")))
+        except Exception as e:
+            logger.warning(f"等待帖子列表加载超时: {search_url}, {e}")
+        utils.archive_page(WEB_NAME, type_name, search_url, driver.page_source, kind='search')
 
         post_links = driver.find_elements(By.CSS_SELECTOR, "a.j_th_tit")
         for link in post_links:
@@ -104,6 +113,56 @@ def get_pages(max_page=10, random_proxy=False, random_user_agent=False, headless
     return page_urls
 
 
+def extract_image_urls(html):
+    """
+    从帖子页面中提取图片链接。
+    
+    :param html: 页面 HTML。
+    :return: 图片url列表。
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 提取所有 <img> 标签
+    image_tags = soup.find_all('img', class_="BDE_Image")  # 根据 class 过滤
+
+    return [img.get('src') for img in image_tags if img.get('src')]  # 确保 src 不为空
+
+
+def reparse():
+    """
+    从页面存档重新提取图片链接（修改提取规则后无需重新爬取），新的图片追加到获取记录中。
+    已在获取记录中的图片沿用原有的帖子索引，帖子中没有新图片时不占用索引，重复执行不会产生重复记录。
+    
+    :return: 新增的图片url列表。
+    """
+    images_path = config.get_save_history_path(WEB_NAME, type_name, 'get', 'images')
+    known_idx = {}  # 图片url -> 获取记录中的帖子索引
+    if os.path.exists(images_path):
+        for page_idx, src in utils.read_list_from_txt(images_path, parse=True):
+            known_idx.setdefault(src, page_idx)
+
+    image_urls = []
+
+    for _, srcs in utils.reparse_archive(WEB_NAME, type_name, lambda url, html: extract_image_urls(html)):
+        # 已下载的图片可能已被 compact_history 从获取记录中去掉，同样跳过
+        new_srcs = [src for src in dict.fromkeys(srcs) if src not in known_idx and src not in USED_IMAGE_URLS]
+        if not new_srcs:
+            continue
+        # 同一帖子的图片使用同一索引：帖子已有图片在记录中时沿用其索引，否则占用新的索引
+        page_idx = next((known_idx[src] for src in srcs if src in known_idx), None)
+        if page_idx is None:
+            page_idx = add_page_idx()
+        for src in new_srcs:
+            known_idx[src] = page_idx
+            image_urls.append((page_idx, src))
+
+    utils.save_list_to_txt(images_path, image_urls)
+    PAGE_IDS.release()  # 归还未使用的索引
+    logger.info(f'重新解析共获取{len(image_urls)}个图片')
+
+    return image_urls
+
+
 def get_image_urls(page_urls):
     """
     获取图片链接。
@@ -120,15 +179,15 @@ def get_image_urls(page_urls):
         if url in USED_PAGE_URLS:
             logger.info(f"页面链接 {url} 已经处理过，跳过下载。")
             continue
-        
-        time.sleep(round(random.uniform(1, 1.5), 2))
 
         ts_image_urls = set()
 
-        retries = 0
-        max_retries = 3
         response = None
-        while retries < max_retries:
+        modified = True
+        # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+        retry = utils.RetryPolicy(url, max_attempts=3)
+        for _ in retry:
+            proxy = utils.get_random_proxy()
             try:
                 headers = {
                     'User-Agent': utils.get_random_user_agent(),
@@ -136,44 +195,47 @@ def get_image_urls(page_urls):
                     'cookie': badutieba_cookie,
                 }
 
-                response = requests.get(url, headers=headers, proxies={'https': utils.get_random_proxy()}, timeout=10)
+                # 条件请求：帖子未变化（304 或正文摘要相同）时跳过解析
+                response, modified = utils.conditional_get(WEB_NAME, type_name, url, headers=headers, proxies={'https': proxy}, timeout=10)
 
                 response.raise_for_status()
+                retry.succeed(proxy)
 
                 break
             except Exception as e:
                 logger.error(f'{e}, begin retry')
-                retries += 1  # 失败后增加重试次数
+                retry.fail(e, proxy)
 
         if not response:
             continue
 
-        # 解析 HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if not modified:
+            logger.info(f'{url} 未变化，之前已解析过')
+            USED_PAGE_URLS.add(url)
+            continue
 
-        # 提取所有 <img> 标签
-        image_tags = soup.find_all('img', class_="BDE_Image")  # 根据 class 过滤
+        utils.archive_page(WEB_NAME, type_name, url, response.text)
 
-        for img in image_tags:
-            src = img.get('src')
-            if src:  # 确保 src 不为空
-                ts_image_urls.add((PAGE_IDX, src))
+        # 解析 HTML，帖子有图片时才占用帖子索引
+        srcs = extract_image_urls(response.text)
+        if srcs:
+            page_idx = add_page_idx()
+            ts_image_urls.update((page_idx, src) for src in srcs)
 
         if not zyt_validation_utils.is_empty(ts_image_urls):
             image_urls.update(ts_image_urls)
-            add_page_idx()
 
             logger.info(f'完成{url}，获取{len(ts_image_urls)}个图片')
         else:
             logger.warning(f'完成{url}，内容为空')
 
-        utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'), [url])
         USED_PAGE_URLS.add(url)
+        utils.save_http_cache(WEB_NAME, type_name, url, response)
     
     image_urls = list(image_urls)
 
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'), image_urls)
-    config.update_idx(WEB_NAME, type_name, 'pages', PAGE_IDX)
+    PAGE_IDS.release()  # 归还未使用的索引
     logger.info(f'共获取{len(image_urls)}个图片')
 
     return image_urls
@@ -193,47 +255,54 @@ def download_image(image_info, save_dir):
     image_id = image_info[0]
     image_url = image_info[1]
 
-    if image_url in USED_IMAGE_URLS:
-        logger.info(f"图片链接 {image_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if image_url in USED_IMAGE_URLS:
+            logger.info(f"图片链接 {image_url} 已经处理过，跳过下载。")
+            return
 
     if image_url.endswith('.gif'):
         return
     
-    for _ in range(5):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(image_url, max_attempts=5)
+    for _ in retry:
         header = {
             'User-Agent': utils.get_random_user_agent(),
         }
         proxy = {'https': utils.get_random_proxy()}
         try:
-            response = requests.get(image_url, headers=header, proxies=proxy, stream=True, timeout=10)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-            
-            image_data = response.content
-
-            current_time = utils.get_formatted_timestamp()
             pinyin_list = lazy_pinyin(type_name)
             pinyin_title = ''
             for pinyin in pinyin_list:
                 pinyin_title += pinyin[0].lower()
             
-            filename = f'{type_name[0].upper()}_bdtb{pinyin_title}{image_id:05d}_{current_time}_RGB.jpg'
             dir_name = f'bdtb{pinyin_title}{image_id:05d}'
-            save_path = os.path.join(save_dir, dir_name, filename)
-            os.makedirs(os.path.join(save_dir, dir_name), exist_ok=True)
+            image_dir = os.path.join(save_dir, dir_name)
+
+            # 流式写入临时文件，内存占用与图片大小和并发数无关
+            temp_path = utils.download_temp_file(image_url, image_dir, headers=header, proxies=proxy, timeout=10)
+            retry.succeed(proxy)
+
+            # 同一帖子的图片并发下载时可能生成相同时间戳，由 commit_temp_file 保证文件名不重复
+            save_path = utils.commit_temp_file(temp_path, lambda: os.path.join(
+                image_dir, f'{type_name[0].upper()}_bdtb{pinyin_title}{image_id:05d}_{utils.get_formatted_timestamp()}_RGB.jpg'))
 
-            with open(save_path, 'wb') as file:
-                file.write(image_data)
+            with USED_URLS_LOCK:
+                USED_IMAGE_URLS.add(image_url)
 
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'images'), [image_url])
-            USED_IMAGE_URLS.add(image_url)
+            # 内容重复且只记入清单时没有生成文件；近重复图片（缩放、重新编码等）按配置拒绝或标记
+            if save_path is None or utils.check_near_duplicate(save_path):
+                break
             add_image_idx()
 
             logger.info(f"图片已成功下载到 {save_path}")
             break
+        except utils.OversizedDownloadError as e:
+            logger.warning(f"跳过下载: {e}")
+            break
         except requests.exceptions.RequestException as e:
             logger.error(f"{proxy}_下载失败: {e}")
-            continue
+            retry.fail(e, proxy)
 
 
 def download_images(image_infos, save_dir):
@@ -248,15 +317,13 @@ def download_images(image_infos, save_dir):
         return
 
     os.makedirs(save_dir, exist_ok=True)
-    old_image_idx = IMAGE_IDX
+    old_image_count = IMAGE_IDS.allocated
 
-    for image_info in image_infos:
-        download_image(image_info, save_dir)
-        time.sleep(round(random.uniform(0.1, 0.3), 2))
+    utils.run_downloads(image_infos, download_image, save_dir)
     
-    config.update_idx(WEB_NAME, type_name, 'images', IMAGE_IDX)
+    IMAGE_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{IMAGE_IDX - old_image_idx}个图片（新计数值:IMAGE_IDX={IMAGE_IDX})")
+    logger.info(f"下载全部完成，本次共下载{IMAGE_IDS.allocated - old_image_count}个图片（新计数值:IMAGE_IDX={IMAGE_IDS.peek()})")
 
 
 def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False, headless=False, 
@@ -276,8 +343,8 @@ def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False, head
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_image_idx = IMAGE_IDX
-    old_page_idx = PAGE_IDX
+    old_image_count = IMAGE_IDS.allocated
+    old_page_count = PAGE_IDS.allocated
 
     logger.info(f'========== 开始处理: {type_name} ==========')
     try:
@@ -291,7 +358,7 @@ def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False, head
             return
         
         if have_urls:
-            image_urls = utils.read_list_from_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'))
+            image_urls = utils.read_list_from_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'), parse=True)
         else:
             image_urls = get_image_urls(pages)
         
@@ -305,6 +372,6 @@ def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False, head
     logger.info(f'========== 完成: {type_name} ==========')
     
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     image_idx=IMAGE_IDX, page_idx=PAGE_IDX,
-                     new_image_count=IMAGE_IDX-old_image_idx, new_page_count=PAGE_IDX-old_page_idx)
+                     image_idx=IMAGE_IDS.peek(), page_idx=PAGE_IDS.peek(),
+                     new_image_count=IMAGE_IDS.allocated - old_image_count, new_page_count=PAGE_IDS.allocated - old_page_count)
         
\ No newline at end of file
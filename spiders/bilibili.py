@@ -4,10 +4,11 @@ Project Name: web_crawler
 File Created: 2024.12.05
 Author: ZhangYuetao
 File Name: bilibili.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
+import threading
 import time
 
 from yt_dlp import YoutubeDL
@@ -24,21 +25,26 @@ basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTI
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-VIDEO_IDX = config.get_idx(WEB_NAME, type_name, 'videos')
+VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')  # 按块预留视频索引，线程与进程间不重复
+USED_URLS_LOCK = threading.Lock()  # 用于保护 USED_VIDEO_URLS 与已用记录文件的修改
 
-USED_VIDEO_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'))
+# 直接选择目标分辨率的纯视频 DASH 流（优先 H.264），不下载音频；没有纯视频流时退回带音频的格式
+VIDEO_FORMAT = 'bestvideo[height<=1080][vcodec^=avc1]/bestvideo[height<=1080]/best[height<=1080]'
+
+USED_VIDEO_URLS = utils.HistorySet(WEB_NAME, type_name, 'videos')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   video_idx=VIDEO_IDX, 
+                   video_idx=VIDEO_IDS.peek(), 
                    used_video_urls=USED_VIDEO_URLS)
 
 
 def add_idx():
     """
     增加视频索引。
+
+    :return: 本次占用的视频索引。
     """
-    global VIDEO_IDX
-    VIDEO_IDX = VIDEO_IDX + 1
+    return VIDEO_IDS.allocate()
 
 
 def get_video_pages(keyword, max_page=10, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -61,7 +67,7 @@ def get_video_pages(keyword, max_page=10, random_proxy=False, random_user_agent=
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://www.bilibili.com/')
+        utils.driver_get(driver, 'https://www.bilibili.com/')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -74,7 +80,7 @@ def get_video_pages(keyword, max_page=10, random_proxy=False, random_user_agent=
     for i in range(max_page):
         search_url = f"https://search.bilibili.com/video?keyword={keyword}&from_source=webtop_search&duration=1&page={i + 1}&o={i * 36}"
 
-        driver.get(search_url)
+        utils.driver_get(driver, search_url)
         time.sleep(3)
 
         post_links = driver.find_elements(By.CSS_SELECTOR, "div.bili-video-card__info--right")
@@ -89,7 +95,7 @@ def get_video_pages(keyword, max_page=10, random_proxy=False, random_user_agent=
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
     logger.info(f"爬取页面完成，共{len(video_urls)}个URL")
     
-    driver.get('https://www.baidu.com')
+    utils.driver_get(driver, 'https://www.baidu.com')
 
     return video_urls
 
@@ -108,79 +114,109 @@ def download_videos(urls, save_path, retries=3):
         logger.warning('urls empty')
         return
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
     
-    for url in urls:
-        download_bilibili_video(url, save_path, retries)
+    # 长期复用的 yt-dlp 实例，多个视频并行下载
+    with utils.YtdlpEngine(get_ydl_opts(), save_path) as engine:
+        engine.run(urls, lambda url: download_bilibili_video(url, save_path, retries, engine))
+    utils.wait_postprocess()
         
-    config.update_idx(WEB_NAME, type_name, 'videos', VIDEO_IDX)
+    VIDEO_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{VIDEO_IDX-old_video_idx}个视频（新计数值，VIDEO_IDX={VIDEO_IDX})")
+    logger.info(f"下载全部完成，本次共下载{VIDEO_IDS.allocated - old_video_count}个视频（新计数值，VIDEO_IDX={VIDEO_IDS.peek()})")
 
 
 def check_formats(video_url):
     """
-    检查指定的 B 站视频 URL 的格式。
+    检查指定的 B 站视频 URL 的格式，并显示按 VIDEO_FORMAT 选中的格式。
     
     :param video_url: B 站视频的网页地址。
     """
     ydl_opts = {
         'quiet': False,  # 显示信息
-        'force_generic_extractor': True,  # 强制使用通用提取器
-        'listformats': True,  # 获取视频的所有格式
+        'listformats': True,  # 获取视频的所有格式（DASH 视频流与音频流分别列出）
+        'cookiefile': config.BILIBILI_COOKIE_PATH
     }
 
     with YoutubeDL(ydl_opts) as ydl:
-        ydl.extract_info(video_url)
+        ydl.extract_info(video_url, download=False)
+
+    with YoutubeDL({'quiet': True, 'format': VIDEO_FORMAT, 'cookiefile': config.BILIBILI_COOKIE_PATH}) as ydl:
+        info = ydl.extract_info(video_url, download=False)
+
+    logger.info(f"选中格式 {info.get('format_id')}：{info.get('vcodec')}，{info.get('height')}p，音频 {info.get('acodec')}")
 
 
-def download_bilibili_video(video_url, save_path, retries=3):
+def get_ydl_opts():
+    """
+    获取下载视频的 yt_dlp 参数（输出路径由下载引擎设置）。
+
+    :return: yt_dlp 参数字典。
+    """
+    return {
+        'format': VIDEO_FORMAT,  # 选择画质（纯视频流）
+        'noplaylist': True,  # 如果是播放列表，下载第一个视频
+        'quiet': False,  # 显示下载进度
+        'cookiefile': config.BILIBILI_COOKIE_PATH
+    }
+
+
+def save_video(video_url, temp_path, save_path):
+    """
+    下载或后处理完成后保存视频：占用索引并生成文件名（并行下载时不会重名），记录已下载的链接。
+
+    :param video_url: 视频网页地址。
+    :param temp_path: 下载或后处理完成的临时文件路径。
+    :param save_path: 保存视频的文件夹路径。
+    """
+    video_idx = add_idx()
+    file_path = utils.commit_temp_file(temp_path, lambda: os.path.join(
+        save_path, f'{type_name[0].upper()}_blbl{video_idx:05d}_{utils.get_formatted_timestamp()}_RGB.mp4'))
+
+    with USED_URLS_LOCK:
+        USED_VIDEO_URLS.add(video_url)
+
+    if file_path is not None:
+        logger.info(f"视频已成功下载到：{file_path}")
+
+
+def download_bilibili_video(video_url, save_path, retries=3, engine=None):
     """
     从指定的 B 站视频 URL 下载视频（指定画质，无音频）到本地指定路径。
 
     :param video_url: B 站视频的网页地址。
     :param save_path: 保存视频的文件夹路径。
     :param retries: 重试次数。
+    :param engine: yt-dlp 下载引擎，为空时临时创建。
     """
     if not video_url:
         logger.info('empty！')
         return
 
-    if video_url in USED_VIDEO_URLS:
-        logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if video_url in USED_VIDEO_URLS:
+            logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
+            return
     # 确保保存路径存在
     os.makedirs(save_path, exist_ok=True)
 
-    current_time = utils.get_formatted_timestamp()
-    filename = f'{type_name[0].upper()}_blbl{VIDEO_IDX:05d}_{current_time}_RGB.mp4'
-
-    # 配置 yt_dlp 的参数
-    ydl_opts = {
-        'format': 'mp4[height<=1080]',  # 选择画质
-        'outtmpl': os.path.join(save_path, filename),  # 输出文件名格式
-        'noplaylist': True,  # 如果是播放列表，下载第一个视频
-        'quiet': False,  # 显示下载进度
-        'postprocessors': [{
-            'key': 'FFmpegVideoConvertor',
-            'preferedformat': 'mp4'  # 确保视频输出为 MP4 格式
-        }],
-        'postprocessor_args': [
-            '-an'  # 去除音频
-        ],
-        'cookiefile': config.BILIBILI_COOKIE_PATH
-    }
+    if engine is None:
+        with utils.YtdlpEngine(get_ydl_opts(), save_path, workers=1) as engine:
+            download_bilibili_video(video_url, save_path, retries, engine)
+        utils.wait_postprocess()
+        return
 
     for attempt in range(retries):
         try:
-            with YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
-            
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'), [video_url])
-            USED_VIDEO_URLS.add(video_url)
-            add_idx()
-                
-            logger.info(f"视频已成功下载到：{save_path}")
+            temp_path, info = engine.download_info(video_url)
+
+            if info.get('acodec') == 'none' and temp_path.endswith('.mp4'):
+                # 纯视频 DASH 流已经没有音频，无需后处理直接保存
+                save_video(video_url, temp_path, save_path)
+            else:
+                # 去除音频并转为 MP4 交给后处理进程池完成（H.264 等编码直接复制视频流），下载线程立即开始下一个视频
+                utils.submit_postprocess(temp_path, os.path.splitext(temp_path)[0] + '.an.mp4', None,
+                                         lambda path: save_video(video_url, path, save_path))
             break
         except Exception as e:
             logger.warning(f"尝试 {attempt + 1}/{retries} 失败: {e}")
@@ -205,7 +241,7 @@ def run(keywords, save_dir, max_pages=10, retries=3, random_proxy=False, random_
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
 
     for keyword in keywords:
         logger.info(f'========== 开始处理关键词: {keyword} ==========')
@@ -226,6 +262,6 @@ def run(keywords, save_dir, max_pages=10, retries=3, random_proxy=False, random_
         logger.info(f'========== 完成关键词: {keyword} ==========')
     
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     video_idx=VIDEO_IDX,
-                     new_video_count=VIDEO_IDX-old_video_idx,)
+                     video_idx=VIDEO_IDS.peek(),
+                     new_video_count=VIDEO_IDS.allocated - old_video_count,)
         
\ No newline at end of file
@@ -4,45 +4,49 @@ Project Name: web_crawler
 File Created: 2024.12.06
 Author: ZhangYuetao
 File Name: douyin.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
 import re
 import time
-import random
+import threading
 
-import requests
 from selenium import webdriver
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from urllib.parse import unquote, parse_qs, urlparse
 
 import utils
 import config
 from logger import logger
 
+USED_URLS_LOCK = threading.Lock()        # 用于保护 USED_VIDEO_URLS 的访问与历史记录写入
+
 WEB_NAME = 'douyin'
 
 basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-VIDEO_IDX = config.get_idx(WEB_NAME, type_name, 'videos')
+VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')  # 按块预留视频索引，线程与进程间不重复
 
-USED_VIDEO_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'))
-USED_PAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'))
+USED_VIDEO_URLS = utils.HistorySet(WEB_NAME, type_name, 'videos')
+USED_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'pages')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   video_idx=VIDEO_IDX, 
+                   video_idx=VIDEO_IDS.peek(), 
                    used_video_urls=USED_VIDEO_URLS, used_page_urls=USED_PAGE_URLS)
 
 
 def add_idx():
     """
     增加视频索引。
+
+    :return: 本次占用的视频索引。
     """
-    global VIDEO_IDX
-    VIDEO_IDX = VIDEO_IDX + 1
+    return VIDEO_IDS.allocate()
 
 
 def search_douyin_pages(keyword, max_scroll=10, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -65,7 +69,7 @@ def search_douyin_pages(keyword, max_scroll=10, random_proxy=False, random_user_
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://www.douyin.com')
+        utils.driver_get(driver, 'https://www.douyin.com')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -77,22 +81,19 @@ def search_douyin_pages(keyword, max_scroll=10, random_proxy=False, random_user_
 
     # 加载搜索页面
     search_url = f'https://www.douyin.com/search/{keyword}?type=general'
-    driver.get(search_url)
-
-    time.sleep(5)
+    utils.driver_get(driver, search_url)
 
     video_xpath = "/html/body/div[2]/div/div/div/div/div[1]/div[1]/div[1]/div/div/span[2]"
 
     try:
-        video_button = driver.find_element(By.XPATH, video_xpath)
+        video_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, video_xpath)))
+        utils.throttle(search_url)  # 点击会向网站发起请求，与页面请求共享限速额度
         video_button.click()
         logger.info("成功点击 '视频' 按钮。")
     except Exception as e:
         logger.error("点击 '视频' 按钮失败:", e)
         return []
 
-    time.sleep(5)
-
     last_height = driver.execute_script("return document.body.scrollHeight")
 
     for _ in range(max_scroll):
@@ -102,6 +103,7 @@ def search_douyin_pages(keyword, max_scroll=10, random_proxy=False, random_user_
 
         # 获取当前页面内容
         html = driver.page_source
+        utils.archive_page(WEB_NAME, type_name, driver.current_url, html, kind='search')
 
         # 使用正则表达式查找 URL
         pattern = r'href="([^"]+)"'
@@ -124,7 +126,7 @@ def search_douyin_pages(keyword, max_scroll=10, random_proxy=False, random_user_
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'pages'), all_urls)
     logger.info(f"获取到 {len(all_urls)} 条 URL。")
     
-    driver.get('https://www.baidu.com')
+    utils.driver_get(driver, 'https://www.baidu.com')
 
     return all_urls
 
@@ -150,34 +152,62 @@ def get_video_urls(page_urls, random_proxy=False, random_user_agent=False, headl
             logger.info(f"链接 {page_url} 已经处理过，跳过下载。")
             continue
         
-        driver.get(page_url)
-        time.sleep(float(round(random.uniform(4, 6), 1)))
+        utils.driver_get(driver, page_url)
+        try:
+            # 等待页面脚本加载出视频地址
+            WebDriverWait(driver, 10).until(lambda d: 'v3-web.douyinvod.com' in d.page_source)
+        except Exception as e:
+            logger.warning(f"等待视频地址加载超时: {page_url}, {e}")
 
         page_html = driver.page_source
+        utils.archive_page(WEB_NAME, type_name, page_url, page_html)
 
-        video_links = re.findall(r'https://[^\s"]+', page_html)
-        url_list = []
-
-        for link in video_links:
-            if "v3-web.douyinvod.com" in link:
-                url_list.append(link)
-
-        if url_list:
-            url = get_highest_br_video_url(url_list)
+        url = extract_video_url(page_html)
 
+        if url:
             logger.info(f"get_url:{url}")
             video_urls.append(url)
 
         else:
             logger.warning(f"获取失败：{page_url}")
         
-        utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'), [page_url])
         USED_PAGE_URLS.add(page_url)
 
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
     logger.info(f"共获取 {len(video_urls)} 条视频URL")
     
-    driver.get('https://www.baidu.com')
+    utils.driver_get(driver, 'https://www.baidu.com')
+
+    return video_urls
+
+
+def extract_video_url(page_html):
+    """
+    从视频页面中提取码率最高的视频链接。
+    
+    :param page_html: 页面 HTML。
+    :return: 视频链接，未找到返回 None。
+    """
+    video_links = re.findall(r'https://[^\s"]+', page_html)
+    url_list = [link for link in video_links if "v3-web.douyinvod.com" in link]
+
+    if not url_list:
+        return None
+
+    return get_highest_br_video_url(url_list)
+
+
+def reparse():
+    """
+    从页面存档重新提取视频链接（修改提取规则后无需重新爬取），结果追加到获取记录中。
+    
+    :return: 视频url列表。
+    """
+    results = utils.reparse_archive(WEB_NAME, type_name, lambda url, html: extract_video_url(html))
+    video_urls = [video_url for _, video_url in results]
+
+    utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
+    logger.info(f"重新解析共获取 {len(video_urls)} 条视频URL")
 
     return video_urls
 
@@ -257,14 +287,13 @@ def download_videos(video_infos, save_dir):
         logger.warning('urls empty')
         return
 
-    old_idx = VIDEO_IDX
+    old_count = VIDEO_IDS.allocated
 
-    for video_info in video_infos:
-        download_douyin_video(video_info, save_dir)
+    utils.run_downloads(video_infos, download_douyin_video, save_dir)
     
-    config.update_idx(WEB_NAME, type_name, 'videos', VIDEO_IDX)
+    VIDEO_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{VIDEO_IDX - old_idx}个视频（新计数值，VIDEO_IDX={VIDEO_IDX})")
+    logger.info(f"下载全部完成，本次共下载{VIDEO_IDS.allocated - old_count}个视频（新计数值，VIDEO_IDX={VIDEO_IDS.peek()})")
 
 
 def download_douyin_video(video_url, save_dir):
@@ -278,11 +307,14 @@ def download_douyin_video(video_url, save_dir):
         logger.info('empty！')
         return
 
-    if video_url in USED_VIDEO_URLS:
-        logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if video_url in USED_VIDEO_URLS:
+            logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
+            return
 
-    for _ in range(5):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(video_url, max_attempts=5)
+    for _ in retry:
         header = {
                 'User-Agent': utils.get_random_user_agent(),
                 'Referer': 'https://www.douyin.com/',  # 设置Referer
@@ -290,30 +322,24 @@ def download_douyin_video(video_url, save_dir):
         proxy = utils.get_random_proxy()
         
         try:
-            response = requests.get(video_url, headers=header, proxies={'https': proxy}, stream=True, timeout=60)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-
-            current_time = utils.get_formatted_timestamp()
+            # 下载到 .part 文件（大文件分段并发，各分段使用不同代理），失败后的重试或重新运行时断点续传
+            part_path = utils.download_segmented_file(video_url, save_dir, headers=header, proxies={'https': proxy}, timeout=60,
+                                                      get_proxies=lambda: {'https': utils.get_random_proxy()})
+            retry.succeed(proxy)
 
-            filename = f'{type_name[0].upper()}_douyin{VIDEO_IDX:05d}_{current_time}_RGB.mp4'
+            video_idx = add_idx()
+            save_path = utils.commit_part_file(part_path, lambda: os.path.join(
+                save_dir, f'{type_name[0].upper()}_douyin{video_idx:05d}_{utils.get_formatted_timestamp()}_RGB.mp4'))
 
-            save_path = os.path.join(save_dir, filename)
+            with USED_URLS_LOCK:
+                USED_VIDEO_URLS.add(video_url)
 
-            # 将视频内容写入文件
-            with open(save_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        file.write(chunk)
-
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'), [video_url])
-            USED_VIDEO_URLS.add(video_url)
-            add_idx()
-
-            logger.info(f"视频已成功下载到 {save_path}")
+            if save_path is not None:
+                logger.info(f"视频已成功下载到 {save_path}")
             break
         except Exception as e:
             logger.error(f"{proxy}:下载失败: {e}")
-            continue
+            retry.fail(e, proxy)
 
 
 def process_batch(batch, save_dir):
@@ -371,7 +397,7 @@ def run(keywords, save_dir, max_scroll=10, batch_size=0, random_proxy=False, ran
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
 
     for keyword in keywords:
         logger.info(f'========== 开始处理关键词: {keyword} ==========')
@@ -406,6 +432,6 @@ def run(keywords, save_dir, max_scroll=10, batch_size=0, random_proxy=False, ran
         logger.info(f'========== 完成关键词: {keyword} ==========')
         
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     video_idx=VIDEO_IDX,
-                     new_video_count=VIDEO_IDX-old_video_idx)
+                     video_idx=VIDEO_IDS.peek(),
+                     new_video_count=VIDEO_IDS.allocated - old_video_count)
         
\ No newline at end of file
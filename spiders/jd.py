@@ -4,12 +4,12 @@ Project Name: web_crawler
 File Created: 2025.02.10
 Author: ZhangYuetao
 File Name: jd.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
 import time
-import random
+import threading
 
 import requests
 from selenium.webdriver.common.by import By
@@ -23,28 +23,31 @@ import utils
 import config
 from logger import logger
 
+USED_URLS_LOCK = threading.Lock()        # 用于保护 USED_VIDEO_URLS 的访问与历史记录写入
+
 WEB_NAME = 'jingdong'
 
 basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-VIDEO_IDX = config.get_idx(WEB_NAME, type_name, 'videos')
+VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')  # 按块预留视频索引，线程与进程间不重复
 
-USED_VIDEO_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'))
-USED_PAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'))
+USED_VIDEO_URLS = utils.HistorySet(WEB_NAME, type_name, 'videos')
+USED_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'pages')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   video_idx=VIDEO_IDX, 
+                   video_idx=VIDEO_IDS.peek(), 
                    used_video_urls=USED_VIDEO_URLS, used_page_urls=USED_PAGE_URLS)
 
 
 def add_idx():
     """
     增加视频索引。
+
+    :return: 本次占用的视频索引。
     """
-    global VIDEO_IDX
-    VIDEO_IDX = VIDEO_IDX + 1
+    return VIDEO_IDS.allocate()
 
 
 def search_in_jd_shops(page_urls, max_pages=20, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -66,7 +69,7 @@ def search_in_jd_shops(page_urls, max_pages=20, random_proxy=False, random_user_
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://www.jd.com/')
+        utils.driver_get(driver, 'https://www.jd.com/')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -82,14 +85,14 @@ def search_in_jd_shops(page_urls, max_pages=20, random_proxy=False, random_user_
             continue
         
         # 加载商品详情页面
-        driver.get(page_url)
-        time.sleep(float(round(random.uniform(4, 6), 1)))
+        utils.driver_get(driver, page_url)
 
         # 定位并点击“全部评价”按钮
         try:
             # 使用你提供的固定 XPath 定位元素
             video_xpath = "//*[@id='detail']/div[1]/ul/li[5]"
-            reviews_button = driver.find_element(By.XPATH, video_xpath)
+            reviews_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, video_xpath)))
+            utils.throttle(page_url)  # 点击会向网站发起请求，与页面请求共享限速额度
             reviews_button.click()
             logger.info("成功点击 '商品评价' 按钮。")
         except Exception as e:
@@ -97,11 +100,10 @@ def search_in_jd_shops(page_urls, max_pages=20, random_proxy=False, random_user_
             # driver.quit()
             return []
 
-        time.sleep(float(round(random.uniform(4, 6), 1)))
-
         try:
             video_xpath = "//*[@id='comment']/div[2]/div[2]/div[1]/ul/li[3]"
-            reviews_button = driver.find_element(By.XPATH, video_xpath)
+            reviews_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, video_xpath)))
+            utils.throttle(page_url)
             reviews_button.click()
             logger.info("成功点击 '视频晒单' 按钮。")
         except Exception as e:
@@ -109,8 +111,6 @@ def search_in_jd_shops(page_urls, max_pages=20, random_proxy=False, random_user_
             # driver.quit()
             return []
 
-        time.sleep(float(round(random.uniform(4, 6), 1)))
-
         # 模拟鼠标点击及键盘 PAGE_DOWN 来滚动评价区域
         actions = ActionChains(driver)
 
@@ -168,9 +168,9 @@ def search_in_jd_shops(page_urls, max_pages=20, random_proxy=False, random_user_
                     raise Exception("未找到可见的下一页按钮。")
 
                 # 使用 JavaScript 点击按钮
+                utils.throttle(page_url)
                 driver.execute_script("arguments[0].click();", next_page_button)
                 logger.info("成功点击 '下一页' 按钮。")
-                time.sleep(float(round(random.uniform(2.5, 3.5), 1)))
 
             except Exception as e:
                 logger.error("点击 '下一页' 按钮失败:", e)
@@ -181,7 +181,6 @@ def search_in_jd_shops(page_urls, max_pages=20, random_proxy=False, random_user_
         # input("任务完成，按 Enter 键退出...")
         # driver.quit()
     
-        utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'), [page_url])
         USED_PAGE_URLS.add(page_url)
         
         utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
@@ -206,14 +205,13 @@ def download_videos(video_infos, save_dir):
         logger.warning('urls empty')
         return
 
-    old_idx = VIDEO_IDX
+    old_count = VIDEO_IDS.allocated
 
-    for video_info in video_infos:
-        download_jd_video(video_info, save_dir)
+    utils.run_downloads(video_infos, download_jd_video, save_dir)
 
-    config.update_idx(WEB_NAME, type_name, 'videos', VIDEO_IDX)
+    VIDEO_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{VIDEO_IDX - old_idx}个视频（新计数值，VIDEO_IDX={VIDEO_IDX})")
+    logger.info(f"下载全部完成，本次共下载{VIDEO_IDS.allocated - old_count}个视频（新计数值，VIDEO_IDX={VIDEO_IDS.peek()})")
 
 
 def download_jd_video(video_url, save_dir):
@@ -227,54 +225,40 @@ def download_jd_video(video_url, save_dir):
         logger.info('empty！')
         return
 
-    if video_url in USED_VIDEO_URLS:
-        logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if video_url in USED_VIDEO_URLS:
+            logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
+            return
 
-    for _ in range(5):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(video_url, max_attempts=5)
+    for _ in retry:
         header = {
             'User-Agent': utils.get_random_user_agent(),
         }
         proxy = utils.get_random_proxy()
         
         try:
-            response = requests.get(video_url, headers=header, proxies={'http': proxy}, stream=True, timeout=10)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-
-            current_time = utils.get_formatted_timestamp()
-
-            filename = f'{type_name[0].upper()}_jd{VIDEO_IDX:05d}_{current_time}_RGB.mp4'
-
-            save_path = os.path.join(save_dir, filename)
-
-            # 将视频内容写入文件
-            with open(save_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        file.write(chunk)
-
-            # 判断视频类型
-            try:
-                video_type = utils.check_video_type(save_path)  # 调用前面定义的函数
-            except:
-                video_type = "RGB"
-
-            # 如果是 IR 视频，修改文件名
-            if video_type == "IR":
-                new_filename = filename.replace("_RGB.mp4", "_IR.mp4")
-                new_save_path = os.path.join(save_dir, new_filename)
-                os.rename(save_path, new_save_path)
-                save_path = new_save_path  # 更新路径
-
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'), [video_url])
-            USED_VIDEO_URLS.add(video_url)
-            add_idx()
-
-            logger.info(f"视频已成功下载到 {save_path}")
+            # 下载到 .part 文件，失败后的重试或重新运行时通过 Range 请求断点续传
+            part_path = utils.download_part_file(video_url, save_dir, headers=header, proxies={'http': proxy}, timeout=10)
+            retry.succeed(proxy)
+
+            video_idx = add_idx()
+            save_path = utils.commit_part_file(part_path, lambda: os.path.join(
+                save_dir, f'{type_name[0].upper()}_jd{video_idx:05d}_{utils.get_formatted_timestamp()}_RGB.mp4'))
+
+            with USED_URLS_LOCK:
+                USED_VIDEO_URLS.add(video_url)
+
+            # 内容重复且只记入清单时没有生成文件，无需分类
+            if save_path is not None:
+                # 抽帧判断视频类型并在需要时改名为 _IR，由进程池异步完成，不阻塞下载线程
+                utils.submit_video_classification(save_path)
+                logger.info(f"视频已成功下载到 {save_path}")
             break
         except requests.exceptions.RequestException as e:
             logger.error(f"{proxy}_下载失败: {e}")
-            continue
+            retry.fail(e, proxy)
 
 
 def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False, 
@@ -293,7 +277,7 @@ def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False,
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
     
     logger.info(f'========== 开始处理: {type_name} ==========')
     try:
@@ -316,8 +300,10 @@ def run(save_dir, max_page=10, random_proxy=False, random_user_agent=False,
     except Exception as e:
         logger.error(f"[{type_name}] 抓取失败: {e}")
     logger.info(f'========== 完成: {type_name} ==========')
-    
+
+    # 等待异步的视频分类与重命名完成后再输出统计
+    utils.wait_video_classification()
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     video_idx=VIDEO_IDX,
-                     new_video_count=VIDEO_IDX-old_video_idx)
+                     video_idx=VIDEO_IDS.peek(),
+                     new_video_count=VIDEO_IDS.allocated - old_video_count)
         
\ No newline at end of file
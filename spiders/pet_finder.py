@@ -4,7 +4,7 @@ Project Name: web_crawler
 File Created: 2025.05.16
 Author: ZhangYuetao
 File Name: pet_finder.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
@@ -23,12 +23,7 @@ import utils
 import config
 from logger import logger
 
-IMAGE_IDX_LOCK = threading.Lock()        # 用于保护 IMAGE_IDX 的修改
 USED_URLS_LOCK = threading.Lock()        # 用于保护 USED_IMAGE_URLS 的访问
-FILE_LOCKS = {                           # 用于保护写文件的操作
-    'success': threading.Lock(),
-    'fail': threading.Lock(),
-}
 
 WEB_NAME = 'petfinder'
 
@@ -36,27 +31,26 @@ basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTI
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-IMAGE_IDX = config.get_idx(WEB_NAME, type_name, 'images')
+IMAGE_IDS = utils.IdAllocator(WEB_NAME, type_name, 'images')  # 按块预留图片索引，线程与进程间不重复
 
-used_images = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'images'))
-wrong_images = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'wrong', 'images'))
-USED_IMAGE_URLS = used_images.update(wrong_images)
-used_pages = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'))
-wrong_pages = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'wrong', 'pages'))
-USED_PAGE_URLS = used_pages.update(wrong_pages)
+# 失败记录（wrong）同样视为已处理，不再重复尝试
+USED_IMAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'images', extra_ways=('wrong',))
+USED_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'pages', extra_ways=('wrong',))
+WRONG_IMAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'images', way='wrong')
+WRONG_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'pages', way='wrong')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   image_idx=IMAGE_IDX, 
+                   image_idx=IMAGE_IDS.peek(), 
                    used_image_urls=USED_IMAGE_URLS, used_page_urls=USED_PAGE_URLS)
 
 
 def add_idx():
     """
     增加图片索引。
+
+    :return: 本次占用的图片索引。
     """
-    global IMAGE_IDX
-    with IMAGE_IDX_LOCK:
-        IMAGE_IDX += 1
+    return IMAGE_IDS.allocate()
 
 
 def search_pet_pages(max_pages=10, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -80,7 +74,7 @@ def search_pet_pages(max_pages=10, random_proxy=False, random_user_agent=False,
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://www.petfinder.com/search/cats-for-adoption/us/ca/los-angeles/?distance=Anywhere')
+        utils.driver_get(driver, 'https://www.petfinder.com/search/cats-for-adoption/us/ca/los-angeles/?distance=Anywhere')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -151,26 +145,40 @@ def fetch_images_from_page(page_url):
     }
     pet_id = page_url.split('/')[4].split('-')[-1]
 
-    for i in range(3):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(page_url, max_attempts=3)
+    for i in retry:
         header = {
             'User-Agent': utils.get_random_user_agent(),
         }
 
         try:
-            response = requests.get(page_url, headers=header, proxies=proxies, timeout=10)
+            # 条件请求：页面未变化（304 或正文摘要相同）说明之前已解析过，跳过解析
+            # 只在请求期间占用主机的自适应并发名额（遇到 429/403/超时自动降低），重试退避时不占用
+            with utils.adaptive_slot(page_url):
+                response, modified = utils.conditional_get(WEB_NAME, type_name, page_url, headers=header, proxies=proxies, timeout=10)
             response.raise_for_status()
+            retry.succeed(proxies)
+
+            if not modified:
+                USED_PAGE_URLS.add(page_url)
+                return [], None
+
+            utils.archive_page(WEB_NAME, type_name, page_url, response.text)
 
             soup = BeautifulSoup(response.text, 'html.parser')
             image_tags = soup.find_all('img', class_='petCarousel-body-slide')
 
             urls = [(pet_id, img.get('src')) for img in image_tags if img.get('src')]
             USED_PAGE_URLS.add(page_url)
+            utils.save_http_cache(WEB_NAME, type_name, page_url, response)
             logger.info(f"✅ 成功获取图片 from {page_url} — 共 {len(urls)} 张")
-            
-            return urls, None
         
+            return urls, None
+    
         except Exception as e:
             logger.error(f"❌ 获取失败 ({page_url}), 重试第 {i + 1} 次: {e}")
+            retry.fail(e, proxies)
 
     return [], page_url  # 返回空图像和失败的 URL
 
@@ -180,7 +188,7 @@ def get_images_in_pages(page_urls, max_workers=5):
     从页面列表中获取全部图像链接。
     
     :param page_urls: 页面 URL 列表。
-    :param max_workers: 最大工作线程数。
+    :param max_workers: 最大工作线程数（实际并发由按主机的自适应并发上限控制）。
     :return: 图像链接列表。
     """
     all_urls = []
@@ -201,12 +209,12 @@ def get_images_in_pages(page_urls, max_workers=5):
                 if i % 100 == 0:
                     logger.info(f"⚙️ 已处理 {i} 个页面，保存中...")
                     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'), all_urls)
-                    utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'wrong', 'pages'), wrong_urls)
+                    WRONG_PAGE_URLS.update(wrong_urls)
                     all_urls.clear()
                     wrong_urls.clear()
 
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'), all_urls)
-    utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'wrong', 'pages'), wrong_urls)
+    WRONG_PAGE_URLS.update(wrong_urls)
     logger.info(f"🎉 全部完成，共处理 {len(page_urls)} 个页面。")
 
     return all_urls
@@ -218,23 +226,23 @@ def download_images_thread(image_infos, save_dir, max_workers=8):
     
     :param image_infos: 图像信息列表。
     :param save_dir: 保存目录。
-    :param max_workers: 最大工作线程数。
+    :param max_workers: 最大工作线程数（实际并发由按主机的自适应并发上限控制）。
     """
     os.makedirs(save_dir, exist_ok=True)
     if not image_infos:
         logger.warning('urls empty')
         return
 
-    old_idx = IMAGE_IDX
+    old_count = IMAGE_IDS.allocated
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = [executor.submit(download_image, info, save_dir) for info in image_infos]
         for future in as_completed(futures):
             future.result()
             
-    config.update_idx(WEB_NAME, type_name, 'images', IMAGE_IDX)
+    IMAGE_IDS.release()  # 归还未使用的索引
     
-    logger.info(f"下载全部完成，本次共下载{IMAGE_IDX - old_idx}个视频（新计数值，IMAGE_IDX={IMAGE_IDX})")
+    logger.info(f"下载全部完成，本次共下载{IMAGE_IDS.allocated - old_count}个视频（新计数值，IMAGE_IDX={IMAGE_IDS.peek()})")
 
 
 def download_images(image_infos, save_dir):
@@ -249,14 +257,14 @@ def download_images(image_infos, save_dir):
         logger.warning('urls empty')
         return
 
-    old_idx = IMAGE_IDX
+    old_count = IMAGE_IDS.allocated
 
     for image_info in image_infos:
         download_image(image_info, save_dir)
     
-    config.update_idx(WEB_NAME, type_name, 'images', IMAGE_IDX)
+    IMAGE_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{IMAGE_IDX - old_idx}个视频（新计数值，IMAGE_IDX={IMAGE_IDX})")
+    logger.info(f"下载全部完成，本次共下载{IMAGE_IDS.allocated - old_count}个视频（新计数值，IMAGE_IDX={IMAGE_IDS.peek()})")
 
 
 def download_image(image_info, save_dir):
@@ -285,46 +293,51 @@ def download_image(image_info, save_dir):
 
     wrong_url = None
 
-    for _ in range(3):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(image_url, max_attempts=3)
+    for _ in retry:
         proxies = {
             'http': 'http://127.0.0.1:2081',
             'https': 'http://127.0.0.1:2081',
         }
         try:
-            response = requests.get(image_url, headers=header, proxies=proxies, timeout=10)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-            image_data = response.content
-
-            current_time = utils.get_formatted_timestamp()
-
-            filename = f'{type_name[0].upper()}_pf{image_id}_{current_time}_RGB.jpg'
             dir_name = f'pf{image_id}'
+            image_dir = os.path.join(save_dir, dir_name)
 
-            save_path = os.path.join(save_dir, dir_name, filename)
-            os.makedirs(os.path.join(save_dir, dir_name), exist_ok=True)
+            # 流式写入临时文件，内存占用与图片大小和线程数无关
+            # 只在下载期间占用主机的自适应并发名额（遇到 429/403/超时自动降低），重试退避时不占用
+            with utils.adaptive_slot(image_url):
+                temp_path = utils.download_temp_file(image_url, image_dir, headers=header, proxies=proxies, timeout=10)
+            retry.succeed(proxies)
 
-            with open(save_path, 'wb') as file:
-                file.write(image_data)
-
-            with FILE_LOCKS['success']:
-                utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'images'), [image_url])
+            # 同一宠物的图片多线程下载时可能生成相同时间戳，由 commit_temp_file 保证文件名不重复
+            save_path = utils.commit_temp_file(temp_path, lambda: os.path.join(
+                image_dir, f'{type_name[0].upper()}_pf{image_id}_{utils.get_formatted_timestamp()}_RGB.jpg'))
 
             with USED_URLS_LOCK:
                 USED_IMAGE_URLS.add(image_url)
 
+            # 内容重复且只记入清单时没有生成文件；近重复图片（缩放、重新编码等）按配置拒绝或标记
+            if save_path is None or utils.check_near_duplicate(save_path):
+                wrong_url = None
+                break
+
             add_idx()
 
             logger.info(f"图片已成功下载到 {save_path}")
             wrong_url = None
             break
+        except utils.OversizedDownloadError as e:
+            logger.warning(f"跳过下载: {e}")
+            wrong_url = image_url
+            break
         except requests.exceptions.RequestException as e:
             logger.error(f"下载失败: {e}")
             wrong_url = image_url
-            continue
+            retry.fail(e, proxies)
 
     if wrong_url:
-        with FILE_LOCKS['fail']:
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'wrong', 'images'), [wrong_url])
+        WRONG_IMAGE_URLS.add(wrong_url)
 
 
 def run(save_dir, max_page=10, max_search_workers=1, max_download_workers=1, random_proxy=False, random_user_agent=False, 
@@ -334,8 +347,8 @@ def run(save_dir, max_page=10, max_search_workers=1, max_download_workers=1, ran
     
     :param save_dir: 保存路径。
     :param max_page: 最大爬取页面数量。
-    :param max_search_workers: 最大搜索线程数。
-    :param max_download_workers: 最大下载线程数。
+    :param max_search_workers: 最大搜索线程数（自适应并发的上限）。
+    :param max_download_workers: 最大下载线程数（自适应并发的上限）。
     :param random_proxy: 是否使用随机代理。
     :param random_user_agent: 是否使用随机User-Agent。
     :param headless: 是否启用无头模式。
@@ -346,7 +359,7 @@ def run(save_dir, max_page=10, max_search_workers=1, max_download_workers=1, ran
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_image_idx = IMAGE_IDX
+    old_image_count = IMAGE_IDS.allocated
 
     logger.info(f'========== 开始处理: {type_name} ==========')
     try:
@@ -360,7 +373,7 @@ def run(save_dir, max_page=10, max_search_workers=1, max_download_workers=1, ran
             return
         
         if have_urls:
-            image_urls = utils.read_list_from_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'))
+            image_urls = utils.read_list_from_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'), parse=True)
         else:
             image_urls = get_images_in_pages(pages, max_search_workers)
         
@@ -377,6 +390,6 @@ def run(save_dir, max_page=10, max_search_workers=1, max_download_workers=1, ran
     logger.info(f'========== 完成: {type_name} ==========')
     
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     image_idx=IMAGE_IDX,
-                     new_image_count=IMAGE_IDX-old_image_idx)
+                     image_idx=IMAGE_IDS.peek(),
+                     new_image_count=IMAGE_IDS.allocated - old_image_count)
         
\ No newline at end of file
@@ -4,12 +4,13 @@ Project Name: web_crawler
 File Created: 2025.02.08
 Author: ZhangYuetao
 File Name: taobao.py
-Update：2025.06.16
+Update: 2026.10.18
 """
 
 import os
 import random
 import re
+import threading
 import time
 
 import requests
@@ -24,28 +25,31 @@ import utils
 import config
 from logger import logger
 
+USED_URLS_LOCK = threading.Lock()        # 用于保护 USED_VIDEO_URLS 的访问与历史记录写入
+
 WEB_NAME = 'taobao'
 
 basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-VIDEO_IDX = config.get_idx(WEB_NAME, type_name, 'videos')
+VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')  # 按块预留视频索引，线程与进程间不重复
 
-USED_VIDEO_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'))
-USED_PAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'))
+USED_VIDEO_URLS = utils.HistorySet(WEB_NAME, type_name, 'videos')
+USED_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'pages')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   video_idx=VIDEO_IDX,
+                   video_idx=VIDEO_IDS.peek(),
                    used_video_urls=USED_VIDEO_URLS, used_page_urls=USED_PAGE_URLS)
 
 
 def add_idx():
     """
     增加视频索引。
+
+    :return: 本次占用的视频索引。
     """
-    global VIDEO_IDX
-    VIDEO_IDX = VIDEO_IDX + 1
+    return VIDEO_IDS.allocate()
 
 
 def get_taobao_pages(keyword, max_page=10, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -68,7 +72,7 @@ def get_taobao_pages(keyword, max_page=10, random_proxy=False, random_user_agent
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://login.taobao.com/member/login.jhtml')
+        utils.driver_get(driver, 'https://login.taobao.com/member/login.jhtml')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -80,8 +84,11 @@ def get_taobao_pages(keyword, max_page=10, random_proxy=False, random_user_agent
     
     search_url = f'https://s.taobao.com/search?commend=all&page=1&q={keyword}&search_type=item&tab=all'
 
-    driver.get(search_url)
-    time.sleep(5)
+    utils.driver_get(driver, search_url)
+    try:
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, 'content_items_wrapper')))
+    except Exception as e:
+        logger.warning(f"等待搜索结果加载超时: {e}")
 
 
     for page in range(1, max_page + 1):
@@ -126,8 +133,8 @@ def get_taobao_pages(keyword, max_page=10, random_proxy=False, random_user_agent
             # 查找并点击“下一页”按钮
             xpath = '//*[@id="search-content-leftWrap"]/div[2]/div[4]/div/div/button[2]/span'
             next_button = driver.find_element(By.XPATH, xpath)
+            utils.throttle(search_url)  # 翻页会向网站发起请求，与页面请求共享限速额度
             next_button.click()
-            time.sleep(3)  # 等待页面加载
         except Exception as e:
             logger.error("未能找到“下一页”按钮，停止获取：", e)
             break
@@ -158,7 +165,7 @@ def search_images_in_taobao_shops(page_urls, max_scroll=10, random_proxy=False,
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://login.taobao.com/member/login.jhtml')
+        utils.driver_get(driver, 'https://login.taobao.com/member/login.jhtml')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -174,14 +181,14 @@ def search_images_in_taobao_shops(page_urls, max_scroll=10, random_proxy=False,
             continue
         
         # 加载商品详情页面
-        driver.get(page_url)
-        time.sleep(float(round(random.uniform(4, 6), 1)))
+        utils.driver_get(driver, page_url)
 
         # 定位并点击“全部评价”按钮
         try:
             # 使用你提供的固定 XPath 定位元素
             all_reviews_xpath = "/html/body/div[3]/div/div[2]/div[1]/div[2]/div/div[2]/div/div[2]/div[1]/div/div[4]/div"
-            all_reviews_button = driver.find_element(By.XPATH, all_reviews_xpath)
+            all_reviews_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, all_reviews_xpath)))
+            utils.throttle(page_url)  # 点击会向网站发起请求，与页面请求共享限速额度
             all_reviews_button.click()
             logger.info("成功点击 '全部评价' 按钮。")
         except Exception as e:
@@ -189,13 +196,12 @@ def search_images_in_taobao_shops(page_urls, max_scroll=10, random_proxy=False,
             # driver.quit()
             return []
 
-        time.sleep(float(round(random.uniform(4, 6), 1)))
-
         # 点击有图/视频
         try:
             # 使用你提供的固定 XPath 定位元素
             all_reviews_xpath = "/html/body/div[8]/div[2]/div/div[2]/div[1]/div[1]/span[2]"
-            all_reviews_button = driver.find_element(By.XPATH, all_reviews_xpath)
+            all_reviews_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, all_reviews_xpath)))
+            utils.throttle(page_url)
             all_reviews_button.click()
             logger.info("成功点击 '有图/视频' 按钮。")
         except Exception as e:
@@ -284,7 +290,6 @@ def search_images_in_taobao_shops(page_urls, max_scroll=10, random_proxy=False,
         # input("任务完成，按 Enter 键退出...")
         # driver.quit()
         
-        utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'), [page_url])
         USED_PAGE_URLS.add(page_url)
         
         utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
@@ -309,14 +314,13 @@ def download_videos(video_infos, save_dir):
         logger.warning('urls empty')
         return
 
-    old_idx = VIDEO_IDX
+    old_count = VIDEO_IDS.allocated
 
-    for video_info in video_infos:
-        download_taobao_video(video_info, save_dir)
+    utils.run_downloads(video_infos, download_taobao_video, save_dir)
     
-    config.update_idx(WEB_NAME, type_name, 'videos', VIDEO_IDX)
+    VIDEO_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{VIDEO_IDX - old_idx}个视频（新计数值，VIDEO_IDX={VIDEO_IDX})")
+    logger.info(f"下载全部完成，本次共下载{VIDEO_IDS.allocated - old_count}个视频（新计数值，VIDEO_IDX={VIDEO_IDS.peek()})")
 
 
 def download_taobao_video(video_url, save_dir):
@@ -330,54 +334,41 @@ def download_taobao_video(video_url, save_dir):
         logger.info('empty！')
         return
 
-    if video_url in USED_VIDEO_URLS:
-        logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if video_url in USED_VIDEO_URLS:
+            logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
+            return
 
-    for _ in range(5):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(video_url, max_attempts=5)
+    for _ in retry:
         header = {
             'User-Agent': utils.get_random_user_agent(),
         }
         proxy = utils.get_random_proxy()
         
         try:
-            response = requests.get(video_url, headers=header, proxies={'http': proxy}, stream=True, timeout=10)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-
-            current_time = utils.get_formatted_timestamp()
-
-            filename = f'{type_name[0].upper()}_tb{VIDEO_IDX:05d}_{current_time}_RGB.mp4'
-
-            save_path = os.path.join(save_dir, filename)
-
-            # 将视频内容写入文件
-            with open(save_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        file.write(chunk)
-
-            # 判断视频类型
-            try:
-                video_type = utils.check_video_type(save_path)  # 调用前面定义的函数
-            except:
-                video_type = "RGB"
-
-            # 如果是 IR 视频，修改文件名
-            if video_type == "IR":
-                new_filename = filename.replace("_RGB.mp4", "_IR.mp4")
-                new_save_path = os.path.join(save_dir, new_filename)
-                os.rename(save_path, new_save_path)
-                save_path = new_save_path  # 更新路径
-
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'), [video_url])
-            USED_VIDEO_URLS.add(video_url)
-            add_idx()
-
-            logger.info(f"视频已成功下载到 {save_path}")
+            # 下载到 .part 文件（大文件分段并发，各分段使用不同代理），失败后的重试或重新运行时断点续传
+            part_path = utils.download_segmented_file(video_url, save_dir, headers=header, proxies={'http': proxy}, timeout=10,
+                                                      get_proxies=lambda: {'http': utils.get_random_proxy()})
+            retry.succeed(proxy)
+
+            video_idx = add_idx()
+            save_path = utils.commit_part_file(part_path, lambda: os.path.join(
+                save_dir, f'{type_name[0].upper()}_tb{video_idx:05d}_{utils.get_formatted_timestamp()}_RGB.mp4'))
+
+            with USED_URLS_LOCK:
+                USED_VIDEO_URLS.add(video_url)
+
+            # 内容重复且只记入清单时没有生成文件，无需分类
+            if save_path is not None:
+                # 抽帧判断视频类型并在需要时改名为 _IR，由进程池异步完成，不阻塞下载线程
+                utils.submit_video_classification(save_path)
+                logger.info(f"视频已成功下载到 {save_path}")
             break
         except requests.exceptions.RequestException as e:
             logger.error(f"{proxy}_下载失败: {e}")
-            continue
+            retry.fail(e, proxy)
 
 
 def run(keywords, save_dir, max_page=10, max_scroll=10, random_proxy=False, random_user_agent=False, 
@@ -399,7 +390,7 @@ def run(keywords, save_dir, max_page=10, max_scroll=10, random_proxy=False, rand
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
 
     for keyword in keywords:
         logger.infov(f'========== 开始处理关键词: {keyword} ==========')
@@ -427,7 +418,9 @@ def run(keywords, save_dir, max_page=10, max_scroll=10, random_proxy=False, rand
         except Exception as e:
             logger.error(f"[关键词: {keyword}] 抓取失败: {e}")
         logger.info(f'========== 完成关键词: {keyword} ==========')
-    
+
+    # 等待异步的视频分类与重命名完成后再输出统计
+    utils.wait_video_classification()
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     video_idx=VIDEO_IDX,
-                     new_video_count=VIDEO_IDX-old_video_idx)
+                     video_idx=VIDEO_IDS.peek(),
+                     new_video_count=VIDEO_IDS.allocated - old_video_count)
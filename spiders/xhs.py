@@ -4,12 +4,13 @@ Project Name: web_crawler
 File Created: 2024.12.06
 Author: ZhangYuetao
 File Name: xhs.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
 import time
 import re
+import threading
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -19,38 +20,42 @@ import utils
 import config
 from logger import logger
 
+USED_URLS_LOCK = threading.Lock()        # 用于保护已使用 URL 集合的访问与历史记录写入
+
 WEB_NAME = 'xhs'
 
 basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-VIDEO_IDX = config.get_idx(WEB_NAME, type_name, 'videos')
-IMAGE_IDX = config.get_idx(WEB_NAME, type_name, 'images')
+VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')  # 按块预留视频索引，线程与进程间不重复
+IMAGE_IDS = utils.IdAllocator(WEB_NAME, type_name, 'images')  # 按块预留图片索引，线程与进程间不重复
 
-USED_VIDEO_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'))
-USED_IMAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'images'))
-USED_PAGE_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'))
+USED_VIDEO_URLS = utils.HistorySet(WEB_NAME, type_name, 'videos')
+USED_IMAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'images')
+USED_PAGE_URLS = utils.HistorySet(WEB_NAME, type_name, 'pages')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   video_idx=VIDEO_IDX, image_idx=IMAGE_IDX,
+                   video_idx=VIDEO_IDS.peek(), image_idx=IMAGE_IDS.peek(),
                    used_video_urls=USED_VIDEO_URLS, used_image_urls=USED_IMAGE_URLS, used_page_urls=USED_PAGE_URLS)
 
 
 def add_video_idx():
     """
     增加视频索引。
+
+    :return: 本次占用的视频索引。
     """
-    global VIDEO_IDX
-    VIDEO_IDX = VIDEO_IDX + 1
+    return VIDEO_IDS.allocate()
 
 
 def add_image_idx():
     """
     增加图片索引。
+
+    :return: 本次占用的图片索引。
     """
-    global IMAGE_IDX
-    IMAGE_IDX = IMAGE_IDX + 1
+    return IMAGE_IDS.allocate()
 
 
 def search_xhs_pages(keyword, max_scroll=10, save_way=0, random_proxy=False, random_user_agent=False, headless=False, use_open_chrome=False, need_load=False):
@@ -74,7 +79,7 @@ def search_xhs_pages(keyword, max_scroll=10, save_way=0, random_proxy=False, ran
     if need_load:
         logger.info("需要手动登录页面")
         # 加载登录页面
-        driver.get('https://www.xiaohongshu.com/login')
+        utils.driver_get(driver, 'https://www.xiaohongshu.com/login')
         
         # 等待用户手动登录
         print("请在浏览器中手动登录，登录完成后按 Enter 键继续...")
@@ -93,7 +98,7 @@ def search_xhs_pages(keyword, max_scroll=10, save_way=0, random_proxy=False, ran
     # 爬取视频
     if save_way == 0  or save_way == 1:
         try:
-            driver.get(search_url)
+            utils.driver_get(driver, search_url)
 
             time.sleep(5)
             
@@ -117,6 +122,7 @@ def search_xhs_pages(keyword, max_scroll=10, save_way=0, random_proxy=False, ran
 
             # 获取当前页面内容
             html = driver.page_source
+            utils.archive_page(WEB_NAME, type_name, driver.current_url, html, kind='search')
 
             # 使用正则表达式查找 URL
             pattern = r'href="([^"]+)"'
@@ -137,7 +143,7 @@ def search_xhs_pages(keyword, max_scroll=10, save_way=0, random_proxy=False, ran
     # 爬取图片
     if save_way == 0 or save_way == 2:
         try:
-            driver.get(search_url)
+            utils.driver_get(driver, search_url)
 
             time.sleep(5)
             
@@ -159,6 +165,7 @@ def search_xhs_pages(keyword, max_scroll=10, save_way=0, random_proxy=False, ran
 
             # 获取当前页面内容
             html = driver.page_source
+            utils.archive_page(WEB_NAME, type_name, driver.current_url, html, kind='search')
 
             # 使用正则表达式查找 URL
             pattern = r'href="([^"]+)"'
@@ -180,11 +187,29 @@ def search_xhs_pages(keyword, max_scroll=10, save_way=0, random_proxy=False, ran
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'pages'), all_urls)
     logger.info(f"获取到 {len(all_urls)} 条 URL。")
 
-    driver.get('https://www.baidu.com')
+    utils.driver_get(driver, 'https://www.baidu.com')
 
     return all_urls
 
 
+def extract_note_urls(html):
+    """
+    从笔记页面中提取视频和图片链接。
+    
+    :param html: 页面 HTML。
+    :return: 视频url列表，图片url列表。
+    """
+    pattern_image = r'<meta name="og:image" content="([^"]+)"'
+    pattern_video = r'<meta name="og:video" content="([^"]+)"'
+    image_matches = re.findall(pattern_image, html)
+    video_matches = re.findall(pattern_video, html)
+
+    if video_matches:
+        return video_matches, []
+
+    return [], [url for url in image_matches if 'picasso-static.xiaohongshu.com' not in url]
+
+
 def get_xhs_urls(all_urls):
     """
     获取视频和图片链接。
@@ -200,7 +225,10 @@ def get_xhs_urls(all_urls):
             logger.info(f"笔记链接 {note_url} 已经处理过，跳过下载。")
             continue
         
-        for _ in range(5):
+        # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+        retry = utils.RetryPolicy(note_url, max_attempts=5)
+        for _ in retry:
+            proxy = utils.get_random_proxy()
             try:
                 logger.info(f'begin{note_url}')
                 
@@ -209,39 +237,29 @@ def get_xhs_urls(all_urls):
                     'Referer': 'https://www.xiaohongshu.com/',  # 设置Referer
                 }
 
-                proxy = utils.get_random_proxy()
-
-                response = requests.get(note_url, headers=headers, proxies={'https': proxy}, timeout=10)
+                # 条件请求：页面未变化（304 或正文摘要相同）说明之前已解析过，跳过解析
+                response, modified = utils.conditional_get(WEB_NAME, type_name, note_url, headers=headers, proxies={'https': proxy}, timeout=10)
                 response.raise_for_status()
+                retry.succeed(proxy)
 
-                html = response.text
+                if modified:
+                    utils.archive_page(WEB_NAME, type_name, note_url, response.text)
 
-                pattern_image = r'<meta name="og:image" content="([^"]+)"'
-                pattern_video = r'<meta name="og:video" content="([^"]+)"'
-                image_matches = re.findall(pattern_image, html)
-                video_matches = re.findall(pattern_video, html)
-
-                if video_matches:
-                    for url in video_matches:
+                    note_video_urls, note_image_urls = extract_note_urls(response.text)
+                    for url in note_video_urls + note_image_urls:
                         logger.debug(url)
-                        video_urls.append(url)
-
-                else:
-                    if image_matches:
-                        for url in image_matches:
-                            if 'picasso-static.xiaohongshu.com' not in url:
-                                logger.debug(url)
-                                image_urls.append(url)
+                    video_urls.extend(note_video_urls)
+                    image_urls.extend(note_image_urls)
 
                 logger.info(f'end{note_url}')
-                utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'pages'), [note_url])
                 USED_PAGE_URLS.add(note_url)
+                utils.save_http_cache(WEB_NAME, type_name, note_url, response)
                 
                 break
 
             except Exception as e:
                 logger.error(f'{proxy}获取url失败: {e}')
-                continue
+                retry.fail(e, proxy)
         
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
     utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'), image_urls)
@@ -250,6 +268,26 @@ def get_xhs_urls(all_urls):
     return video_urls, image_urls
 
 
+def reparse():
+    """
+    从页面存档重新提取视频和图片链接（修改提取规则后无需重新爬取），结果追加到获取记录中。
+    
+    :return: 视频url列表，图片url列表。
+    """
+    video_urls = []
+    image_urls = []
+
+    for _, (note_video_urls, note_image_urls) in utils.reparse_archive(WEB_NAME, type_name, lambda url, html: extract_note_urls(html)):
+        video_urls.extend(note_video_urls)
+        image_urls.extend(note_image_urls)
+
+    utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'videos'), video_urls)
+    utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'get', 'images'), image_urls)
+    logger.info(f"重新解析获取到 {len(video_urls)} 条视频URL, {len(image_urls)}条图片URL。")
+
+    return video_urls, image_urls
+
+
 def download_xhs_urls(video_urls, image_urls, save_dir, save_way=0):
     """
     下载视频和图片。
@@ -268,25 +306,21 @@ def download_xhs_urls(video_urls, image_urls, save_dir, save_way=0):
         logger.warning('urls empty')
         return
 
-    old_video_idx = VIDEO_IDX
-    old_image_idx = IMAGE_IDX
+    old_video_count = VIDEO_IDS.allocated
+    old_image_count = IMAGE_IDS.allocated
 
     if save_way == 0:
-        for video_url in video_urls:
-            download_xhs_video(video_url, video_dir)
-        for image_url in image_urls:
-            download_xhs_image(image_url, image_dir)
+        utils.run_downloads(video_urls, download_xhs_video, video_dir)
+        utils.run_downloads(image_urls, download_xhs_image, image_dir)
     elif save_way == 1:
-        for video_url in video_urls:
-            download_xhs_video(video_url, video_dir)
+        utils.run_downloads(video_urls, download_xhs_video, video_dir)
     else:
-        for image_url in image_urls:
-            download_xhs_image(image_url, image_dir)
+        utils.run_downloads(image_urls, download_xhs_image, image_dir)
             
-    config.update_idx(WEB_NAME, type_name, 'videos', VIDEO_IDX)
-    config.update_idx(WEB_NAME, type_name, 'images', IMAGE_IDX)
+    VIDEO_IDS.release()  # 归还未使用的索引
+    IMAGE_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{VIDEO_IDX-old_video_idx}个视频，{IMAGE_IDX-old_image_idx}个图片（新计数值，VIDEO_IDX={VIDEO_IDX},IMAGE_IDX={IMAGE_IDX})")
+    logger.info(f"下载全部完成，本次共下载{VIDEO_IDS.allocated - old_video_count}个视频，{IMAGE_IDS.allocated - old_image_count}个图片（新计数值，VIDEO_IDX={VIDEO_IDS.peek()},IMAGE_IDX={IMAGE_IDS.peek()})")
 
 
 def download_xhs_video(video_url, save_dir):
@@ -300,11 +334,14 @@ def download_xhs_video(video_url, save_dir):
         logger.info('视频链接为空，跳过下载。')
         return
 
-    if video_url in USED_VIDEO_URLS:
-        logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if video_url in USED_VIDEO_URLS:
+            logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
+            return
 
-    for _ in range(5):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(video_url, max_attempts=5)
+    for _ in retry:
         proxy = utils.get_random_proxy()
         try:
             header = {
@@ -312,28 +349,23 @@ def download_xhs_video(video_url, save_dir):
                 'Referer': 'https://www.xiaohongshu.com/',  # 设置Referer
             }
                 
-            response = requests.get(video_url, headers=header, proxies={'https': proxy}, stream=True, timeout=10)
-            response.raise_for_status()  # 如果请求失败，抛出异常
+            # 下载到 .part 文件，失败后的重试或重新运行时通过 Range 请求断点续传
+            part_path = utils.download_part_file(video_url, save_dir, headers=header, proxies={'https': proxy}, timeout=10)
+            retry.succeed(proxy)
 
-            current_time = utils.get_formatted_timestamp()
-            filename = f'{type_name[0].upper()}_xhsv{VIDEO_IDX:05d}_{current_time}_RGB.mp4'
-            save_path = os.path.join(save_dir, filename)
+            video_idx = add_video_idx()
+            save_path = utils.commit_part_file(part_path, lambda: os.path.join(
+                save_dir, f'{type_name[0].upper()}_xhsv{video_idx:05d}_{utils.get_formatted_timestamp()}_RGB.mp4'))
 
-            # 将视频内容写入文件
-            with open(save_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        file.write(chunk)
+            with USED_URLS_LOCK:
+                USED_VIDEO_URLS.add(video_url)
 
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'), [video_url])
-            USED_VIDEO_URLS.add(video_url)
-            add_video_idx()
-
-            logger.info(f"视频已成功下载到 {save_path}")
+            if save_path is not None:
+                logger.info(f"视频已成功下载到 {save_path}")
             break
         except Exception as e:
             logger.error(f"{proxy}_下载失败: {e}")
-            continue
+            retry.fail(e, proxy)
 
 
 def download_xhs_image(image_url, save_dir):
@@ -347,11 +379,14 @@ def download_xhs_image(image_url, save_dir):
         logger.info('图片链接为空，跳过下载。')
         return
 
-    if image_url in USED_IMAGE_URLS:
-        logger.info(f"图片链接 {image_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if image_url in USED_IMAGE_URLS:
+            logger.info(f"图片链接 {image_url} 已经处理过，跳过下载。")
+            return
 
-    for _ in range(5):
+    # 按异常分类决定是否重试，重试前指数退避，失败的代理与主机由熔断器暂停使用
+    retry = utils.RetryPolicy(image_url, max_attempts=5)
+    for _ in retry:
         proxy = utils.get_random_proxy()
         
         header = {
@@ -359,26 +394,29 @@ def download_xhs_image(image_url, save_dir):
                 'Referer': 'https://www.xiaohongshu.com/',  # 设置Referer
             }
         try:
-            response = requests.get(image_url, headers=header, proxies={'https': proxy}, stream=True, timeout=10)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-            image_data = response.content
+            # 流式写入临时文件，内存占用与图片大小和并发数无关
+            temp_path = utils.download_temp_file(image_url, save_dir, headers=header, proxies={'https': proxy}, timeout=10)
+            retry.succeed(proxy)
 
-            current_time = utils.get_formatted_timestamp()
-            filename = f'{type_name[0].upper()}_xhsi{IMAGE_IDX:05d}_{current_time}_RGB.jpg'
-            save_path = os.path.join(save_dir, filename)
+            image_idx = add_image_idx()
+            save_path = utils.commit_temp_file(temp_path, lambda: os.path.join(
+                save_dir, f'{type_name[0].upper()}_xhsi{image_idx:05d}_{utils.get_formatted_timestamp()}_RGB.jpg'))
 
-            with open(save_path, 'wb') as file:
-                file.write(image_data)
+            with USED_URLS_LOCK:
+                USED_IMAGE_URLS.add(image_url)
 
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'images'), [image_url])
-            USED_IMAGE_URLS.add(image_url)
-            add_image_idx()
+            # 内容重复且只记入清单时没有生成文件；近重复图片（缩放、重新编码等）按配置拒绝或标记
+            if save_path is None or utils.check_near_duplicate(save_path):
+                break
 
             logger.info(f"图片已成功下载到 {save_path}")
             break
+        except utils.OversizedDownloadError as e:
+            logger.warning(f"跳过下载: {e}")
+            break
         except requests.exceptions.RequestException as e:
             logger.error(f"{proxy}_下载失败: {e}")
-            continue
+            retry.fail(e, proxy)
 
 
 def run(keywords, save_dir, max_scroll=10, save_way=0, random_proxy=False, random_user_agent=False, 
@@ -400,8 +438,8 @@ def run(keywords, save_dir, max_scroll=10, save_way=0, random_proxy=False, rando
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_video_idx = VIDEO_IDX
-    old_image_idx = IMAGE_IDX
+    old_video_count = VIDEO_IDS.allocated
+    old_image_count = IMAGE_IDS.allocated
 
     for keyword in keywords:
         logger.info(f'========== 开始处理关键词: {keyword} ==========')
@@ -432,5 +470,5 @@ def run(keywords, save_dir, max_scroll=10, save_way=0, random_proxy=False, rando
         logger.info(f'========== 完成关键词: {keyword} ==========')
     
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     video_idx=VIDEO_IDX, image_idx=IMAGE_IDX,
-                     new_video_count=VIDEO_IDX-old_video_idx, new_image_count=IMAGE_IDX-old_image_idx)
+                     video_idx=VIDEO_IDS.peek(), image_idx=IMAGE_IDS.peek(),
+                     new_video_count=VIDEO_IDS.allocated - old_video_count, new_image_count=IMAGE_IDS.allocated - old_image_count)
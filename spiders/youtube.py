@@ -4,14 +4,14 @@ Project Name: web_crawler
 File Created: 2024.12.04
 Author: ZhangYuetao
 File Name: youtube.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import os
+import threading
 
 import socks
 import socket
-from yt_dlp import YoutubeDL
 from googleapiclient.discovery import build
 
 import config
@@ -27,21 +27,23 @@ basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTI
 save_path = basic_setting["save_path"]
 type_name = basic_setting["type_name"]
 
-VIDEO_IDX = config.get_idx(WEB_NAME, type_name, 'videos')
+VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')  # 按块预留视频索引，线程与进程间不重复
+USED_URLS_LOCK = threading.Lock()  # 用于保护 USED_VIDEO_URLS 与已用记录文件的修改
 
-USED_VIDEO_URLS = config.init_used_urls(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'))
+USED_VIDEO_URLS = utils.HistorySet(WEB_NAME, type_name, 'videos')
 
 utils.begin_logger(WEB_NAME, save_path, type_name, 
-                   video_idx=VIDEO_IDX,
+                   video_idx=VIDEO_IDS.peek(),
                    used_video_urls=USED_VIDEO_URLS)
 
 
 def add_idx():
     """
     增加视频索引。
+
+    :return: 本次占用的视频索引。
     """
-    global VIDEO_IDX
-    VIDEO_IDX = VIDEO_IDX + 1
+    return VIDEO_IDS.allocate()
 
 
 def search_youtube_videos(keyword, max_results=10):
@@ -70,7 +72,41 @@ def search_youtube_videos(keyword, max_results=10):
     return video_urls
 
 
-def download_video(video_url, save_path, proxy='http://127.0.0.1:2081', retries=3):
+def get_ydl_opts(proxy='http://127.0.0.1:2081'):
+    """
+    获取下载视频的 yt_dlp 参数（输出路径由下载引擎设置）。
+
+    :param proxy: 代理设置。
+    :return: yt_dlp 参数字典。
+    """
+    return {
+        'proxy': proxy,  # 设置代理
+        'format': 'mp4[height<=1080]',  # 选择画质
+        'noplaylist': True,  # 如果是播放列表，下载第一个视频
+        'quiet': False,  # 显示下载进度
+    }
+
+
+def save_video(video_url, temp_path, save_path):
+    """
+    后处理完成后保存视频：占用索引并生成文件名（并行下载时不会重名），记录已下载的链接。
+
+    :param video_url: 视频网页地址。
+    :param temp_path: 后处理完成的临时文件路径。
+    :param save_path: 保存视频的文件夹路径。
+    """
+    video_idx = add_idx()
+    file_path = utils.commit_temp_file(temp_path, lambda: os.path.join(
+        save_path, f'{type_name[0].upper()}_ytb{video_idx:05d}_{utils.get_formatted_timestamp()}_RGB.mp4'))
+
+    with USED_URLS_LOCK:
+        USED_VIDEO_URLS.add(video_url)
+
+    if file_path is not None:
+        logger.info(f"视频已成功下载到：{file_path}")
+
+
+def download_video(video_url, save_path, proxy='http://127.0.0.1:2081', retries=3, engine=None):
     """
     下载单个视频函数。
     
@@ -78,46 +114,32 @@ def download_video(video_url, save_path, proxy='http://127.0.0.1:2081', retries=
     :param save_path: 保存路径。
     :param proxy: 代理设置。
     :param retries: 重试次数。
+    :param engine: yt-dlp 下载引擎，为空时临时创建。
     """
     if not video_url:
         logger.info('empty！')
         return
 
-    if video_url in USED_VIDEO_URLS:
-        logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
-        return
+    with USED_URLS_LOCK:
+        if video_url in USED_VIDEO_URLS:
+            logger.info(f"视频链接 {video_url} 已经处理过，跳过下载。")
+            return
     # 确保保存路径存在
     os.makedirs(save_path, exist_ok=True)
 
-    current_time = utils.get_formatted_timestamp()
-    filename = f'{type_name[0].upper()}_ytb{VIDEO_IDX:05d}_{current_time}_RGB.mp4'
+    if engine is None:
+        with utils.YtdlpEngine(get_ydl_opts(proxy), save_path, workers=1) as engine:
+            download_video(video_url, save_path, proxy, retries, engine)
+        utils.wait_postprocess()
+        return
 
-    # 配置 yt_dlp 的参数
-    ydl_opts = {
-        'proxy': proxy,  # 设置代理
-        'format': 'mp4[height<=1080]',  # 选择画质
-        'outtmpl': os.path.join(save_path, filename),  # 输出文件名格式
-        'noplaylist': True,  # 如果是播放列表，下载第一个视频
-        'quiet': False,  # 显示下载进度
-        'postprocessors': [{
-            'key': 'FFmpegVideoConvertor',
-            'preferedformat': 'mp4'  # 确保视频输出为 MP4 格式
-        }],
-        'postprocessor_args': [
-            '-an'  # 去除音频
-        ],
-    }
-    
     for attempt in range(retries):
         try:
-            with YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
-            
-            utils.save_list_to_txt(config.get_save_history_path(WEB_NAME, type_name, 'used', 'videos'), [video_url])
-            USED_VIDEO_URLS.add(video_url)
-            add_idx()
-                
-            logger.info(f"视频已成功下载到：{save_path}")
+            temp_path = engine.download(video_url)
+
+            # 去除音频并转为 MP4 交给后处理进程池完成（H.264 等编码直接复制视频流），下载线程立即开始下一个视频
+            utils.submit_postprocess(temp_path, os.path.splitext(temp_path)[0] + '.an.mp4', None,
+                                     lambda path: save_video(video_url, path, save_path))
             break
         except Exception as e:
             logger.error(f"尝试 {attempt + 1}/{retries} 失败: {e}")
@@ -139,17 +161,18 @@ def download_videos(video_urls, save_path, proxy=None, retries=3):
     if not video_urls:
         logger.warning("未找到相关视频。")
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
 
     logger.info(f"导入 {len(video_urls)} 个视频，开始下载...")
 
-    for url in video_urls:
-        logger.info(f"正在下载视频 {url}")
-        download_video(url, save_path, proxy, retries)
+    # 长期复用的 yt-dlp 实例，多个视频并行下载
+    with utils.YtdlpEngine(get_ydl_opts(proxy), save_path) as engine:
+        engine.run(video_urls, lambda url: download_video(url, save_path, proxy, retries, engine))
+    utils.wait_postprocess()
 
-    config.update_idx(WEB_NAME, type_name, 'videos', VIDEO_IDX)
+    VIDEO_IDS.release()  # 归还未使用的索引
 
-    logger.info(f"下载全部完成，本次共下载{VIDEO_IDX-old_video_idx}个视频（新计数值，VIDEO_IDX={VIDEO_IDX})")
+    logger.info(f"下载全部完成，本次共下载{VIDEO_IDS.allocated - old_video_count}个视频（新计数值，VIDEO_IDX={VIDEO_IDS.peek()})")
 
 
 def run(keywords, save_dir, max_results=10, proxy=None, retries=3, have_urls=False):
@@ -165,7 +188,7 @@ def run(keywords, save_dir, max_results=10, proxy=None, retries=3, have_urls=Fal
     """
     os.makedirs(save_dir, exist_ok=True)
     
-    old_video_idx = VIDEO_IDX
+    old_video_count = VIDEO_IDS.allocated
 
     for keyword in keywords:
         logger.info(f'========== 开始处理关键词: {keyword} ==========')
@@ -185,5 +208,5 @@ def run(keywords, save_dir, max_results=10, proxy=None, retries=3, have_urls=Fal
         logger.info(f'========== 完成关键词: {keyword} ==========')
     
     utils.end_logger(WEB_NAME, save_dir, type_name, 
-                     video_idx=VIDEO_IDX,
-                     new_video_count=VIDEO_IDX-old_video_idx)
+                     video_idx=VIDEO_IDS.peek(),
+                     new_video_count=VIDEO_IDS.allocated - old_video_count)
@@ -4,7 +4,7 @@ Project Name: web_crawler
 File Created: 2025.06.09
 Author: ZhangYuetao
 File Name: start_crawler.py
-Update: 2025.06.18
+Update: 2026.10.18
 """
 
 import time
@@ -21,24 +21,28 @@ type_name = 'food'
 keyword_list = ['西瓜', '荔枝']
 need_open_chrome = True
 need_test_proxy = False
+need_compact_history = False  # 继续上次的获取记录（have_pages/have_urls）前去掉重复与已处理的记录
 # ----------------------------
 
-basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
-basic_setting["save_path"] = save_path
-basic_setting["type_name"] = type_name
-config.save_config(config.BASIC_SETTING_PATH, basic_setting)
+# 以下只在直接运行时执行：视频分类、后处理进程池在 spawn 方式（Windows 默认）下会重新导入主模块，
+# 放在模块顶层会让每个子进程都保存配置、整理记录并打开浏览器
+if __name__ == '__main__':
+    basic_setting = config.load_config(config.BASIC_SETTING_PATH, config.BASIC_SETTING_DEFAULT_CONFIG)
+    basic_setting["save_path"] = save_path
+    basic_setting["type_name"] = type_name
+    config.save_config(config.BASIC_SETTING_PATH, basic_setting)
 
-if need_test_proxy:
-    plugins.proxy_test.run()
-else:
-    if need_open_chrome:
-        print('begin opening chrome')
-        plugins.open_chrome.run()
-        time.sleep(5)
-        print('success opening chrome')
-    
+    if need_test_proxy:
+        plugins.proxy_test.run()
+    else:
+        if need_compact_history:
+            plugins.compact_history.run()
+        if need_open_chrome:
+            print('begin opening chrome')
+            plugins.open_chrome.run()
+            time.sleep(5)
+            print('success opening chrome')
 
-if __name__ == '__main__' and not need_test_proxy:    
-    spiders.xhs.run(keywords=keyword_list, save_dir=save_path, max_scroll=3, save_way=2, 
-                    random_proxy=False, random_user_agent=False, headless=False, 
-                    use_open_chrome=True, need_load=True, have_pages=False, have_urls=False)
+        spiders.xhs.run(keywords=keyword_list, save_dir=save_path, max_scroll=3, save_way=2, 
+                        random_proxy=False, random_user_agent=False, headless=False, 
+                        use_open_chrome=True, need_load=True, have_pages=False, have_urls=False)
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: conftest.py
+Update: 2026.10.18
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 将项目目录添加到导包路径
+
+# 日志、history、settings 等相对路径都在临时目录中创建，测试不读写项目目录，并使用默认配置
+os.chdir(tempfile.mkdtemp(prefix='web_crawler_tests_'))
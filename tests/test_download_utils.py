@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: test_download_utils.py
+Update: 2026.10.18
+"""
+
+import http.server
+import os
+import re
+import threading
+
+import pytest
+import requests
+
+from utils import download_utils
+from utils.download_utils import IncompleteDownloadError
+
+DATA = os.urandom(3 * 1024 * 1024 + 123)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    支持 Range 请求的本地测试服务器，可以关闭 Range 支持或在某个分段中途断开连接。
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server.state
+        range_header = self.headers.get('Range')
+        state['ranges'].append(range_header)
+
+        start, end = 0, len(DATA) - 1
+        if range_header and state['support_ranges']:
+            match = re.match(r'bytes=(\d*)-(\d*)', range_header)
+            start = int(match.group(1) or 0)
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            if start >= len(DATA):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(DATA)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+            self.send_header('Accept-Ranges', 'bytes')
+        else:
+            self.send_response(200)
+
+        body = DATA[start:end + 1]
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"test"')
+        self.end_headers()
+
+        # 探测请求（bytes=0-0）之外的第一个请求只返回一部分数据后断开
+        if state['drop_after'] and range_header != 'bytes=0-0':
+            drop_after, state['drop_after'] = state['drop_after'], None
+            self.wfile.write(body[:drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.daemon_threads = True
+    httpd.state = {'support_ranges': True, 'drop_after': None, 'ranges': []}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    yield httpd, f'http://127.0.0.1:{httpd.server_address[1]}/video.mp4'
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_segmented_download(server, tmp_path):
+    httpd, url = server
+
+    part_path = download_utils.download_segmented_file(url, str(tmp_path), segment_count=4, segment_threshold=1024 * 1024)
+
+    assert _read(part_path) == DATA
+    meta = download_utils._load_part_meta(part_path + '.json')
+    assert meta['complete'] and len(meta['segments']) == 4
+    assert len([r for r in httpd.state['ranges'] if r != 'bytes=0-0']) == 4
+
+    save_path = download_utils.commit_part_file(part_path, lambda: str(tmp_path / 'video.mp4'))
+    assert _read(save_path) == DATA
+    assert not os.path.exists(part_path) and not os.path.exists(part_path + '.json')
+
+
+def test_dropped_segment_resumes(server, tmp_path):
+    httpd, url = server
+    httpd.state['drop_after'] = 100 * 1024
+
+    with pytest.raises(IncompleteDownloadError):
+        download_utils.download_segmented_file(url, str(tmp_path), segment_count=4, segment_threshold=1024 * 1024)
+
+    part_path = download_utils.get_part_path(str(tmp_path), url)
+    segments = download_utils._load_part_meta(part_path + '.json')['segments']
+    unfinished = [segment for segment in segments if segment[0] + segment[2] <= segment[1]]
+    assert len(unfinished) == 1
+
+    # 续传只请求断开分段剩余的字节范围
+    httpd.state['ranges'].clear()
+    part_path = download_utils.download_segmented_file(url, str(tmp_path), segment_count=4, segment_threshold=1024 * 1024)
+
+    start, end, done = unfinished[0]
+    assert httpd.state['ranges'] == [f'bytes={start + done}-{end}']
+    assert _read(part_path) == DATA
+
+
+def test_small_file_uses_single_connection(server, tmp_path):
+    httpd, url = server
+
+    part_path = download_utils.download_segmented_file(url, str(tmp_path), segment_count=4, segment_threshold=len(DATA) + 1)
+
+    assert _read(part_path) == DATA
+    assert 'segments' not in download_utils._load_part_meta(part_path + '.json')
+    assert httpd.state['ranges'] == ['bytes=0-0', None]
+
+
+def test_server_without_range_support(server, tmp_path):
+    httpd, url = server
+    httpd.state['support_ranges'] = False
+
+    assert download_utils.probe_download(url) == (len(DATA), False)
+
+    part_path = download_utils.download_segmented_file(url, str(tmp_path), segment_count=4, segment_threshold=1024 * 1024)
+
+    assert _read(part_path) == DATA
+    assert 'segments' not in download_utils._load_part_meta(part_path + '.json')
+
+
+def test_single_stream_part_is_resumed(server, tmp_path):
+    httpd, url = server
+    httpd.state['drop_after'] = 100 * 1024
+
+    # 之前以单连接下载中断（例如当时文件较小或服务器不支持 Range）
+    with pytest.raises(requests.exceptions.RequestException):
+        download_utils.download_part_file(url, str(tmp_path))
+
+    downloaded = os.path.getsize(download_utils.get_part_path(str(tmp_path), url))
+    assert downloaded > 0
+
+    # 改为分段下载时继续单连接续传，不截断已下载的数据
+    httpd.state['ranges'].clear()
+    part_path = download_utils.download_segmented_file(url, str(tmp_path), segment_count=4, segment_threshold=1024 * 1024)
+
+    assert httpd.state['ranges'] == [f'bytes={downloaded}-']
+    assert _read(part_path) == DATA
+    assert 'segments' not in download_utils._load_part_meta(part_path + '.json')
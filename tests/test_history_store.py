@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: test_history_store.py
+Update: 2026.10.18
+"""
+
+import os
+
+import pytest
+
+import config
+from utils import history_store
+from utils.generic_utils import read_list_from_txt, save_list_to_txt
+from utils.url_filter import url_hashes
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    在临时目录中使用全新的历史记录数据库，记录立即提交（不启动提交线程）。
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(history_store, '_connection', None)
+    monkeypatch.setattr(history_store, '_indexes', {})
+    monkeypatch.setattr(history_store, '_pending', {})
+    monkeypatch.setattr(history_store, '_migrated', set())
+    monkeypatch.setitem(history_store.storage_setting, 'history_flush_interval', 0)
+
+    yield history_store
+
+    if history_store._connection is not None:
+        history_store._connection.close()
+
+
+def test_contains_many(store):
+    used = store.HistorySet('douyin', 'cat', 'videos')
+    used.update(['https://www.douyin.com/video/7234567890123456789'])
+
+    found = used.contains_many(['https://www.douyin.com/light/7234567890123456789?previous_page=app_code_link',
+                                'https://www.douyin.com/video/7000000000000000000', ''])
+
+    assert found.tolist() == [True, False, False]
+
+
+def test_compact_get_list(store):
+    get_path = config.get_save_history_path('douyin', 'cat', 'get', 'videos')
+    save_list_to_txt(get_path, [
+        'https://www.douyin.com/video/1001',
+        'https://www.douyin.com/video/1002',
+        'https://www.douyin.com/video/1001',  # 完全相同的行
+        'https://www.douyin.com/light/1002?previous_page=app_code_link',  # 同一作品的不同 URL
+        'https://www.douyin.com/video/1003',
+        'https://www.douyin.com/video/1004',
+        'https://www.douyin.com/video/1005',
+    ])
+    store.HistorySet('douyin', 'cat', 'videos').update(['https://www.douyin.com/video/1003'])
+    store.HistorySet('douyin', 'cat', 'videos', way='wrong').update(['https://www.douyin.com/video/1004'])
+
+    remaining = store.compact_get_list('douyin', 'cat', 'videos')
+
+    expected = ['https://www.douyin.com/video/1001', 'https://www.douyin.com/video/1002', 'https://www.douyin.com/video/1005']
+    assert remaining == expected
+    assert read_list_from_txt(get_path) == expected
+    assert not os.path.exists(get_path + '.tmp')
+
+
+def test_compact_get_list_with_index_tuples(store):
+    get_path = config.get_save_history_path('baidutieba', 'cat', 'get', 'images')
+    # 百度贴吧、petfinder 的图片记录为 (帖子/宠物索引, URL)，重新解析时同一图片可能得到新的索引
+    save_list_to_txt(get_path, [
+        (0, 'http://tiebapic.baidu.com/forum/pic/item/a.jpg'),
+        (0, 'http://tiebapic.baidu.com/forum/pic/item/b.jpg'),
+        (1, 'http://tiebapic.baidu.com/forum/pic/item/c.jpg'),
+        (5, 'http://tiebapic.baidu.com/forum/pic/item/a.jpg'),
+    ])
+    store.HistorySet('baidutieba', 'cat', 'images').add('http://tiebapic.baidu.com/forum/pic/item/b.jpg')
+
+    store.compact_get_list('baidutieba', 'cat', 'images')
+
+    assert read_list_from_txt(get_path, parse=True) == [
+        (0, 'http://tiebapic.baidu.com/forum/pic/item/a.jpg'),
+        (1, 'http://tiebapic.baidu.com/forum/pic/item/c.jpg'),
+    ]
+
+
+def test_compact_keeps_uncommitted_index_entries(store):
+    get_path = config.get_save_history_path('douyin', 'cat', 'get', 'videos')
+    save_list_to_txt(get_path, ['https://www.douyin.com/video/2001'])
+    used = store.HistorySet('douyin', 'cat', 'videos')
+
+    # 哈希已写入索引但记录未提交（异常退出），数据库确认后不应视为已处理
+    with store.INDEX_LOCK:
+        store._get_index(used.key).add_many(url_hashes(['douyin:video:2001']))
+
+    assert store.compact_get_list('douyin', 'cat', 'videos') == ['https://www.douyin.com/video/2001']
+
+
+def test_compact_all_get_lists(store):
+    save_list_to_txt(config.get_save_history_path('xhs', 'cat', 'get', 'pages'),
+                     ['https://www.xiaohongshu.com/explore/64f1c2d3e4f5a6b7c8d9e0f1?xsec_token=A',
+                      'https://www.xiaohongshu.com/search_result/64f1c2d3e4f5a6b7c8d9e0f1?xsec_token=B'])
+    save_list_to_txt(config.get_save_history_path('xhs', 'dog', 'get', 'images'),
+                     ['https://ci.xiaohongshu.com/1040g0k0abc', 'https://ci.xiaohongshu.com/1040g0k0abc'])
+
+    assert store.compact_all_get_lists() == 2
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: test_url_canonical.py
+Update: 2026.10.18
+"""
+
+import pytest
+
+from utils.url_canonical import canonicalize_url
+
+XHS_NOTE_ID = '64f1c2d3e4f5a6b7c8d9e0f1'
+XHS_IMAGE_TOKEN = '1040g0k031a2b3c4d5e6f7g8h9'
+DOUYIN_ID = '7234567890123456789'
+
+
+@pytest.mark.parametrize('url, key', [
+    # 抖音作品页
+    (f'https://www.douyin.com/video/{DOUYIN_ID}', f'douyin:video:{DOUYIN_ID}'),
+    (f'https://www.douyin.com/light/{DOUYIN_ID}?previous_page=app_code_link', f'douyin:video:{DOUYIN_ID}'),
+    (f'https://www.douyin.com/search/%E7%8C%AB?modal_id={DOUYIN_ID}&type=video', f'douyin:video:{DOUYIN_ID}'),
+    # 抖音视频 CDN：签名、过期时间与查询参数每次不同
+    ('https://v3-web.douyinvod.com/9a8b7c6d5e4f/670f1a2b/video/tos/cn/tos-cn-ve-15c001-alinc2/oAbCdEfGh/'
+     '?a=6383&br=1234&mime_type=video_mp4&expire=1729240000&signature=abc',
+     'douyin:media:tos/cn/tos-cn-ve-15c001-alinc2/oAbCdEfGh'),
+    ('https://v26-web.douyinvod.com/0f1e2d3c4b5a/670f9999/video/tos/cn/tos-cn-ve-15c001-alinc2/oAbCdEfGh/'
+     '?a=6383&br=2345&expire=1729250000&signature=def',
+     'douyin:media:tos/cn/tos-cn-ve-15c001-alinc2/oAbCdEfGh'),
+    # 小红书笔记页
+    (f'https://www.xiaohongshu.com/search_result/{XHS_NOTE_ID}?xsec_token=ABCdef123=&xsec_source=', f'xhs:note:{XHS_NOTE_ID}'),
+    (f'https://www.xiaohongshu.com/explore/{XHS_NOTE_ID}?xsec_token=XYZ&xsec_source=pc_search', f'xhs:note:{XHS_NOTE_ID}'),
+    (f'https://www.xiaohongshu.com/discovery/item/{XHS_NOTE_ID}', f'xhs:note:{XHS_NOTE_ID}'),
+    # 小红书图片：不同节点、时间戳、签名与样式后缀
+    (f'http://sns-webpic-qc.xhscdn.com/202410181234/0123456789abcdef0123456789abcdef/spectrum/{XHS_IMAGE_TOKEN}!nd_dft_wlteh_webp_3',
+     f'xhs:image:{XHS_IMAGE_TOKEN}'),
+    (f'http://sns-webpic-bd.xhscdn.com/202410190000/fedcba9876543210fedcba9876543210/spectrum/{XHS_IMAGE_TOKEN}!nd_dft_wgth_webp_3',
+     f'xhs:image:{XHS_IMAGE_TOKEN}'),
+    (f'http://sns-webpic-qc.xhscdn.com/202410181234/0123456789abcdef0123456789abcdef/{XHS_IMAGE_TOKEN}!nd_prv_wlteh_jpg_3',
+     f'xhs:image:{XHS_IMAGE_TOKEN}'),
+    (f'https://ci.xiaohongshu.com/{XHS_IMAGE_TOKEN}?imageView2/2/w/1080/format/jpg', f'xhs:image:{XHS_IMAGE_TOKEN}'),
+    (f'https://ci.xiaohongshu.com/spectrum/{XHS_IMAGE_TOKEN}?imageView2/2/w/1080/format/jpg', f'xhs:image:{XHS_IMAGE_TOKEN}'),
+    # 小红书视频
+    ('http://sns-video-bd.xhscdn.com/stream/110/258/01e5abc0123456_258.mp4?sign=1', 'xhs:video:stream/110/258/01e5abc0123456_258.mp4'),
+    ('http://sns-video-hw.xhscdn.com/stream/110/258/01e5abc0123456_258.mp4', 'xhs:video:stream/110/258/01e5abc0123456_258.mp4'),
+    # bilibili
+    ('https://www.bilibili.com/video/BV1xx411c7mD/?spm_id_from=333.337.search-card.all.click&vd_source=abc',
+     'bilibili:video:BV1xx411c7mD'),
+    ('https://www.bilibili.com/video/BV1xx411c7mD?p=1', 'bilibili:video:BV1xx411c7mD'),
+    ('https://www.bilibili.com/video/BV1xx411c7mD/?p=2&spm_id_from=333.788', 'bilibili:video:BV1xx411c7mD:p2'),
+    # YouTube
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123&index=2', 'youtube:video:dQw4w9WgXcQ'),
+    ('https://youtu.be/dQw4w9WgXcQ?si=abc', 'youtube:video:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/shorts/dQw4w9WgXcQ', 'youtube:video:dQw4w9WgXcQ'),
+])
+def test_site_keys(url, key):
+    assert canonicalize_url(url) == key
+
+
+@pytest.mark.parametrize('url, key', [
+    # 百度贴吧帖子与图片、petfinder 页面与图片：去掉片段与追踪参数，其余参数保留
+    ('https://tieba.baidu.com/p/8912345678?pn=2#anchor', 'https://tieba.baidu.com/p/8912345678?pn=2'),
+    ('http://tiebapic.baidu.com/forum/w%3D580/sign=0123abcd/9a8b7c6d.jpg?tbpicau=2024-10-18-05_abc',
+     'http://tiebapic.baidu.com/forum/w%3D580/sign=0123abcd/9a8b7c6d.jpg?tbpicau=2024-10-18-05_abc'),
+    ('https://www.petfinder.com/dog/buddy-72345678/ca/los-angeles/shelter-ca123/?utm_source=share&utm_medium=web',
+     'https://www.petfinder.com/dog/buddy-72345678/ca/los-angeles/shelter-ca123/'),
+    ('https://dl5zpyw5k3jeb.cloudfront.net/photos/pets/72345678/1/?bust=1712345678&width=1080',
+     'https://dl5zpyw5k3jeb.cloudfront.net/photos/pets/72345678/1/?bust=1712345678&width=1080'),
+    ('HTTPS://IMG10.360buyimg.com/n1/jfs/t1/abc.jpg?spm=a.b&v=2', 'https://img10.360buyimg.com/n1/jfs/t1/abc.jpg?v=2'),
+    # 无法识别的网站页面退回通用规则
+    ('https://www.douyin.com/', 'https://www.douyin.com/'),
+    ('https://www.xiaohongshu.com/user/profile/5a1b2c3d', 'https://www.xiaohongshu.com/user/profile/5a1b2c3d'),
+])
+def test_generic_fallback(url, key):
+    assert canonicalize_url(url) == key
+
+
+@pytest.mark.parametrize('url', ['', 'not a url', 'douyin:video:7234567890123456789'])
+def test_non_url_unchanged(url):
+    assert canonicalize_url(url) == url
+
+
+def test_keys_are_stable():
+    urls = [
+        f'https://www.douyin.com/video/{DOUYIN_ID}',
+        f'https://ci.xiaohongshu.com/{XHS_IMAGE_TOKEN}',
+        'https://tieba.baidu.com/p/8912345678?pn=2',
+    ]
+    for url in urls:
+        key = canonicalize_url(url)
+        assert canonicalize_url(key) == key
@@ -7,7 +7,7 @@ Project Name: web_crawler
 File Created: 2025.06.13
 Author: ZhangYuetao
 File Name: __init__.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 # 导入 generic_utils 模块中的函数
@@ -23,6 +23,146 @@ from .generic_utils import (
     create_option,
 )
 
+# 导入 rate_limiter 模块中的函数
+from .rate_limiter import (
+    TokenBucket,
+    get_bucket,
+    throttle,
+    driver_get,
+    get_bandwidth_bucket,
+    throttle_bytes,
+    get_byte_counters,
+)
+
+# 导入 retry_policy 模块中的函数
+from .retry_policy import (
+    CircuitBreaker,
+    get_breaker,
+    is_proxy_available,
+    classify_error,
+    backoff_delay,
+    RetryPolicy,
+    get_breaker_states,
+)
+
+# 导入 adaptive_concurrency 模块中的函数
+from .adaptive_concurrency import (
+    AdaptiveLimiter,
+    get_adaptive_limiter,
+    adaptive_slot,
+    report_response,
+    get_adaptive_limits,
+)
+
+# 导入 http_utils 模块中的函数
+from .http_utils import (
+    get_session,
+    http_get,
+    close_sessions,
+)
+
+# 导入 http_cache 模块中的函数
+from .http_cache import (
+    conditional_get,
+    save_http_cache,
+)
+
+# 导入 history_store 模块中的函数
+from .history_store import (
+    HistorySet,
+    flush_history,
+    migrate_txt_history,
+    migrate_all_txt_history,
+    compact_get_list,
+    compact_all_get_lists,
+    sync_indexes,
+)
+
+# 导入 id_allocator 模块中的函数
+from .id_allocator import (
+    IdAllocator,
+    release_ids,
+)
+
+# 导入 url_canonical 模块中的函数
+from .url_canonical import (
+    canonicalize_url,
+)
+
+# 导入 url_filter 模块中的函数
+from .url_filter import (
+    url_hash64,
+    url_hashes,
+    HashIndex,
+)
+
+# 导入 page_archive 模块中的函数
+from .page_archive import (
+    archive_page,
+    iter_archive,
+    reparse_archive,
+)
+
+# 导入 media_store 模块中的函数
+from .media_store import (
+    hash_file,
+    store_file,
+    rename_media,
+)
+
+# 导入 phash_index 模块中的函数
+from .phash_index import (
+    dhash,
+    phash,
+    compute_image_hash,
+    PHashIndex,
+    check_near_duplicate,
+)
+
+# 导入 video_classifier 模块中的函数
+from .video_classifier import (
+    classify_frames,
+    classify_video,
+    submit_video_classification,
+    wait_video_classification,
+)
+
+# 导入 video_postprocess 模块中的函数
+from .video_postprocess import (
+    probe_video,
+    get_strip_audio_args,
+    strip_audio,
+    run_ffmpeg,
+    submit_postprocess,
+    wait_postprocess,
+    get_postprocess_stats,
+)
+
+# 导入 download_utils 模块中的函数
+from .download_utils import (
+    OversizedDownloadError,
+    get_transfer_stats,
+    remove_file,
+    download_temp_file,
+    commit_temp_file,
+    get_part_path,
+    discard_part_file,
+    download_part_file,
+    probe_download,
+    download_segmented_file,
+    commit_part_file,
+)
+
+# 导入 ytdlp_engine 模块中的函数
+from .ytdlp_engine import (
+    YtdlpEngine,
+)
+
+# 导入 async_downloader 模块中的函数
+from .async_downloader import (
+    run_downloads,
+)
+
 # 导入 log_utils 模块中的函数
 from .log_utils import (
     begin_logger,
@@ -42,6 +182,112 @@ __all__ = [
     'check_video_type',
     'create_option',
 
+    # rate_limiter
+    'TokenBucket',
+    'get_bucket',
+    'throttle',
+    'driver_get',
+    'get_bandwidth_bucket',
+    'throttle_bytes',
+    'get_byte_counters',
+
+    # retry_policy
+    'CircuitBreaker',
+    'get_breaker',
+    'is_proxy_available',
+    'classify_error',
+    'backoff_delay',
+    'RetryPolicy',
+    'get_breaker_states',
+
+    # adaptive_concurrency
+    'AdaptiveLimiter',
+    'get_adaptive_limiter',
+    'adaptive_slot',
+    'report_response',
+    'get_adaptive_limits',
+
+    # http_utils
+    'get_session',
+    'http_get',
+    'close_sessions',
+
+    # http_cache
+    'conditional_get',
+    'save_http_cache',
+
+    # history_store
+    'HistorySet',
+    'flush_history',
+    'migrate_txt_history',
+    'migrate_all_txt_history',
+    'compact_get_list',
+    'compact_all_get_lists',
+    'sync_indexes',
+
+    # id_allocator
+    'IdAllocator',
+    'release_ids',
+
+    # url_canonical
+    'canonicalize_url',
+
+    # url_filter
+    'url_hash64',
+    'url_hashes',
+    'HashIndex',
+
+    # page_archive
+    'archive_page',
+    'iter_archive',
+    'reparse_archive',
+
+    # media_store
+    'hash_file',
+    'store_file',
+    'rename_media',
+
+    # phash_index
+    'dhash',
+    'phash',
+    'compute_image_hash',
+    'PHashIndex',
+    'check_near_duplicate',
+
+    # video_classifier
+    'classify_frames',
+    'classify_video',
+    'submit_video_classification',
+    'wait_video_classification',
+
+    # video_postprocess
+    'probe_video',
+    'get_strip_audio_args',
+    'strip_audio',
+    'run_ffmpeg',
+    'submit_postprocess',
+    'wait_postprocess',
+    'get_postprocess_stats',
+
+    # download_utils
+    'OversizedDownloadError',
+    'get_transfer_stats',
+    'remove_file',
+    'download_temp_file',
+    'commit_temp_file',
+    'get_part_path',
+    'discard_part_file',
+    'download_part_file',
+    'probe_download',
+    'download_segmented_file',
+    'commit_part_file',
+
+    # ytdlp_engine
+    'YtdlpEngine',
+
+    # async_downloader
+    'run_downloads',
+
     # log_utils
     'begin_logger',
     'end_logger',
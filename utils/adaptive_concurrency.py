@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: adaptive_concurrency.py
+Update: 2026.10.18
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+import config
+from logger import logger
+
+network_setting = config.load_config(config.NETWORK_SETTING_PATH, config.NETWORK_SETTING_DEFAULT_CONFIG)
+
+OVERLOAD_STATUS_CODES = (403, 429)  # 视为限流或封禁的状态码
+
+_LIMITERS = {}  # 主机 -> AdaptiveLimiter
+_LIMITERS_LOCK = threading.Lock()
+
+
+class AdaptiveLimiter:
+    """
+    单个主机的 AIMD 并发控制：请求成功且延迟稳定时并发上限加性增长（每轮约 +increase），
+    遇到 429/403/超时时乘性下降（× decrease_factor），延迟明显升高时保持不变。
+    """
+
+    def __init__(self, host, initial=None, min_limit=None, max_limit=None):
+        """
+        :param host: 主机名。
+        :param initial: 初始并发上限，默认读取网络配置。
+        :param min_limit: 最小并发上限，默认读取网络配置。
+        :param max_limit: 最大并发上限，默认读取网络配置。
+        """
+        self.host = host
+        self.min_limit = float(min_limit or network_setting['adaptive_min_concurrency'])
+        self.max_limit = float(max_limit or network_setting['adaptive_max_concurrency'])
+        self.limit = min(self.max_limit, max(self.min_limit, float(initial or network_setting['adaptive_initial_concurrency'])))
+        self.increase = float(network_setting['adaptive_increase'])
+        self.decrease_factor = float(network_setting['adaptive_decrease_factor'])
+        self.latency_tolerance = float(network_setting['adaptive_latency_tolerance'])
+
+        self.in_flight = 0
+        self.gated_count = 0  # 通过本控制器占用名额的次数（为 0 表示该主机的并发不受本控制器限制）
+        self.latency = None  # 延迟的指数移动平均
+        self.base_latency = None  # 观察到的最低延迟
+        self.last_decrease_at = 0.0
+        self.success_count = 0
+        self.overload_count = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        占用一个并发名额，超过当前上限时阻塞等待。
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            self.gated_count += 1
+
+    def try_acquire(self):
+        """
+        尝试占用一个并发名额，不阻塞（供 asyncio 调度使用）。
+
+        :return: 是否占用成功。
+        """
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            self.gated_count += 1
+            return True
+
+    def release(self):
+        """
+        释放一个并发名额。
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        以上下文管理器的方式占用并发名额。
+        """
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def _set_limit(self, limit, reason):
+        """
+        更新并发上限，整数部分变化时记录日志。
+
+        :param limit: 新的并发上限。
+        :param reason: 变化原因。
+        """
+        old = int(self.limit)
+        self.limit = min(self.max_limit, max(self.min_limit, limit))
+        if int(self.limit) != old:
+            logger.info(f"[自适应并发] {self.host} 并发上限 {old} -> {int(self.limit)}（{reason}）")
+            self.condition.notify_all()
+
+    def record(self, status_code=None, error=None, latency=None):
+        """
+        记录一次请求结果并调整并发上限。
+
+        :param status_code: 响应状态码。
+        :param error: 请求异常（仅超时视为过载）。
+        :param latency: 请求耗时（秒）。
+        """
+        with self.condition:
+            overloaded = status_code in OVERLOAD_STATUS_CODES or isinstance(error, (TimeoutError, requests.exceptions.Timeout))
+
+            if overloaded:
+                self.overload_count += 1
+                # 同一轮（约一个平均延迟）内的多个失败只下降一次
+                cooldown = self.latency if self.latency is not None else 1.0
+                if time.monotonic() - self.last_decrease_at >= cooldown:
+                    self.last_decrease_at = time.monotonic()
+                    self._set_limit(self.limit * self.decrease_factor, f"状态码 {status_code}" if status_code else f"超时 {error}")
+                return
+
+            if error is not None or latency is None:
+                return
+
+            self.success_count += 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.base_latency = latency if self.base_latency is None else min(self.base_latency, latency)
+
+            # 延迟明显升高时不再增加；只有名额被占满时才增加，避免上限脱离实际需求
+            if self.latency > self.base_latency * self.latency_tolerance:
+                return
+            if self.in_flight >= int(self.limit):
+                self._set_limit(self.limit + self.increase / max(self.limit, 1.0), f"平均延迟 {self.latency:.2f} 秒")
+
+
+def get_adaptive_limiter(url):
+    """
+    获取 URL 所属主机的并发控制器，不存在则新建。
+
+    :param url: 请求 URL 或主机名。
+    :return: AdaptiveLimiter 对象。
+    """
+    host = urlparse(url).netloc or url
+
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(host)
+        if limiter is None:
+            limiter = AdaptiveLimiter(host)
+            _LIMITERS[host] = limiter
+
+    return limiter
+
+
+def adaptive_slot(url):
+    """
+    按主机的自适应并发上限占用名额，供线程池中的任务使用。
+
+    :param url: 请求 URL 或主机名。
+    :return: 上下文管理器。
+    """
+    return get_adaptive_limiter(url).slot()
+
+
+def report_response(url, status_code=None, error=None, latency=None):
+    """
+    向主机的并发控制器报告一次请求结果。
+
+    :param url: 请求 URL 或主机名。
+    :param status_code: 响应状态码。
+    :param error: 请求异常。
+    :param latency: 请求耗时（秒）。
+    """
+    get_adaptive_limiter(url).record(status_code, error, latency)
+
+
+def get_adaptive_limits():
+    """
+    获取全部主机当前的并发上限与统计。
+
+    :return: {主机: {'limit', 'latency', 'success', 'overload', 'gated'}}，gated 为通过并发上限占用名额的次数。
+    """
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+
+    return {
+        limiter.host: {
+            'limit': int(limiter.limit),
+            'latency': limiter.latency,
+            'success': limiter.success_count,
+            'overload': limiter.overload_count,
+            'gated': limiter.gated_count,
+        }
+        for limiter in limiters
+    }
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: async_downloader.py
+Update: 2026.10.18
+"""
+
+import asyncio
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import config
+from logger import logger
+from .adaptive_concurrency import get_adaptive_limiter
+
+network_setting = config.load_config(config.NETWORK_SETTING_PATH, config.NETWORK_SETTING_DEFAULT_CONFIG)
+
+
+def _get_item_url(item):
+    """
+    从下载信息中取出 URL，支持 url 与 (id, url) 两种格式。
+
+    :param item: 下载信息。
+    :return: URL 字符串。
+    """
+    if isinstance(item, (tuple, list)):
+        return str(item[-1])
+
+    return str(item)
+
+
+async def _acquire_adaptive_slot(limiter, condition):
+    """
+    等待主机的自适应并发名额（不占用事件循环线程）。
+
+    :param limiter: 主机的 AdaptiveLimiter。
+    :param condition: 该主机的 asyncio.Condition，本调度器释放名额时通知。
+    """
+    async with condition:
+        while not limiter.try_acquire():
+            try:
+                # 其他线程（不经过本调度器）释放名额时不会通知，定时重新检查
+                await asyncio.wait_for(condition.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _release_adaptive_slot(limiter, condition):
+    """
+    释放主机的自适应并发名额并唤醒等待的任务。
+
+    :param limiter: 主机的 AdaptiveLimiter。
+    :param condition: 该主机的 asyncio.Condition。
+    """
+    limiter.release()
+    async with condition:
+        condition.notify_all()
+
+
+async def _run_downloads(items, download_func, args, max_concurrency, per_host_concurrency):
+    """
+    并发执行全部下载任务。
+
+    :param items: 下载信息列表。
+    :param download_func: 单个文件的下载函数。
+    :param args: 传递给下载函数的额外参数。
+    :param max_concurrency: 全局最大并发数（不超过线程池的线程数）。
+    :param per_host_concurrency: 单个主机最大并发数（硬上限，实际并发由主机的自适应并发上限控制）。
+    :return: 成功执行的任务数量。
+    """
+    loop = asyncio.get_running_loop()
+    global_semaphore = asyncio.Semaphore(max_concurrency)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(per_host_concurrency))
+    host_conditions = defaultdict(asyncio.Condition)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='download') as executor:
+        async def _download(item):
+            url = _get_item_url(item)
+            host = urlparse(url).netloc
+            limiter = get_adaptive_limiter(url)
+            # 先占用主机名额（硬上限与自适应上限，遇到 429/403/超时自动降低）再占用全局名额，
+            # 避免某个主机的排队任务占满全局并发
+            async with host_semaphores[host]:
+                await _acquire_adaptive_slot(limiter, host_conditions[host])
+                try:
+                    async with global_semaphore:
+                        await loop.run_in_executor(executor, functools.partial(download_func, item, *args))
+                        return True
+                except Exception as e:
+                    logger.error(f"下载任务异常 {url}: {e}")
+                    return False
+                finally:
+                    await _release_adaptive_slot(limiter, host_conditions[host])
+
+        results = await asyncio.gather(*(_download(item) for item in items))
+
+    return sum(results)
+
+
+def run_downloads(items, download_func, *args, max_concurrency=None, per_host_concurrency=None):
+    """
+    使用 asyncio 并发调度下载任务，单个文件仍由各爬虫原有的下载函数处理。
+    单个主机的并发由自适应并发上限（AIMD）控制，per_host_concurrency 为其硬上限。
+
+    :param items: 下载信息列表（url 或 (id, url)）。
+    :param download_func: 单个文件的下载函数，调用方式为 download_func(item, *args)。
+    :param args: 传递给下载函数的额外参数。
+    :param max_concurrency: 全局最大并发数，默认读取网络配置。
+    :param per_host_concurrency: 单个主机最大并发数，默认读取网络配置。
+    :return: 成功执行的任务数量。
+    """
+    # 线程数与 max_concurrency 分开配置：每个下载线程还会带一个写盘线程，大文件的分段在共用的分段线程池中下载
+    max_concurrency = min(int(max_concurrency or network_setting['max_concurrency']), int(network_setting['download_threads']))
+    per_host_concurrency = int(per_host_concurrency or network_setting['per_host_concurrency'])
+
+    # 同一 URL 只提交一次，避免并发时重复下载
+    unique_items = []
+    seen_urls = set()
+    for item in items:
+        if not item:
+            continue
+        url = _get_item_url(item)
+        if url in seen_urls:
+            continue
+        seen_urls.add(url)
+        unique_items.append(item)
+
+    if not unique_items:
+        return 0
+
+    logger.info(f"开始并发下载 {len(unique_items)} 个任务（全局并发 {max_concurrency}，单主机并发 {per_host_concurrency}）")
+
+    return asyncio.run(_run_downloads(unique_items, download_func, args, max_concurrency, per_host_concurrency))
@@ -0,0 +1,641 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: download_utils.py
+Update: 2026.10.18
+"""
+
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+import config
+from logger import logger
+from .http_utils import http_get
+from .media_store import hash_file, store_file
+from .rate_limiter import throttle_bytes
+
+network_setting = config.load_config(config.NETWORK_SETTING_PATH, config.NETWORK_SETTING_DEFAULT_CONFIG)
+
+READ_SIZE = 64 * 1024  # 单次从网络读取的字节数
+
+COMMIT_LOCK = threading.Lock()  # 用于保护正式文件名的生成与重命名
+SEGMENT_EXECUTOR_LOCK = threading.Lock()  # 用于保护分段下载线程池的创建
+TRANSFER_STATS_LOCK = threading.Lock()  # 用于保护 TRANSFER_STATS 的修改
+
+STREAM_DIGESTS = {}  # 临时文件路径 -> 下载过程中计算的 SHA-256，保存正式文件时取出
+
+_segment_executor = None
+
+TRANSFER_STATS = {
+    'bytes': 0,  # 已写入磁盘的字节数
+    'seconds': 0.0,  # 传输耗时（各文件累计）
+    'files': 0,  # 完成传输的文件（分段）数量
+}
+
+
+class IncompleteDownloadError(requests.exceptions.RequestException):
+    """
+    下载内容不完整（连接中断、续传位置不一致等），可通过断点续传继续下载。
+    """
+
+
+class WriteBehindSink:
+    """
+    后台写盘的下载接收器：网络线程把响应体读入可复用的大缓冲区，磁盘写入由独立的写线程完成，
+    网络读取不必等待磁盘。用法::
+
+        with WriteBehindSink(file) as sink:
+            sink.write_from(response)
+    """
+
+    def __init__(self, file, buffer_size=None, buffer_count=None, hasher=None):
+        """
+        :param file: 以二进制写模式打开的文件对象（写入位置由调用方设置）。
+        :param buffer_size: 单个缓冲区大小（字节），默认读取网络配置。
+        :param buffer_count: 缓冲区数量，默认读取网络配置。
+        :param hasher: 可选，hashlib 对象，写线程按写入顺序同步计算摘要。
+        """
+        buffer_size = int(buffer_size or network_setting['buffer_size'])
+        buffer_count = int(buffer_count or network_setting['buffer_count'])
+
+        self.file = file
+        self.hasher = hasher
+        self.written = 0  # 已写入磁盘的字节数
+        self._error = None
+        self._start_time = time.perf_counter()
+        self._free_buffers = queue.Queue()
+        self._pending_buffers = queue.Queue()
+        for _ in range(buffer_count):
+            self._free_buffers.put(bytearray(buffer_size))
+
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def _write_loop(self):
+        """
+        写线程：按顺序写入已填满的缓冲区，并归还缓冲区以便复用。
+        """
+        while True:
+            item = self._pending_buffers.get()
+            if item is None:
+                break
+
+            buffer, length = item
+            try:
+                if self._error is None:
+                    view = memoryview(buffer)[:length]
+                    self.file.write(view)
+                    if self.hasher is not None:
+                        self.hasher.update(view)
+                    self.written += length
+            except Exception as e:
+                self._error = e
+            finally:
+                self._free_buffers.put(buffer)
+
+    def _read_into(self, raw, view, url=None, proxies=None):
+        """
+        从原始响应流读满缓冲区（或直到数据结束），并将底层异常转换为 requests 异常。
+
+        :param raw: urllib3 响应流。
+        :param view: 缓冲区的 memoryview。
+        :param url: 下载 URL（用于流量统计）。
+        :param proxies: 代理字典（用于流量统计）。
+        :return: 读取的字节数。
+        """
+        filled = 0
+        try:
+            while filled < len(view):
+                # 分次读取，连接中断时最多丢失一次读取的数据（已读部分仍可用于续传）
+                size = raw.readinto(view[filled:filled + READ_SIZE])
+                if not size:
+                    break
+                filled += size
+                # 统计流量并按全局带宽上限等待
+                throttle_bytes(url, size, proxies)
+        except ProtocolError as e:
+            self._pending_buffers.put((view.obj, filled))  # 已读取的数据仍写入磁盘，便于续传
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except ReadTimeoutError as e:
+            self._pending_buffers.put((view.obj, filled))
+            raise requests.exceptions.ConnectionError(e)
+        except DecodeError as e:
+            self._free_buffers.put(view.obj)
+            raise requests.exceptions.ContentDecodingError(e)
+
+        return filled
+
+    def write_from(self, response, limit=None, proxies=None):
+        """
+        读取整个响应体并交给写线程写盘。
+
+        :param response: requests.Response 对象（需 stream=True）。
+        :param limit: 最多读取的字节数，默认读取到响应结束。
+        :param proxies: 请求使用的代理字典（用于按代理统计流量）。
+        """
+        raw = response.raw
+        raw.decode_content = True
+        remaining = limit
+
+        while remaining is None or remaining > 0:
+            if self._error is not None:
+                raise self._error
+
+            view = memoryview(self._free_buffers.get())
+            if remaining is not None and remaining < len(view):
+                view = view[:remaining]
+
+            filled = self._read_into(raw, view, response.url, proxies)
+            if not filled:
+                self._free_buffers.put(view.obj)
+                break
+
+            self._pending_buffers.put((view.obj, filled))
+            if remaining is not None:
+                remaining -= filled
+            if filled < len(view):
+                break
+
+    def close(self):
+        """
+        等待写线程写完全部数据并记录传输统计。
+        """
+        if self._thread.is_alive():
+            self._pending_buffers.put(None)
+            self._thread.join()
+
+        elapsed = time.perf_counter() - self._start_time
+        with TRANSFER_STATS_LOCK:
+            TRANSFER_STATS['bytes'] += self.written
+            TRANSFER_STATS['seconds'] += elapsed
+            TRANSFER_STATS['files'] += 1
+
+        if elapsed > 0:
+            logger.debug(f"写入 {self.written} 字节，耗时 {elapsed:.2f} 秒（{self.written / elapsed / 1024 / 1024:.2f} MB/s）")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if exc_type is None and self._error is not None:
+            raise self._error
+
+
+def get_transfer_stats():
+    """
+    获取本进程的下载传输统计。
+
+    :return: 统计字典（bytes、seconds、files、bytes_per_second）。
+    """
+    with TRANSFER_STATS_LOCK:
+        stats = dict(TRANSFER_STATS)
+
+    stats['bytes_per_second'] = stats['bytes'] / stats['seconds'] if stats['seconds'] else 0.0
+
+    return stats
+
+
+class OversizedDownloadError(Exception):
+    """
+    下载内容超过大小上限（不应重试）。
+    """
+
+
+def remove_file(file_path):
+    """
+    删除文件，文件不存在时忽略。
+
+    :param file_path: 文件路径。
+    """
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def download_temp_file(url, save_dir, headers=None, proxies=None, timeout=10, max_size=None):
+    """
+    流式下载 URL 到保存目录下的临时文件，内存占用只与缓冲区大小有关，与文件大小和并发数无关。
+
+    :param url: 下载 URL。
+    :param save_dir: 保存目录。
+    :param headers: 请求头。
+    :param proxies: 代理字典。
+    :param timeout: 超时时间（秒）。
+    :param max_size: 最大字节数，超过时提前中止并抛出 OversizedDownloadError，默认读取网络配置（0 表示不限制）。
+    :return: 临时文件路径。
+    """
+    max_size = int(network_setting['image_max_size'] if max_size is None else max_size)
+
+    response = http_get(url, headers=headers, proxies=proxies, stream=True, timeout=timeout)
+
+    with response:
+        response.raise_for_status()  # 如果请求失败，抛出异常
+
+        content_length = response.headers.get('Content-Length', '')
+        content_length = int(content_length) if content_length.isdigit() else None
+        if max_size and content_length and content_length > max_size:
+            raise OversizedDownloadError(f"文件大小 {content_length} 字节超过上限 {max_size} 字节: {url}")
+
+        # 小文件只分配与文件大小相当的缓冲区
+        buffer_size = int(network_setting['buffer_size'])
+        if content_length:
+            buffer_size = min(buffer_size, content_length)
+
+        os.makedirs(save_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=save_dir, prefix='.', suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                with WriteBehindSink(file, buffer_size=buffer_size, hasher=hashlib.sha256()) as sink:
+                    sink.write_from(response, limit=max_size + 1 if max_size else None, proxies=proxies)
+
+            if max_size and sink.written > max_size:
+                raise OversizedDownloadError(f"文件大小超过上限 {max_size} 字节，已中止下载: {url}")
+        except BaseException:
+            remove_file(temp_path)
+            raise
+
+    STREAM_DIGESTS[temp_path] = sink.hasher.hexdigest()
+
+    return temp_path
+
+
+def commit_temp_file(temp_path, get_save_path, sha256=None):
+    """
+    将临时文件保存为正式文件，文件名已存在时重新生成，避免并发下载互相覆盖。
+    内容与已保存的文件相同时由内容索引改为硬链接或清单记录。
+
+    :param temp_path: 临时文件路径。
+    :param get_save_path: 生成正式文件路径的函数（每次调用重新生成时间戳）。
+    :param sha256: 文件摘要，为空时使用下载过程中计算的摘要或重新计算。
+    :return: 正式文件路径；内容重复且只记入清单（manifest 模式或硬链接失败）、没有生成文件时返回 None，调用方应跳过后续处理。
+    """
+    sha256 = sha256 or STREAM_DIGESTS.pop(temp_path, None) or hash_file(temp_path)
+
+    with COMMIT_LOCK:
+        save_path = get_save_path()
+        while os.path.exists(save_path):
+            time.sleep(0.001)
+            save_path = get_save_path()
+
+        original_path = store_file(temp_path, save_path, sha256)
+
+    if original_path is not None and not os.path.isfile(save_path):
+        return None
+
+    return save_path
+
+
+def get_part_path(save_dir, url):
+    """
+    获取 URL 对应的 .part 文件路径，同一 URL 在重试与重新运行时使用同一文件。
+
+    :param save_dir: 保存目录。
+    :param url: 下载 URL。
+    :return: .part 文件路径（附带的 .part.json 为续传信息）。
+    """
+    name = hashlib.md5(url.encode('utf-8')).hexdigest()
+
+    return os.path.join(save_dir, f'.{name}.part')
+
+
+def _load_part_meta(meta_path):
+    """
+    读取 .part 文件的续传信息。
+
+    :param meta_path: 续传信息文件路径。
+    :return: 续传信息字典（不存在或损坏则返回空字典）。
+    """
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_part_meta(meta_path, meta):
+    """
+    原子写入 .part 文件的续传信息。
+
+    :param meta_path: 续传信息文件路径。
+    :param meta: 续传信息字典。
+    """
+    temp_path = meta_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(temp_path, meta_path)
+
+
+def _parse_content_range(content_range):
+    """
+    解析 Content-Range 响应头（bytes start-end/total）。
+
+    :param content_range: Content-Range 响应头。
+    :return: (起始字节, 总大小)，无法解析时返回 (None, None)。
+    """
+    try:
+        _, span_total = content_range.split(' ', 1)
+        span, total = span_total.split('/', 1)
+        start = int(span.split('-', 1)[0])
+        total_size = None if total.strip() == '*' else int(total)
+
+        return start, total_size
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def discard_part_file(part_path):
+    """
+    删除 .part 文件及其续传信息。
+
+    :param part_path: .part 文件路径。
+    """
+    remove_file(part_path)
+    remove_file(part_path + '.json')
+
+
+def download_part_file(url, save_dir, headers=None, proxies=None, timeout=10):
+    """
+    将 URL 下载到 .part 文件，已存在未完成的 .part 文件时通过 Range 请求断点续传。
+
+    :param url: 下载 URL。
+    :param save_dir: 保存目录。
+    :param headers: 请求头。
+    :param proxies: 代理字典。
+    :param timeout: 超时时间（秒）。
+    :return: 下载完成的 .part 文件路径。
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    part_path = get_part_path(save_dir, url)
+    meta_path = part_path + '.json'
+
+    meta = _load_part_meta(meta_path)
+    if meta.get('url') == url and 'segments' not in meta and os.path.exists(part_path):
+        downloaded = os.path.getsize(part_path)
+    else:
+        meta = {}
+        downloaded = 0
+
+    # 上次已下载完成但未重命名（如进程中断）
+    if meta.get('complete') and downloaded == meta.get('total_size'):
+        return part_path
+
+    headers = dict(headers or {})
+    headers['Accept-Encoding'] = 'identity'  # 按原始字节续传，不使用压缩传输
+    if downloaded:
+        headers['Range'] = f'bytes={downloaded}-'
+        validator = meta.get('etag') or meta.get('last_modified')
+        if validator:
+            headers['If-Range'] = validator  # 资源已变化时服务器返回完整内容
+
+    response = http_get(url, headers=headers, proxies=proxies, stream=True, timeout=timeout)
+
+    with response:
+        if response.status_code == 416:
+            if downloaded and downloaded == meta.get('total_size'):
+                meta['complete'] = True
+                _save_part_meta(meta_path, meta)
+                return part_path
+
+            discard_part_file(part_path)
+            raise IncompleteDownloadError(f"续传范围无效，已重置下载: {url}")
+
+        response.raise_for_status()  # 如果请求失败，抛出异常
+
+        start, range_total = _parse_content_range(response.headers.get('Content-Range'))
+
+        if response.status_code == 206 and downloaded:
+            if start != downloaded:
+                discard_part_file(part_path)
+                raise IncompleteDownloadError(f"续传位置不一致（{start} != {downloaded}），已重置下载: {url}")
+            mode = 'ab'
+            logger.info(f"断点续传：从 {downloaded} 字节继续下载 {url}")
+        else:
+            # 首次下载，或服务器不支持续传/资源已变化，从头下载
+            content_length = response.headers.get('Content-Length')
+            downloaded = 0
+            mode = 'wb'
+            meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'total_size': range_total if response.status_code == 206 else (int(content_length) if content_length else None),
+            }
+            _save_part_meta(meta_path, meta)
+
+        # 从头下载时边下载边计算摘要，续传时在保存前重新计算
+        hasher = hashlib.sha256() if mode == 'wb' else None
+
+        with open(part_path, mode) as file:
+            sink = WriteBehindSink(file, hasher=hasher)
+            try:
+                with sink:
+                    sink.write_from(response, proxies=proxies)
+            finally:
+                downloaded += sink.written
+
+    total_size = meta.get('total_size')
+    if total_size is not None and downloaded < total_size:
+        raise IncompleteDownloadError(f"下载不完整（{downloaded}/{total_size} 字节），等待续传: {url}")
+
+    meta['complete'] = True
+    meta['total_size'] = downloaded
+    if hasher is not None:
+        meta['sha256'] = hasher.hexdigest()
+    _save_part_meta(meta_path, meta)
+
+    return part_path
+
+
+def probe_download(url, headers=None, proxies=None, timeout=10):
+    """
+    探测资源大小与是否支持 Range 请求（只读取 1 个字节）。
+
+    :param url: 下载 URL。
+    :param headers: 请求头。
+    :param proxies: 代理字典。
+    :param timeout: 超时时间（秒）。
+    :return: (总大小, 是否支持 Range)，大小未知时为 None。
+    """
+    headers = dict(headers or {})
+    headers['Accept-Encoding'] = 'identity'
+    headers['Range'] = 'bytes=0-0'
+
+    response = http_get(url, headers=headers, proxies=proxies, stream=True, timeout=timeout)
+
+    with response:
+        response.raise_for_status()  # 如果请求失败，抛出异常
+
+        if response.status_code == 206:
+            _, total_size = _parse_content_range(response.headers.get('Content-Range'))
+            return total_size, total_size is not None
+
+        content_length = response.headers.get('Content-Length')
+        accept_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+
+        return (int(content_length) if content_length else None), accept_ranges
+
+
+def _download_segment(url, part_path, segment, headers, proxies, timeout):
+    """
+    下载单个分段并写入 .part 文件的对应位置。
+
+    :param url: 下载 URL。
+    :param part_path: .part 文件路径。
+    :param segment: 分段信息 [起始字节, 结束字节, 已下载字节数]，下载过程中原地更新。
+    :param headers: 请求头。
+    :param proxies: 代理字典。
+    :param timeout: 超时时间（秒）。
+    """
+    start, end, done = segment
+    if start + done > end:
+        return
+
+    headers = dict(headers or {})
+    headers['Accept-Encoding'] = 'identity'
+    headers['Range'] = f'bytes={start + done}-{end}'
+
+    response = http_get(url, headers=headers, proxies=proxies, stream=True, timeout=timeout)
+
+    with response:
+        response.raise_for_status()  # 如果请求失败，抛出异常
+
+        range_start, _ = _parse_content_range(response.headers.get('Content-Range'))
+        if response.status_code != 206 or range_start != start + done:
+            raise IncompleteDownloadError(f"分段请求未返回预期范围（{start + done}-{end}）: {url}")
+
+        with open(part_path, 'r+b') as file:
+            file.seek(start + done)
+            sink = WriteBehindSink(file)
+            try:
+                with sink:
+                    sink.write_from(response, limit=end + 1 - start - done, proxies=proxies)  # 防止服务器多返回数据
+            finally:
+                segment[2] += sink.written
+
+    if start + segment[2] <= end:
+        raise IncompleteDownloadError(f"分段下载不完整（{start}-{end}）: {url}")
+
+
+def _get_segment_executor():
+    """
+    获取全部分段下载共用的线程池，不存在则新建。多个文件同时分段下载时分段排队执行，
+    分段线程（以及每个分段的写盘线程）总数不随并发下载的文件数增长。
+
+    :return: ThreadPoolExecutor 对象。
+    """
+    global _segment_executor
+
+    with SEGMENT_EXECUTOR_LOCK:
+        if _segment_executor is None:
+            _segment_executor = ThreadPoolExecutor(max_workers=int(network_setting['segment_workers']),
+                                                   thread_name_prefix='segment')
+
+    return _segment_executor
+
+
+def download_segmented_file(url, save_dir, headers=None, proxies=None, timeout=10,
+                            segment_count=None, segment_threshold=None, get_proxies=None):
+    """
+    分段并发下载大文件到 .part 文件：探测 Content-Length 与 Accept-Ranges 后并发请求多个字节范围。
+    服务器不支持 Range 或文件较小时自动退回单连接的 download_part_file。
+
+    :param url: 下载 URL。
+    :param save_dir: 保存目录。
+    :param headers: 请求头。
+    :param proxies: 代理字典。
+    :param timeout: 超时时间（秒）。
+    :param segment_count: 分段数量，默认读取网络配置。
+    :param segment_threshold: 启用分段下载的最小文件大小（字节），默认读取网络配置。
+    :param get_proxies: 可选，返回代理字典的函数，每个分段单独调用以使用不同代理。
+    :return: 下载完成的 .part 文件路径。
+    """
+    segment_count = int(segment_count or network_setting['segment_count'])
+    segment_threshold = int(segment_threshold or network_setting['segment_threshold'])
+
+    os.makedirs(save_dir, exist_ok=True)
+    part_path = get_part_path(save_dir, url)
+    meta_path = part_path + '.json'
+
+    meta = _load_part_meta(meta_path)
+    if meta.get('url') != url or not os.path.exists(part_path):
+        meta = {}
+
+    if meta.get('complete') and os.path.getsize(part_path) == meta.get('total_size'):
+        return part_path
+
+    # 已有单连接下载的 .part（例如之前文件较小或服务器不支持 Range）时继续单连接续传，不截断已下载的数据
+    if meta and 'segments' not in meta:
+        return download_part_file(url, save_dir, headers, proxies, timeout)
+
+    if 'segments' not in meta:
+        total_size, accept_ranges = probe_download(url, headers, proxies, timeout)
+
+        if segment_count < 2 or not accept_ranges or not total_size or total_size < segment_threshold:
+            return download_part_file(url, save_dir, headers, proxies, timeout)
+
+        # 预分配文件并划分字节范围
+        segment_size = -(-total_size // segment_count)
+        meta = {
+            'url': url,
+            'total_size': total_size,
+            'segments': [[start, min(start + segment_size, total_size) - 1, 0]
+                         for start in range(0, total_size, segment_size)],
+        }
+        with open(part_path, 'wb') as file:
+            file.truncate(total_size)
+        _save_part_meta(meta_path, meta)
+    else:
+        logger.info(f"分段断点续传：{url}")
+
+    segments = meta['segments']
+    meta_lock = threading.Lock()
+
+    def _run_segment(segment):
+        segment_proxies = get_proxies() if get_proxies else proxies
+        try:
+            _download_segment(url, part_path, segment, headers, segment_proxies, timeout)
+        finally:
+            with meta_lock:
+                _save_part_meta(meta_path, meta)  # 记录各分段进度，失败后可从断点继续
+
+    executor = _get_segment_executor()
+    futures = [executor.submit(_run_segment, segment) for segment in segments]
+    errors = [future.exception() for future in futures if future.exception()]
+
+    if errors:
+        raise IncompleteDownloadError(f"{len(errors)}/{len(segments)} 个分段下载失败，等待续传: {errors[0]}")
+
+    meta['complete'] = True
+    _save_part_meta(meta_path, meta)
+    logger.info(f"分段下载完成（{len(segments)} 段，{meta['total_size']} 字节）: {url}")
+
+    return part_path
+
+
+def commit_part_file(part_path, get_save_path):
+    """
+    将下载完成的 .part 文件原子重命名为正式文件，并删除续传信息。
+
+    :param part_path: .part 文件路径。
+    :param get_save_path: 生成正式文件路径的函数。
+    :return: 正式文件路径，内容重复且没有生成文件时返回 None（见 commit_temp_file）。
+    """
+    meta = _load_part_meta(part_path + '.json')
+    save_path = commit_temp_file(part_path, get_save_path, meta.get('sha256'))
+    remove_file(part_path + '.json')
+
+    return save_path
@@ -4,7 +4,7 @@ Project Name: web_crawler
 File Created: 2024.12.05
 Author: ZhangYuetao
 File Name: generic_utils.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import ast
@@ -12,12 +12,13 @@ import os
 import random
 from datetime import datetime
 
-import cv2
 from fake_useragent import UserAgent
 from selenium.webdriver.chrome.options import Options
 
 import config
 from logger import logger
+from .retry_policy import is_proxy_available
+from .video_classifier import classify_video
 
 
 def _get_user_agents():
@@ -76,11 +77,12 @@ def _get_proxies():
 
 def get_random_proxy():
     """
-    获取随机代理。
+    获取随机代理，跳过熔断冷却中的代理（全部熔断时仍从完整列表中选择）。
     
     :return: 随机代理。
     """
     proxies = _get_proxies()
+    proxies = [proxy for proxy in proxies if is_proxy_available(proxy)] or proxies
     logger.debug(f'使用随机代理: {proxies}')
     
     return random.choice(proxies) if proxies else None
@@ -130,46 +132,12 @@ def read_list_from_txt(txt_path, parse=False):
 
 def check_video_type(video_path):
     """
-    判断视频是 RGB 还是 IR（红外）。
+    判断视频是 RGB 还是 IR（红外），抽取若干缩小后的帧按通道差异与饱和度判断。
     
     :param video_path: 视频路径。
     :return: 视频类型 ('RGB' 或 'IR')，如果出错则返回 None。
     """
-    cap = None
-    try:
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            logger.warning(f"判断视频类型失败，无法打开视频: {video_path}")
-            return None
-
-        ret, frame = cap.read()  # 读取第一帧
-        
-        if not ret:
-            logger.warning(f"判断视频类型失败，无法读取视频帧: {video_path}")
-            return None
-
-        # 获取通道数
-        if len(frame.shape) == 3:
-            channels = frame.shape[2]
-        else:
-            channels = 1
-
-        if channels == 3:
-            return 'RGB'
-        elif channels == 1:
-            return 'IR'
-        else:
-            logger.warning(f"未知的视频通道数: {channels}，默认返回 RGB")
-            return 'RGB'
-            
-    except Exception as e:
-        logger.error(f"判断视频类型时发生异常: {str(e)}")
-        return None
-        
-    finally:
-        if cap is not None:
-            cap.release()  # 释放资源
+    return classify_video(video_path)
 
 
 def create_option(random_user_agent=False, random_proxy=False, headless=False, use_open_chrome=False):
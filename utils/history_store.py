@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: history_store.py
+Update: 2026.10.18
+"""
+
+import ast
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import config
+from logger import logger
+from .url_canonical import canonicalize_url
+from .url_filter import HashIndex, url_hash64, url_hashes
+
+storage_setting = config.load_config(config.STORAGE_SETTING_PATH, config.STORAGE_SETTING_DEFAULT_CONFIG)
+
+QUERY_CHUNK_SIZE = 500  # 批量查询时每条 SQL 的参数数量上限（SQLite 旧版本限制为 999）
+
+HISTORY_LOCK = threading.Lock()  # 用于保护历史记录数据库连接
+PENDING_CONDITION = threading.Condition()  # 用于保护待提交记录，并唤醒提交线程
+FLUSH_LOCK = threading.Lock()  # 用于保证同一时间只有一个线程提交
+INDEX_LOCK = threading.Lock()  # 用于保护 URL 哈希索引（获取顺序：先 INDEX_LOCK，后 PENDING_CONDITION、HISTORY_LOCK）
+
+_connection = None
+_flusher = None
+_pending = {}  # (网站, 类型, 方式, 格式) -> {url: 时间戳}，等待批量提交的记录
+_pending_count = 0
+_migrated = set()  # 已检查过 txt 历史记录的 (网站, 类型, 方式, 格式)
+_indexes = {}  # (网站, 类型, 方式, 格式) -> HashIndex
+
+
+def _get_connection():
+    """
+    获取历史记录数据库连接（WAL 模式，多个进程可以同时读写）。
+
+    :return: sqlite3 连接。
+    """
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(config.HISTORY_DB_PATH), exist_ok=True)
+        _connection = sqlite3.connect(config.HISTORY_DB_PATH, timeout=30, check_same_thread=False)
+        _connection.execute('PRAGMA journal_mode=WAL')
+        _connection.execute('PRAGMA synchronous=NORMAL')
+        # 主键即索引，按 网站/类型/方式/格式/URL 查询是否存在只需一次索引查找
+        _connection.execute('CREATE TABLE IF NOT EXISTS history (web TEXT NOT NULL, type TEXT NOT NULL, way TEXT NOT NULL, '
+                            'format TEXT NOT NULL, url TEXT NOT NULL, created_at REAL NOT NULL, '
+                            'PRIMARY KEY (web, type, way, format, url)) WITHOUT ROWID')
+        # 各 网站/类型/方式/格式 的记录数，用于判断磁盘上的过滤器是否过期，避免 COUNT(*) 扫描整个表
+        if not _connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_count'").fetchone():
+            _connection.execute('CREATE TABLE history_count (web TEXT NOT NULL, type TEXT NOT NULL, way TEXT NOT NULL, '
+                                'format TEXT NOT NULL, count INTEGER NOT NULL, '
+                                'PRIMARY KEY (web, type, way, format)) WITHOUT ROWID')
+            _connection.execute('INSERT INTO history_count SELECT web, type, way, format, COUNT(*) FROM history '
+                                'GROUP BY web, type, way, format')
+        _connection.commit()
+
+    return _connection
+
+
+def _get_db_count(connection, key):
+    """
+    获取数据库中某一 网站/类型/方式/格式 的记录数（调用方持有 HISTORY_LOCK）。
+
+    :param connection: sqlite3 连接。
+    :param key: (网站, 类型, 方式, 格式)。
+    :return: 记录数。
+    """
+    row = connection.execute('SELECT count FROM history_count WHERE web = ? AND type = ? AND way = ? AND format = ?',
+                             key).fetchone()
+
+    return row[0] if row else 0
+
+
+def _insert_rows(rows):
+    """
+    在一个事务中写入多条记录，已存在的记录忽略，同时更新记录数。
+
+    :param rows: [(网站, 类型, 方式, 格式, url, 时间戳)] 列表。
+    """
+    if not rows:
+        return
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[:4], []).append(row)
+
+    with HISTORY_LOCK:
+        connection = _get_connection()
+        with connection:
+            for key, key_rows in grouped.items():
+                inserted = connection.executemany('INSERT OR IGNORE INTO history (web, type, way, format, url, created_at) '
+                                                  'VALUES (?, ?, ?, ?, ?, ?)', key_rows).rowcount
+                if inserted > 0:
+                    connection.execute('INSERT INTO history_count (web, type, way, format, count) VALUES (?, ?, ?, ?, ?) '
+                                       'ON CONFLICT (web, type, way, format) DO UPDATE SET count = count + excluded.count',
+                                       (*key, inserted))
+
+
+def _get_index_path(key):
+    """
+    :param key: (网站, 类型, 方式, 格式)。
+    :return: 哈希索引路径（history/url_index/网站/类型/方式_格式，不含代编号与扩展名）。
+    """
+    web_name, type_name, way, format = key
+    return os.path.join(config.HISTORY_INDEX_DIR_PATH, web_name, type_name, f'{way}_{format}')
+
+
+def _get_index(key):
+    """
+    获取哈希索引（调用方持有 INDEX_LOCK）：打开时只做内存映射，不读取内容；
+    没有有序文件，或数据库记录数多于索引中的哈希数（上次异常退出、其他进程写入）时从数据库重建。
+    索引中的哈希可能多于数据库记录（未提交的记录在异常退出时丢失），命中时由数据库确认，不影响结果。
+
+    :param key: (网站, 类型, 方式, 格式)。
+    :return: HashIndex 对象。
+    """
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    index = HashIndex(_get_index_path(key), storage_setting['history_merge_threshold'])
+    with HISTORY_LOCK:
+        db_count = _get_db_count(_get_connection(), key)
+
+    if index.stamp is None or db_count > len(index):
+        start_time = time.time()
+        # 先取待提交记录再读数据库：记录提交成功后才会移出待提交队列，两者合起来不会遗漏
+        with PENDING_CONDITION:
+            pending = list(_pending.get(key, ()))
+        with HISTORY_LOCK:
+            connection = _get_connection()
+            db_count = _get_db_count(connection, key)
+            hashes = url_hashes(row[0] for row in connection.execute(
+                'SELECT url FROM history WHERE web = ? AND type = ? AND way = ? AND format = ?', key))
+        index.rebuild(np.concatenate([hashes, url_hashes(pending)]), db_count)
+        logger.info(f"重建历史记录哈希索引 {'/'.join(key)}：{db_count} 条，耗时 {time.time() - start_time:.2f} 秒")
+
+    _indexes[key] = index
+
+    return index
+
+
+def sync_indexes():
+    """
+    将哈希索引的新增部分追加写入日志文件。
+    """
+    with INDEX_LOCK:
+        indexes = list(_indexes.values())
+
+    for index in indexes:
+        index.sync()
+
+
+def flush_history(save=True):
+    """
+    立即提交全部待提交的记录。
+
+    :param save: 是否同时写入哈希索引日志（后台线程定时提交时不写入，爬虫结束与进程退出时写入）。
+    """
+    global _pending_count
+
+    with FLUSH_LOCK:
+        with PENDING_CONDITION:
+            batch = {key: dict(urls) for key, urls in _pending.items() if urls}
+
+        _insert_rows([(*key, url, created_at) for key, urls in batch.items() for url, created_at in urls.items()])
+
+        # 提交成功后才移出待提交队列，提交过程中查询仍然可以在队列中找到
+        with PENDING_CONDITION:
+            for key, urls in batch.items():
+                pending = _pending.get(key, {})
+                for url in urls:
+                    if pending.pop(url, None) is not None:
+                        _pending_count -= 1
+                if not pending:
+                    _pending.pop(key, None)
+
+    if save:
+        sync_indexes()
+
+
+def _flush_loop():
+    """
+    提交线程：待提交记录达到 history_batch_size 条或距上次提交超过 history_flush_interval 秒时批量提交（group commit）。
+    """
+    interval = float(storage_setting['history_flush_interval'])
+    batch_size = int(storage_setting['history_batch_size'])
+
+    while True:
+        with PENDING_CONDITION:
+            PENDING_CONDITION.wait_for(lambda: _pending_count >= batch_size, timeout=interval)
+        try:
+            flush_history(save=False)
+        except Exception as e:
+            logger.error(f"历史记录提交失败: {e}")
+
+
+def _start_flusher():
+    """
+    启动提交线程，进程退出时提交剩余记录。
+    """
+    global _flusher
+
+    with PENDING_CONDITION:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, daemon=True)
+        _flusher.start()
+
+    atexit.register(flush_history)
+
+
+def migrate_txt_history(web_name, type_name, way='used', format='images'):
+    """
+    将旧的 txt 历史记录（history/网站/类型/方式_格式.txt）导入数据库，导入后改名为 .txt.migrated。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param way: 记录方式（used、wrong 等）。
+    :param format: 文件格式。
+    :return: 导入的记录数。
+    """
+    txt_path = os.path.join(config.USED_URLS_DIR_PATH, web_name, type_name, f'{way}_{format}.txt')
+    if not os.path.exists(txt_path):
+        return 0
+
+    now = time.time()
+    with open(txt_path, 'r', encoding='utf-8', errors='replace') as f:
+        rows = [(web_name, type_name, way, format, canonicalize_url(line.strip()), now) for line in f if line.strip()]
+
+    _insert_rows(rows)
+    os.replace(txt_path, txt_path + '.migrated')
+
+    # 已加载的哈希索引不包含导入的记录，加入新增部分
+    with INDEX_LOCK:
+        index = _indexes.get((web_name, type_name, way, format))
+        if index is not None:
+            index.add_many(url_hashes(row[4] for row in rows))
+    logger.info(f"已将 {txt_path} 中的 {len(rows)} 条历史记录导入数据库")
+
+    return len(rows)
+
+
+def _iter_history_txt(ways):
+    """
+    遍历 history 目录下的 txt 记录文件（history/网站/类型/方式_格式.txt）。
+
+    :param ways: 要遍历的记录方式。
+    :return: 生成 (网站, 类型, 方式, 格式)。
+    """
+    for web_name in sorted(os.listdir(config.USED_URLS_DIR_PATH)) if os.path.isdir(config.USED_URLS_DIR_PATH) else []:
+        web_dir = os.path.join(config.USED_URLS_DIR_PATH, web_name)
+        if not os.path.isdir(web_dir):
+            continue
+        for type_name in sorted(os.listdir(web_dir)):
+            type_dir = os.path.join(web_dir, type_name)
+            if not os.path.isdir(type_dir):
+                continue
+            for name in sorted(os.listdir(type_dir)):
+                stem, ext = os.path.splitext(name)
+                way, _, format = stem.partition('_')
+                if ext == '.txt' and way in ways and format:
+                    yield web_name, type_name, way, format
+
+
+def migrate_all_txt_history():
+    """
+    导入 history 目录下全部旧的 used_*.txt 与 wrong_*.txt 历史记录。
+
+    :return: 导入的记录数。
+    """
+    return sum(migrate_txt_history(*key) for key in _iter_history_txt(('used', 'wrong')))
+
+
+def _get_line_url(line):
+    """
+    获取 get 列表中一行对应的 URL（百度贴吧、petfinder 的图片记录为 (索引, URL) 元组）。
+
+    :param line: 行内容。
+    :return: URL。
+    """
+    if line.startswith('('):
+        try:
+            item = ast.literal_eval(line)
+        except (ValueError, SyntaxError):
+            return line
+        if isinstance(item, tuple) and item:
+            return str(item[-1])
+
+    return line
+
+
+def compact_get_list(web_name, type_name, format='images', ways=('used', 'wrong')):
+    """
+    整理 get 列表（history/网站/类型/get_格式.txt，多次运行只追加，会累积重复与已处理的记录）：
+    按去重键的 64 位哈希去重（np.unique，保留第一次出现的行），去掉已处理的记录，再原子地重写文件，
+    之后 have_pages/have_urls 继续运行时只读取未处理的部分。应在没有爬虫写入该文件时调用。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param format: 文件格式。
+    :param ways: 视为已处理的记录方式。
+    :return: 整理后剩余的行。
+    """
+    txt_path = os.path.join(config.USED_URLS_DIR_PATH, web_name, type_name, f'get_{format}.txt')
+    if not os.path.exists(txt_path):
+        return []
+
+    with open(txt_path, 'r', encoding='utf-8', errors='replace') as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    # 先按整行的哈希去掉完全相同的行（多次运行重复追加的主要部分），只对剩余的行做 URL 解析与规范化
+    _, first = np.unique(url_hashes(lines), return_index=True)
+    first.sort()  # 保持原顺序
+    urls = [canonicalize_url(_get_line_url(lines[i])) for i in first]
+    # 再按去重键的哈希去掉同一媒体的不同 URL
+    _, unique = np.unique(url_hashes(urls), return_index=True)
+    unique.sort()
+    first = first[unique]
+    urls = [urls[i] for i in unique]
+
+    # 去重键再次规范化结果不变，直接作为 URL 查询
+    history = HistorySet(web_name, type_name, format, way=ways[0], extra_ways=ways[1:])
+    used = history.contains_many(urls)
+    remaining = [lines[i] for i in first[~used]]
+
+    temp_path = txt_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.writelines(line + '\n' for line in remaining)
+    os.replace(temp_path, txt_path)
+    logger.info(f"整理 {txt_path}：共 {len(lines)} 行，去除重复 {len(lines) - len(first)} 行、"
+                f"已处理 {int(used.sum())} 行，剩余 {len(remaining)} 行")
+
+    return remaining
+
+
+def compact_all_get_lists(ways=('used', 'wrong')):
+    """
+    整理 history 目录下全部 get_*.txt。
+
+    :param ways: 视为已处理的记录方式。
+    :return: 剩余的总行数。
+    """
+    return sum(len(compact_get_list(web_name, type_name, format, ways))
+               for web_name, type_name, _, format in _iter_history_txt(('get',)))
+
+
+class HistorySet:
+    """
+    持久化的已处理 URL 集合，用法与 set 相同（in、add、update、len），替代启动时把整个 txt 读入内存的集合。
+
+    查询先在 64 位 URL 哈希的有序索引中二分查找（内存映射，启动时无需加载），新 URL 由索引直接排除，
+    命中时再查询数据库主键索引确认；新增的哈希在后台合并进有序文件（见 HashIndex）。
+    查询与保存都使用 canonicalize_url 得到的去重键，同一作品的不同 URL（签名、追踪参数等不同）视为同一条记录。
+    add 先记入内存中的待提交记录，由后台线程批量提交，进程异常退出时最多丢失最近 history_flush_interval 秒内的记录。
+    """
+
+    def __init__(self, web_name, type_name, format='images', way='used', extra_ways=()):
+        """
+        :param web_name: 网站名称。
+        :param type_name: 类型名称。
+        :param format: 格式（videos、images、pages 等）。
+        :param way: add 写入的记录方式。
+        :param extra_ways: 查询时同时视为已处理的其他记录方式（例如 wrong）。
+        """
+        self.web_name = web_name
+        self.type_name = type_name
+        self.format = format
+        self.way = way
+        self.ways = (way, *extra_ways)
+        self.key = (web_name, type_name, way, format)
+        self.keys = [(web_name, type_name, query_way, format) for query_way in self.ways]
+
+        for key in self.keys:
+            if key not in _migrated:
+                _migrated.add(key)
+                migrate_txt_history(*key)
+
+        if float(storage_setting['history_flush_interval']) > 0:
+            _start_flusher()
+
+    def __contains__(self, url):
+        url = canonicalize_url(url)
+        if not url:
+            return False
+
+        value = url_hash64(url)
+        with INDEX_LOCK:
+            ways = [key[2] for key in self.keys if value in _get_index(key)]
+        if not ways:
+            return False
+
+        with PENDING_CONDITION:
+            for way in ways:
+                if url in _pending.get((self.web_name, self.type_name, way, self.format), ()):
+                    return True
+
+        placeholders = ', '.join('?' * len(ways))
+        with HISTORY_LOCK:
+            row = _get_connection().execute(
+                f'SELECT 1 FROM history WHERE web = ? AND type = ? AND way IN ({placeholders}) AND format = ? AND url = ? LIMIT 1',
+                (self.web_name, self.type_name, *ways, self.format, url)).fetchone()
+
+        return row is not None
+
+    def contains_many(self, urls):
+        """
+        批量查询：在哈希索引中向量化二分查找，命中的部分再批量查询数据库确认。
+
+        :param urls: URL 列表。
+        :return: 布尔数组，与 urls 一一对应。
+        """
+        urls = [canonicalize_url(url) for url in urls]
+        found = np.zeros(len(urls), dtype=bool)
+        if not urls:
+            return found
+
+        hashes = url_hashes(urls)
+        hit = np.zeros(len(urls), dtype=bool)
+        with INDEX_LOCK:
+            for key in self.keys:
+                hit |= _get_index(key).contains_many(hashes)
+
+        candidates = {urls[i] for i in np.flatnonzero(hit) if urls[i]}
+        confirmed = set()
+        with PENDING_CONDITION:
+            for key in self.keys:
+                confirmed.update(candidates.intersection(_pending.get(key, ())))
+        candidates -= confirmed
+
+        candidates = list(candidates)
+        placeholders = ', '.join('?' * len(self.ways))
+        with HISTORY_LOCK:
+            connection = _get_connection()
+            for i in range(0, len(candidates), QUERY_CHUNK_SIZE):
+                chunk = candidates[i:i + QUERY_CHUNK_SIZE]
+                confirmed.update(row[0] for row in connection.execute(
+                    f'SELECT url FROM history WHERE web = ? AND type = ? AND way IN ({placeholders}) AND format = ? '
+                    f'AND url IN ({", ".join("?" * len(chunk))})',
+                    (self.web_name, self.type_name, *self.ways, self.format, *chunk)))
+
+        for i in np.flatnonzero(hit):
+            found[i] = urls[i] in confirmed
+
+        return found
+
+    def add(self, url):
+        """
+        记录一个已处理的 URL。
+
+        :param url: URL。
+        """
+        self.update([url])
+
+    def update(self, urls):
+        """
+        记录多个已处理的 URL。
+
+        :param urls: URL 列表。
+        """
+        global _pending_count
+
+        urls = [canonicalize_url(url) for url in urls if url]
+        if not urls:
+            return
+
+        with INDEX_LOCK:
+            _get_index(self.key).add_many(url_hashes(urls))
+
+            if float(storage_setting['history_flush_interval']) <= 0:
+                # 不使用批量提交时立即写入
+                now = time.time()
+                _insert_rows([(*self.key, url, now) for url in urls])
+            else:
+                with PENDING_CONDITION:
+                    pending = _pending.setdefault(self.key, {})
+                    now = time.time()
+                    for url in urls:
+                        if url not in pending:
+                            pending[url] = now
+                            _pending_count += 1
+                    if _pending_count >= int(storage_setting['history_batch_size']):
+                        PENDING_CONDITION.notify()
+
+    def __iter__(self):
+        flush_history(save=False)
+        placeholders = ', '.join('?' * len(self.ways))
+        with HISTORY_LOCK:
+            urls = [row[0] for row in _get_connection().execute(
+                f'SELECT url FROM history WHERE web = ? AND type = ? AND way IN ({placeholders}) AND format = ?',
+                (self.web_name, self.type_name, *self.ways, self.format))]
+
+        return iter(urls)
+
+    def __len__(self):
+        flush_history(save=False)
+        with HISTORY_LOCK:
+            connection = _get_connection()
+            return sum(_get_db_count(connection, key) for key in self.keys)
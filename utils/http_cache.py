@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: http_cache.py
+Update: 2026.10.18
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import config
+from logger import logger
+from .http_utils import http_get
+
+CACHE_LOCK = threading.Lock()  # 用于保护页面缓存数据库的访问
+
+_connection = None
+
+
+def _get_connection():
+    """
+    获取页面缓存数据库连接（所有爬虫共用，缓存按 网站/类型 区分，与历史记录一致）。
+
+    :return: sqlite3 连接。
+    """
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(config.HTTP_CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(config.HTTP_CACHE_PATH, timeout=30, check_same_thread=False)
+        _connection.execute('PRAGMA journal_mode=WAL')
+        # 按 网站/类型/URL 区分，同一页面在其他类型中爬取时不会被误判为已解析
+        _connection.execute('CREATE TABLE IF NOT EXISTS page_cache (web TEXT NOT NULL, type TEXT NOT NULL, url TEXT NOT NULL, '
+                            'etag TEXT, last_modified TEXT, sha256 TEXT NOT NULL, updated_at REAL NOT NULL, '
+                            'PRIMARY KEY (web, type, url)) WITHOUT ROWID')
+        _connection.commit()
+
+    return _connection
+
+
+def _get_entry(web_name, type_name, url):
+    """
+    读取 URL 的缓存信息。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param url: 页面 URL。
+    :return: (etag, last_modified, sha256)，不存在返回 None。
+    """
+    with CACHE_LOCK:
+        return _get_connection().execute('SELECT etag, last_modified, sha256 FROM page_cache WHERE web = ? AND type = ? AND url = ?',
+                                         (web_name, type_name, url)).fetchone()
+
+
+def conditional_get(web_name, type_name, url, headers=None, proxies=None, **kwargs):
+    """
+    带条件请求的页面获取：同一网站与类型下已缓存的页面发送 If-None-Match/If-Modified-Since，
+    返回 304 或正文摘要与上次相同时视为未变化，调用方可跳过解析（该类型之前已解析过）。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param url: 页面 URL。
+    :param headers: 请求头。
+    :param proxies: 代理字典。
+    :return: (requests.Response 对象, 是否有变化)。
+    """
+    entry = _get_entry(web_name, type_name, url)
+    headers = dict(headers or {})
+
+    if entry:
+        etag, last_modified, _ = entry
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    response = http_get(url, headers=headers, proxies=proxies, **kwargs)
+
+    if entry and response.status_code == 304:
+        logger.info(f"页面未变化（304），跳过解析: {url}")
+        return response, False
+
+    if entry and response.ok and hashlib.sha256(response.content).hexdigest() == entry[2]:
+        logger.info(f"页面内容与缓存相同，跳过解析: {url}")
+        return response, False
+
+    return response, True
+
+
+def save_http_cache(web_name, type_name, url, response):
+    """
+    页面解析完成后记录缓存信息（ETag、Last-Modified 与正文摘要），下次同一网站与类型请求时作为条件。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param url: 页面 URL（与 conditional_get 的参数一致）。
+    :param response: requests.Response 对象。
+    """
+    if response is None or not response.ok or response.status_code == 304:
+        return
+
+    sha256 = hashlib.sha256(response.content).hexdigest()
+
+    with CACHE_LOCK:
+        connection = _get_connection()
+        connection.execute('INSERT OR REPLACE INTO page_cache (web, type, url, etag, last_modified, sha256, updated_at) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                           (web_name, type_name, url, response.headers.get('ETag'), response.headers.get('Last-Modified'), sha256, time.time()))
+        connection.commit()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: http_utils.py
+Update: 2026.10.18
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from http import cookiejar
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from logger import logger
+from .adaptive_concurrency import report_response
+from .rate_limiter import throttle
+
+network_setting = config.load_config(config.NETWORK_SETTING_PATH, config.NETWORK_SETTING_DEFAULT_CONFIG)
+
+_SESSIONS = OrderedDict()  # (协议, 主机, 代理) -> requests.Session
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _get_session_key(url, proxies=None):
+    """
+    获取会话缓存的键，按协议、主机与代理区分。
+
+    :param url: 请求 URL。
+    :param proxies: 代理字典。
+    :return: 会话键。
+    """
+    parsed = urlparse(url)
+    proxy_items = tuple(sorted((k, v) for k, v in (proxies or {}).items() if v))
+
+    return parsed.scheme, parsed.netloc, proxy_items
+
+
+def _create_session():
+    """
+    创建带连接池的会话。
+
+    :return: requests.Session 对象。
+    """
+    session = requests.Session()
+
+    adapter = HTTPAdapter(
+        pool_connections=int(network_setting['pool_connections']),
+        pool_maxsize=int(network_setting['pool_maxsize']),
+        pool_block=bool(network_setting['pool_block']),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    # 会话只用于复用连接，不保存任何 cookie，保持与单次请求一致的行为
+    session.cookies.set_policy(cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+    if not network_setting['keep_alive']:
+        session.headers['Connection'] = 'close'
+
+    return session
+
+
+def get_session(url, proxies=None):
+    """
+    获取指定主机与代理对应的共享会话，不存在则新建。
+
+    :param url: 请求 URL。
+    :param proxies: 代理字典。
+    :return: requests.Session 对象。
+    """
+    key = _get_session_key(url, proxies)
+
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is not None:
+            _SESSIONS.move_to_end(key)
+            return session
+
+        session = _create_session()
+        _SESSIONS[key] = session
+        logger.debug(f"新建连接池会话: {key}")
+
+        # 超出上限时关闭最久未使用的会话
+        while len(_SESSIONS) > int(network_setting['max_sessions']):
+            _, old_session = _SESSIONS.popitem(last=False)
+            old_session.close()
+
+    return session
+
+
+def http_get(url, headers=None, proxies=None, **kwargs):
+    """
+    经过域名限速后通过共享连接池发送 GET 请求，参数与 requests.get 一致。
+
+    :param url: 请求 URL。
+    :param headers: 请求头。
+    :param proxies: 代理字典。
+    :return: requests.Response 对象。
+    """
+    throttle(url)
+    session = get_session(url, proxies)
+
+    # 请求结果与耗时用于按主机自适应调整并发上限
+    start_time = time.monotonic()
+    try:
+        response = session.get(url, headers=headers, proxies=proxies, **kwargs)
+    except requests.exceptions.RequestException as e:
+        report_response(url, error=e)
+        raise
+
+    report_response(url, status_code=response.status_code, latency=time.monotonic() - start_time)
+
+    return response
+
+
+def close_sessions():
+    """
+    关闭并清空全部共享会话。
+    """
+    with _SESSIONS_LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: id_allocator.py
+Update: 2026.10.18
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+
+import config
+from logger import logger
+
+storage_setting = config.load_config(config.STORAGE_SETTING_PATH, config.STORAGE_SETTING_DEFAULT_CONFIG)
+
+ALLOCATOR_LOCK = threading.Lock()  # 用于保护索引数据库连接与已创建的分配器列表
+
+_connection = None
+_allocators = []
+
+
+def _get_connection():
+    """
+    获取索引数据库连接（与历史记录共用 history.db，WAL 模式，多个进程可以同时预留）。
+
+    :return: sqlite3 连接。
+    """
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(config.HISTORY_DB_PATH), exist_ok=True)
+        _connection = sqlite3.connect(config.HISTORY_DB_PATH, timeout=30, check_same_thread=False)
+        _connection.execute('PRAGMA journal_mode=WAL')
+        _connection.execute('PRAGMA synchronous=FULL')  # 预留的索引块必须在使用前落盘
+        _connection.execute('CREATE TABLE IF NOT EXISTS id_blocks (web TEXT NOT NULL, type TEXT NOT NULL, format TEXT NOT NULL, '
+                            'next_id INTEGER NOT NULL, PRIMARY KEY (web, type, format)) WITHOUT ROWID')
+        _connection.commit()
+
+    return _connection
+
+
+class IdAllocator:
+    """
+    媒体索引（VIDEO_IDX、IMAGE_IDX、PAGE_IDX）分配器：从数据库中原子地预留一块连续索引（id_block_size 个），
+    进程内所有线程共用这一块，用完再预留下一块，分配时只加一次短锁；块在使用前已经提交，
+    进程崩溃只会留下未使用的空号，不会在下次运行时重复。多个进程同时爬取同一网站与类型时各自预留不同的块，
+    同样不会冲突。用法::
+
+        VIDEO_IDS = utils.IdAllocator(WEB_NAME, type_name, 'videos')
+        video_idx = VIDEO_IDS.allocate()
+    """
+
+    def __init__(self, web_name, type_name, format='images', block_size=None):
+        """
+        :param web_name: 网站名称。
+        :param type_name: 类型名称。
+        :param format: 格式（videos、images、pages）。
+        :param block_size: 每次预留的索引数量，默认读取存储配置。
+        """
+        self.key = (web_name, type_name, format)
+        self.block_size = max(1, int(block_size or storage_setting['id_block_size']))
+
+        self._lock = threading.Lock()  # 保护当前块与分配计数
+        self._next = 0  # 当前块中下一个索引
+        self._end = 0  # 当前块结束位置（不含）
+        self._allocated = 0
+
+        with ALLOCATOR_LOCK:
+            connection = _get_connection()
+            with connection:
+                # 首次使用时从旧的 {format}_idx.txt 继承计数
+                connection.execute('INSERT OR IGNORE INTO id_blocks (web, type, format, next_id) VALUES (?, ?, ?, ?)',
+                                   (*self.key, config.get_idx(web_name, type_name, format)))
+            _allocators.append(self)
+
+    def peek(self):
+        """
+        :return: 数据库中下一个未预留的索引（已预留但未使用的块之后）。
+        """
+        with ALLOCATOR_LOCK:
+            row = _get_connection().execute('SELECT next_id FROM id_blocks WHERE web = ? AND type = ? AND format = ?',
+                                            self.key).fetchone()
+
+        return row[0] if row else 0
+
+    def _reserve(self):
+        """
+        从数据库原子地预留一块索引（UPDATE 取得写锁后其他进程无法同时预留）。
+
+        :return: 块的起始索引。
+        """
+        with ALLOCATOR_LOCK:
+            connection = _get_connection()
+            with connection:
+                connection.execute('UPDATE id_blocks SET next_id = next_id + ? WHERE web = ? AND type = ? AND format = ?',
+                                   (self.block_size, *self.key))
+                end = connection.execute('SELECT next_id FROM id_blocks WHERE web = ? AND type = ? AND format = ?',
+                                         self.key).fetchone()[0]
+
+        return end - self.block_size
+
+    def allocate(self):
+        """
+        分配一个索引（线程安全，跨线程、跨进程、跨运行不重复；本进程内递增）。
+
+        :return: 索引。
+        """
+        with self._lock:
+            if self._next >= self._end:
+                self._next = self._reserve()
+                self._end = self._next + self.block_size
+
+            idx = self._next
+            self._next += 1
+            self._allocated += 1
+
+        return idx
+
+    @property
+    def allocated(self):
+        """
+        :return: 本进程已分配的索引数量。
+        """
+        with self._lock:
+            return self._allocated
+
+    def release(self):
+        """
+        归还当前块中未使用的索引：只有块之后没有再被预留（其他进程）时才能归还，否则保留为空号。
+        应在全部下载线程结束后调用，之后再分配会重新预留。
+        """
+        with self._lock:
+            if self._next >= self._end:
+                return
+
+            with ALLOCATOR_LOCK:
+                connection = _get_connection()
+                with connection:
+                    released = connection.execute('UPDATE id_blocks SET next_id = ? WHERE web = ? AND type = ? AND format = ? AND next_id = ?',
+                                                  (self._next, *self.key, self._end)).rowcount
+            if released:
+                logger.debug(f"归还未使用的索引 {'/'.join(self.key)}：{self._next} ~ {self._end - 1}")
+            self._end = self._next
+
+
+def release_ids():
+    """
+    归还全部分配器未使用的索引（进程退出时自动调用）。
+    """
+    with ALLOCATOR_LOCK:
+        allocators = list(_allocators)
+
+    for allocator in allocators:
+        try:
+            allocator.release()
+        except sqlite3.Error as e:
+            logger.error(f"归还索引失败 {'/'.join(allocator.key)}: {e}")
+
+
+atexit.register(release_ids)
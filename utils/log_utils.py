@@ -4,11 +4,17 @@ Project Name: web_crawler
 File Created: 2025.06.20
 Author: ZhangYuetao
 File Name: log_utils.py
-Update: 2025.06.20
+Update: 2026.10.18
 """
 
 import time
 from logger import logger
+from .adaptive_concurrency import get_adaptive_limits
+from .rate_limiter import get_byte_counters
+from .download_utils import get_transfer_stats
+from .history_store import flush_history
+from .retry_policy import get_breaker_states
+from .video_postprocess import get_postprocess_stats
 
 crawl_context = {}
 
@@ -29,6 +35,9 @@ def begin_logger(WEB_NAME, save_path, type_name, video_idx=None, image_idx=None,
     """
     crawl_context.clear()
     crawl_context["start_time"] = time.time()
+    crawl_context["start_cpu_time"] = time.process_time()
+    crawl_context["start_transfer_bytes"] = get_transfer_stats()['bytes']
+    crawl_context["start_byte_counters"] = get_byte_counters()
 
     logger.info(f"--------------------开始爬虫--------------------")
     logger.info(f"当前爬取网站：{WEB_NAME}")
@@ -54,7 +63,11 @@ def end_logger(WEB_NAME, save_path, type_name, video_idx=None, image_idx=None, p
     :param new_image_count: 新增图片数量。
     :param new_page_count: 新增页面数量。
     """
+    flush_history()  # 结束前提交剩余的历史记录
     elapsed_time = time.time() - crawl_context.get("start_time", time.time())
+    cpu_time = time.process_time() - crawl_context.get("start_cpu_time", time.process_time())
+    transfer_stats = get_transfer_stats()
+    transfer_gb = (transfer_stats['bytes'] - crawl_context.get("start_transfer_bytes", 0)) / 1024 ** 3
 
     logger.info(f"--------------------爬虫结束--------------------")
     logger.info(f"当前爬取网站：{WEB_NAME}")
@@ -64,5 +77,30 @@ def end_logger(WEB_NAME, save_path, type_name, video_idx=None, image_idx=None, p
     logger.info(f"本次新增视频数量：{new_video_count}，当前视频索引：{video_idx}")
     logger.info(f"本次新增图片数量：{new_image_count}，当前图片索引：{image_idx}")
     logger.info(f"本次新增页面数量：{new_page_count}，当前页面索引：{page_idx}")
+    logger.info(f"本次下载数据量：{transfer_gb * 1024:.2f} MB，平均写入速度：{transfer_stats['bytes_per_second'] / 1024 / 1024:.2f} MB/s")
+    if transfer_gb > 0:
+        logger.info(f"CPU 耗时：{cpu_time:.2f} 秒（{cpu_time / transfer_gb:.2f} 秒/GB）")
+    start_counters = crawl_context.get("start_byte_counters", {'sites': {}, 'proxies': {}})
+    for key, label in (('sites', '主机'), ('proxies', '代理')):
+        for name, total in sorted(get_byte_counters()[key].items(), key=lambda item: -item[1]):
+            total -= start_counters[key].get(name, 0)
+            if total > 0:
+                logger.info(f"{label} {name} 下载流量：{total / 1024 / 1024:.2f} MB")
+    for host, stats in get_adaptive_limits().items():
+        if not stats['gated']:
+            continue  # 只统计了请求结果、并发不受自适应上限控制的主机
+        latency = f"{stats['latency']:.2f} 秒" if stats['latency'] is not None else '无'
+        logger.info(f"主机 {host}：并发上限 {stats['limit']}，平均延迟 {latency}，成功 {stats['success']} 次，限流/超时 {stats['overload']} 次")
+    postprocess_stats = get_postprocess_stats()
+    if postprocess_stats['jobs'] or postprocess_stats['failed']:
+        average_cpu = postprocess_stats['cpu_seconds'] / max(postprocess_stats['jobs'], 1)
+        logger.info(f"视频后处理：完成 {postprocess_stats['jobs']} 个（其中直接复制视频流 {postprocess_stats['copy_jobs']} 个），失败 {postprocess_stats['failed']} 个，"
+                    f"CPU 共 {postprocess_stats['cpu_seconds']:.2f} 秒（平均 {average_cpu:.2f} 秒/个，最长 {postprocess_stats['max_cpu_seconds']:.2f} 秒），"
+                    f"最大排队 {postprocess_stats['max_queue_depth']} 个，当前排队 {postprocess_stats['queue_depth']} 个")
+    for (kind, name), stats in get_breaker_states().items():
+        if not stats['trips']:
+            continue
+        state = f"暂停中（剩余 {stats['remaining']:.0f} 秒）" if stats['remaining'] > 0 else stats['state']
+        logger.info(f"熔断 {kind} {name}：当前 {state}，熔断 {stats['trips']} 次，成功 {stats['success']} 次，失败 {stats['failure']} 次")
     logger.info(f"总耗时：{elapsed_time:.2f} 秒")
     logger.info(f"------------------------------------------------")
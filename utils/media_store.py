@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: media_store.py
+Update: 2026.10.18
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+import config
+from logger import logger
+
+storage_setting = config.load_config(config.STORAGE_SETTING_PATH, config.STORAGE_SETTING_DEFAULT_CONFIG)
+
+DB_LOCK = threading.Lock()  # 用于保护内容索引数据库的访问
+
+_connection = None
+
+
+def _get_connection():
+    """
+    获取内容索引数据库连接（所有爬虫与类型共用同一个索引）。
+
+    :return: sqlite3 连接。
+    """
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(config.MEDIA_INDEX_PATH), exist_ok=True)
+        _connection = sqlite3.connect(config.MEDIA_INDEX_PATH, timeout=30, check_same_thread=False)
+        _connection.execute('PRAGMA journal_mode=WAL')
+        _connection.execute('CREATE TABLE IF NOT EXISTS media (sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL)')
+        _connection.execute('CREATE INDEX IF NOT EXISTS media_path ON media (path)')
+        _connection.execute('CREATE TABLE IF NOT EXISTS duplicates (path TEXT PRIMARY KEY, sha256 TEXT NOT NULL, original_path TEXT NOT NULL)')
+        _connection.commit()
+
+    return _connection
+
+
+def hash_file(file_path, buffer_size=1024 * 1024):
+    """
+    计算文件的 SHA-256。
+
+    :param file_path: 文件路径。
+    :param buffer_size: 读取缓冲区大小。
+    :return: 十六进制摘要。
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(buffer_size), b''):
+            hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+def _find_original(connection, sha256, size):
+    """
+    查找相同内容的已保存文件。
+
+    :param connection: sqlite3 连接。
+    :param sha256: 文件摘要。
+    :param size: 文件大小。
+    :return: 已保存文件路径，不存在则返回 None。
+    """
+    row = connection.execute('SELECT path, size FROM media WHERE sha256 = ?', (sha256,)).fetchone()
+    if row and row[1] == size and os.path.isfile(row[0]) and os.path.getsize(row[0]) == size:
+        return row[0]
+
+    return None
+
+
+def store_file(temp_path, save_path, sha256=None):
+    """
+    将下载完成的临时文件保存为正式文件；内容已存在时改为硬链接或清单记录，不再保存第二份。
+
+    :param temp_path: 临时文件路径。
+    :param save_path: 正式文件路径（调用方保证不存在）。
+    :param sha256: 文件摘要，为空时不去重。
+    :return: 相同内容的已保存文件路径，内容不重复时返回 None。
+    """
+    dedup_mode = storage_setting['dedup_mode']
+    if dedup_mode == 'off' or not sha256:
+        os.replace(temp_path, save_path)
+        return None
+
+    size = os.path.getsize(temp_path)
+    save_path = os.path.abspath(save_path)
+
+    with DB_LOCK:
+        connection = _get_connection()
+        original_path = _find_original(connection, sha256, size)
+
+        if original_path is None:
+            os.replace(temp_path, save_path)
+            connection.execute('INSERT OR REPLACE INTO media (sha256, path, size) VALUES (?, ?, ?)', (sha256, save_path, size))
+            connection.commit()
+            return None
+
+        linked = False
+        if dedup_mode == 'hardlink':
+            try:
+                os.link(original_path, save_path)
+                linked = True
+            except OSError as e:
+                logger.warning(f"创建硬链接失败，改为记录清单: {e}")
+
+        os.remove(temp_path)
+        connection.execute('INSERT OR REPLACE INTO duplicates (path, sha256, original_path) VALUES (?, ?, ?)',
+                           (save_path, sha256, original_path))
+        connection.commit()
+
+    logger.info(f"内容重复（与 {original_path} 相同），{'已硬链接到' if linked else '已记入清单，未保存'} {save_path}")
+
+    return original_path
+
+
+def rename_media(old_path, new_path):
+    """
+    重命名已保存的文件，并同步更新内容索引。
+
+    :param old_path: 原文件路径。
+    :param new_path: 新文件路径。
+    """
+    old_path = os.path.abspath(old_path)
+    new_path = os.path.abspath(new_path)
+
+    with DB_LOCK:
+        os.rename(old_path, new_path)
+
+        connection = _get_connection()
+        connection.execute('UPDATE media SET path = ? WHERE path = ?', (new_path, old_path))
+        connection.execute('UPDATE duplicates SET path = ? WHERE path = ?', (new_path, old_path))
+        connection.execute('UPDATE duplicates SET original_path = ? WHERE original_path = ?', (new_path, old_path))
+        connection.commit()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: page_archive.py
+Update: 2026.10.18
+"""
+
+import os
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时退回 zlib 压缩
+    zstandard = None
+
+import config
+from logger import logger
+
+storage_setting = config.load_config(config.STORAGE_SETTING_PATH, config.STORAGE_SETTING_DEFAULT_CONFIG)
+
+ARCHIVE_LOCK = threading.Lock()  # 用于保护存档分段文件与索引的写入
+
+INDEX_NAME = 'index.tsv'  # 每行：分段编号、偏移、长度、压缩方式、类型、时间戳、URL
+
+
+def _get_archive_dir(web_name, type_name):
+    """
+    获取存档目录。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :return: 目录路径。
+    """
+    return os.path.join(config.PAGE_ARCHIVE_DIR_PATH, web_name, type_name)
+
+
+def _get_segment_path(archive_dir, segment):
+    """
+    获取分段文件路径。
+
+    :param archive_dir: 存档目录。
+    :param segment: 分段编号。
+    :return: 文件路径。
+    """
+    return os.path.join(archive_dir, f'segment_{segment:05d}.bin')
+
+
+def _compress(data):
+    """
+    压缩单条记录（每条记录独立压缩，可按偏移随机读取）。
+
+    :param data: 原始字节。
+    :return: (压缩方式, 压缩后字节)。
+    """
+    level = int(storage_setting['archive_level'])
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=level).compress(data)
+
+    return 'zlib', zlib.compress(data, min(level, 9))
+
+
+def _decompress(codec, data):
+    """
+    解压单条记录。
+
+    :param codec: 压缩方式。
+    :param data: 压缩后字节。
+    :return: 原始字节。
+    """
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("存档使用 zstd 压缩，请先安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return zlib.decompress(data)
+
+
+def _find_last_segment(archive_dir):
+    """
+    查找最后一个分段编号。
+
+    :param archive_dir: 存档目录。
+    :return: 分段编号。
+    """
+    segments = [int(name[8:13]) for name in os.listdir(archive_dir) if name.startswith('segment_') and name.endswith('.bin')]
+
+    return max(segments) if segments else 0
+
+
+def archive_page(web_name, type_name, url, content, kind='page'):
+    """
+    将获取到的页面（请求返回的 HTML 或浏览器 page_source 快照）追加写入压缩存档，未开启 archive_pages 时不做任何事。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param url: 页面 URL。
+    :param content: 页面内容（str 或 bytes）。
+    :param kind: 记录类型：page（内容页面）或 search（搜索/列表页面快照）。
+    """
+    if not storage_setting['archive_pages'] or not content:
+        return
+
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    codec, compressed = _compress(data)
+    url = url.replace('\t', ' ').replace('\n', ' ')
+
+    archive_dir = _get_archive_dir(web_name, type_name)
+
+    with ARCHIVE_LOCK:
+        os.makedirs(archive_dir, exist_ok=True)
+
+        segment = _find_last_segment(archive_dir)
+        segment_path = _get_segment_path(archive_dir, segment)
+        if os.path.exists(segment_path) and os.path.getsize(segment_path) >= int(storage_setting['archive_segment_size']):
+            segment += 1
+            segment_path = _get_segment_path(archive_dir, segment)
+
+        # 先写数据再写索引，中途崩溃时索引不会指向不完整的记录
+        with open(segment_path, 'ab') as f:
+            offset = f.tell()
+            f.write(compressed)
+
+        with open(os.path.join(archive_dir, INDEX_NAME), 'a', encoding='utf-8') as f:
+            f.write(f"{segment}\t{offset}\t{len(compressed)}\t{codec}\t{kind}\t{time.time():.0f}\t{url}\n")
+
+
+def iter_archive(web_name, type_name, kind=None):
+    """
+    按写入顺序遍历存档中的页面。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param kind: 只返回指定类型的记录，为空时返回全部。
+    :return: 生成器，每项为 (url, html, kind, timestamp)。
+    """
+    archive_dir = _get_archive_dir(web_name, type_name)
+    index_path = os.path.join(archive_dir, INDEX_NAME)
+    if not os.path.exists(index_path):
+        logger.warning(f"未找到页面存档: {archive_dir}")
+        return
+
+    files = {}
+    try:
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            for line in index_file:
+                fields = line.rstrip('\n').split('\t', 6)
+                if len(fields) != 7:
+                    continue
+                segment, offset, length, codec, record_kind, timestamp, url = fields
+                if kind and record_kind != kind:
+                    continue
+
+                segment = int(segment)
+                if segment not in files:
+                    files[segment] = open(_get_segment_path(archive_dir, segment), 'rb')
+                f = files[segment]
+                f.seek(int(offset))
+                data = _decompress(codec, f.read(int(length)))
+
+                yield url, data.decode('utf-8', errors='replace'), record_kind, float(timestamp)
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def reparse_archive(web_name, type_name, extractor, kind='page'):
+    """
+    对存档中的页面重新运行提取函数，无需重新请求网站；同一 URL 多次存档时只保留最新一次的结果。
+
+    :param web_name: 网站名称。
+    :param type_name: 类型名称。
+    :param extractor: 提取函数，调用方式为 extractor(url, html)，返回空值表示无结果。
+    :param kind: 只处理指定类型的记录。
+    :return: [(url, 提取结果)] 列表。
+    """
+    results = {}
+    count = 0
+    start_time = time.time()
+
+    for url, html, _, _ in iter_archive(web_name, type_name, kind):
+        count += 1
+        try:
+            result = extractor(url, html)
+        except Exception as e:
+            logger.error(f"重新解析失败 {url}: {e}")
+            continue
+        results.pop(url, None)
+        if result:
+            results[url] = result
+
+    elapsed = time.time() - start_time
+    logger.info(f"重新解析 {web_name}/{type_name} 存档 {count} 个页面，{len(results)} 个有结果，耗时 {elapsed:.2f} 秒")
+
+    return list(results.items())
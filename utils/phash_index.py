@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: phash_index.py
+Update: 2026.10.18
+"""
+
+import itertools
+import os
+import threading
+
+import cv2
+import numpy as np
+
+import config
+from logger import logger
+
+storage_setting = config.load_config(config.STORAGE_SETTING_PATH, config.STORAGE_SETTING_DEFAULT_CONFIG)
+
+INDEX_LOCK = threading.Lock()  # 用于保护近重复索引的查询与写入
+
+CHUNK_COUNT = 4  # 64 位哈希拆分为 4 段 16 位，用于多索引哈希
+CHUNK_BITS = 64 // CHUNK_COUNT
+CHUNK_MASK = np.uint64((1 << CHUNK_BITS) - 1)
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+_index = None
+
+
+def _dct_matrix(size):
+    """
+    生成 DCT-II 变换矩阵。
+
+    :param size: 矩阵大小。
+    :return: (size, size) 的 DCT 矩阵。
+    """
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_uint64(bits):
+    """
+    将 64 个布尔位打包为 uint64。
+
+    :param bits: 64 个布尔值的数组。
+    :return: np.uint64 哈希值。
+    """
+    return np.frombuffer(np.packbits(bits.ravel()).tobytes(), dtype='>u8')[0].astype(np.uint64)
+
+
+def dhash(gray):
+    """
+    计算差值哈希（dHash）：缩放到 9x8 后比较相邻像素。
+
+    :param gray: 灰度图像数组。
+    :return: np.uint64 哈希值。
+    """
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    return _bits_to_uint64(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray):
+    """
+    计算感知哈希（pHash）：缩放到 32x32 后做二维 DCT，取低频 8x8 系数与中位数比较。
+
+    :param gray: 灰度图像数组。
+    :return: np.uint64 哈希值。
+    """
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float64)
+    low_freq = (_DCT_32 @ small @ _DCT_32.T)[:8, :8]
+
+    return _bits_to_uint64(low_freq > np.median(low_freq.ravel()[1:]))
+
+
+def compute_image_hash(image_path, algorithm=None):
+    """
+    读取图片并计算感知哈希（以缩小尺寸解码，支持中文路径）。
+
+    :param image_path: 图片路径。
+    :param algorithm: 'dhash' 或 'phash'，默认读取存储配置。
+    :return: np.uint64 哈希值，读取失败返回 None。
+    """
+    algorithm = algorithm or storage_setting['phash_algorithm']
+
+    data = np.fromfile(image_path, dtype=np.uint8)
+    gray = cv2.imdecode(data, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if gray is None:
+        return None
+
+    return phash(gray) if algorithm == 'phash' else dhash(gray)
+
+
+def hamming_distance(hashes, value):
+    """
+    向量化计算一组哈希与指定哈希的汉明距离。
+
+    :param hashes: uint64 数组。
+    :param value: uint64 哈希值。
+    :return: 距离数组。
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor)
+
+    return _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _chunk_masks(radius):
+    """
+    生成 16 位内汉明距离不超过 radius 的全部异或掩码。
+
+    :param radius: 半径。
+    :return: uint64 掩码数组。
+    """
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(CHUNK_BITS), r):
+            masks.append(sum(1 << b for b in bits))
+
+    return np.array(masks, dtype=np.uint64)
+
+
+class PHashIndex:
+    """
+    64 位感知哈希的近重复索引，使用多索引哈希（Multi-Index Hashing）查找汉明距离内的候选：
+    距离不超过 d 的两个哈希，至少有一段 16 位的距离不超过 d // 4，只需在各段的有序表中二分查找。
+    哈希以原始 uint64 追加写入 hashes.u64，路径逐行追加写入 paths.txt（行号即编号）。
+    """
+
+    def __init__(self, index_dir, max_distance):
+        """
+        :param index_dir: 索引保存目录。
+        :param max_distance: 判定为近重复的最大汉明距离。
+        """
+        self.index_dir = index_dir
+        self.max_distance = int(max_distance)
+        self.hashes_path = os.path.join(index_dir, 'hashes.u64')
+        self.paths_path = os.path.join(index_dir, 'paths.txt')
+
+        os.makedirs(index_dir, exist_ok=True)
+        if os.path.exists(self.hashes_path):
+            loaded = np.fromfile(self.hashes_path, dtype='<u8').astype(np.uint64)
+        else:
+            loaded = np.empty(0, dtype=np.uint64)
+
+        # 预留容量按倍数增长，避免每次添加都复制整个数组
+        self._buffer = np.empty(max(1024, len(loaded) * 2), dtype=np.uint64)
+        self._buffer[:len(loaded)] = loaded
+        self._count = len(loaded)
+
+        self._masks = _chunk_masks(self.max_distance // CHUNK_COUNT)
+        self._indexed_count = 0
+        self._chunk_values = []
+        self._chunk_ids = []
+        self._rebuild_tables()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def hashes(self):
+        return self._buffer[:self._count]
+
+    def _rebuild_tables(self):
+        """
+        重建各段的有序查找表，新增的哈希在下次重建前以暴力方式比较。
+        """
+        self._chunk_values = []
+        self._chunk_ids = []
+        for i in range(CHUNK_COUNT):
+            chunks = (self.hashes >> np.uint64(i * CHUNK_BITS)) & CHUNK_MASK
+            order = np.argsort(chunks, kind='stable')
+            self._chunk_values.append(chunks[order])
+            self._chunk_ids.append(order)
+        self._indexed_count = len(self.hashes)
+
+    def query(self, value):
+        """
+        查找与指定哈希距离最近的近重复项。
+
+        :param value: uint64 哈希值。
+        :return: (编号, 距离)，不存在近重复时返回 None。
+        """
+        value = np.uint64(value)
+        candidates = []
+
+        for i in range(CHUNK_COUNT):
+            chunk = (value >> np.uint64(i * CHUNK_BITS)) & CHUNK_MASK
+            variants = np.bitwise_xor(self._masks, chunk)
+            lefts = np.searchsorted(self._chunk_values[i], variants, side='left')
+            rights = np.searchsorted(self._chunk_values[i], variants, side='right')
+            for left, right in zip(lefts, rights):
+                if right > left:
+                    candidates.append(self._chunk_ids[i][left:right])
+
+        # 尚未进入查找表的新增哈希
+        if len(self.hashes) > self._indexed_count:
+            candidates.append(np.arange(self._indexed_count, len(self.hashes)))
+
+        if not candidates:
+            return None
+
+        ids = np.unique(np.concatenate(candidates))
+        distances = hamming_distance(self.hashes[ids], value)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+
+        return int(ids[best]), int(distances[best])
+
+    def add(self, value, image_path):
+        """
+        添加哈希并追加写入磁盘。
+
+        :param value: uint64 哈希值。
+        :param image_path: 图片路径。
+        :return: 新哈希的编号。
+        """
+        image_id = self._count
+        if self._count == len(self._buffer):
+            self._buffer = np.concatenate([self._buffer, np.empty(len(self._buffer), dtype=np.uint64)])
+        self._buffer[self._count] = np.uint64(value)
+        self._count += 1
+
+        with open(self.hashes_path, 'ab') as f:
+            f.write(np.array([value], dtype='<u8').tobytes())
+        with open(self.paths_path, 'a', encoding='utf-8') as f:
+            f.write(image_path + '\n')
+
+        # 新增数量较多时合并进查找表（均摊 O(log n)）
+        if len(self.hashes) - self._indexed_count > max(4096, self._indexed_count // 16):
+            self._rebuild_tables()
+
+        return image_id
+
+    def get_path(self, image_id):
+        """
+        获取编号对应的图片路径。
+
+        :param image_id: 编号。
+        :return: 图片路径，不存在返回 None。
+        """
+        with open(self.paths_path, 'r', encoding='utf-8') as f:
+            line = next(itertools.islice(f, image_id, None), None)
+
+        return line.rstrip('\n') if line is not None else None
+
+
+def get_phash_index():
+    """
+    获取全局近重复索引（所有网站与类型共用），首次调用时从磁盘加载。
+
+    :return: PHashIndex 对象。
+    """
+    global _index
+    if _index is None:
+        _index = PHashIndex(config.PHASH_INDEX_DIR_PATH, storage_setting['phash_max_distance'])
+        logger.info(f"加载近重复图片索引：{len(_index)} 条")
+
+    return _index
+
+
+def check_near_duplicate(image_path):
+    """
+    在图片下载完成后检查是否为已有图片的近重复（缩放、重新编码等），按配置拒绝或标记。
+
+    :param image_path: 图片路径。
+    :return: True 表示图片因近重复被拒绝（已删除），否则返回 False。
+    """
+    phash_mode = storage_setting['phash_mode']
+    if phash_mode == 'off' or not os.path.isfile(image_path):
+        return False
+
+    try:
+        value = compute_image_hash(image_path)
+    except Exception as e:
+        logger.warning(f"计算感知哈希失败 {image_path}: {e}")
+        return False
+
+    if value is None:
+        logger.warning(f"无法解码图片，跳过近重复检查: {image_path}")
+        return False
+
+    with INDEX_LOCK:
+        index = get_phash_index()
+        match = index.query(value)
+
+        if match is None or phash_mode == 'tag':
+            index.add(value, os.path.abspath(image_path))
+
+    if match is None:
+        return False
+
+    original_path = index.get_path(match[0])
+    with INDEX_LOCK:
+        with open(os.path.join(config.PHASH_INDEX_DIR_PATH, 'near_duplicates.txt'), 'a', encoding='utf-8') as f:
+            f.write(f"{os.path.abspath(image_path)}\t{original_path}\t{match[1]}\n")
+
+    if phash_mode == 'reject':
+        os.remove(image_path)
+        logger.info(f"近重复图片（与 {original_path} 距离 {match[1]}），已删除 {image_path}")
+        return True
+
+    logger.info(f"近重复图片（与 {original_path} 距离 {match[1]}），已记录 {image_path}")
+
+    return False
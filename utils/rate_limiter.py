@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: rate_limiter.py
+Update: 2026.10.18
+"""
+
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import config
+from logger import logger
+
+network_setting = config.load_config(config.NETWORK_SETTING_PATH, config.NETWORK_SETTING_DEFAULT_CONFIG)
+
+_BUCKETS = {}  # 域名 -> TokenBucket
+_BUCKETS_LOCK = threading.Lock()
+
+BYTE_COUNTERS_LOCK = threading.Lock()  # 用于保护 BYTE_COUNTERS 与全局带宽令牌桶的创建
+BYTE_COUNTERS = {
+    'sites': {},  # 主机 -> 下载字节数
+    'proxies': {},  # 代理 -> 下载字节数（不使用代理时记为 direct）
+}
+
+_bandwidth_bucket = None
+
+
+class TokenBucket:
+    """
+    令牌桶：按 rate（次/秒）补充令牌，最多积累 burst 个；令牌不足时预约下一个令牌并等待，
+    多个线程共享同一个桶时总请求速率不会超过 rate。按字节限速时每个字节对应一个令牌。
+    """
+
+    def __init__(self, rate, burst=1, jitter=0.0):
+        """
+        :param rate: 每秒补充的令牌数。
+        :param burst: 令牌上限（允许的突发请求数）。
+        :param jitter: 每次请求额外增加 0~jitter 秒的随机等待。
+        """
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.jitter = float(jitter)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        预约令牌。
+
+        :param tokens: 令牌数量。
+        :return: 需要等待的秒数。
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= tokens
+
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        return wait + (random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+
+    def acquire(self, tokens=1):
+        """
+        获取令牌，不足时阻塞等待。
+
+        :param tokens: 令牌数量。
+        :return: 实际等待的秒数。
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+def _match_domain(host):
+    """
+    按最长后缀匹配配置中的域名。
+
+    :param host: 主机名。
+    :return: (域名, 限速配置)，未配置时返回 (None, 默认配置)。
+    """
+    host = host.split(':')[0].lower()
+    best = None
+    for domain in network_setting['rate_limits']:
+        if host == domain or host.endswith('.' + domain):
+            if best is None or len(domain) > len(best):
+                best = domain
+
+    if best is None:
+        return None, {'rate': network_setting['default_rate'], 'burst': network_setting['default_burst'], 'jitter': network_setting['default_jitter']}
+
+    return best, network_setting['rate_limits'][best]
+
+
+def get_bucket(url):
+    """
+    获取 URL 所属域名的令牌桶，同一域名下的所有线程共用。
+
+    :param url: 请求 URL。
+    :return: TokenBucket 对象，不限速时返回 None。
+    """
+    host = urlparse(url).netloc
+    domain, limit = _match_domain(host)
+    if float(limit.get('rate', 0)) <= 0:
+        return None
+
+    key = domain or host
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(key)
+        if bucket is None:
+            bucket = TokenBucket(limit['rate'], limit.get('burst', 1), limit.get('jitter', 0))
+            _BUCKETS[key] = bucket
+            logger.debug(f"新建限速令牌桶: {key}（{bucket.rate} 次/秒，突发 {bucket.burst:g}，抖动 {bucket.jitter} 秒）")
+
+    return bucket
+
+
+def throttle(url):
+    """
+    请求前按域名限速，替代各爬虫中固定的 time.sleep。
+
+    :param url: 请求 URL。
+    :return: 实际等待的秒数。
+    """
+    bucket = get_bucket(url)
+    if bucket is None:
+        return 0.0
+
+    return bucket.acquire()
+
+
+def driver_get(driver, url):
+    """
+    经过域名限速后使用浏览器打开页面。
+
+    :param driver: selenium WebDriver 对象。
+    :param url: 页面 URL。
+    """
+    throttle(url)
+    driver.get(url)
+
+
+def get_bandwidth_bucket():
+    """
+    获取全局带宽令牌桶（按字节），本进程的全部下载共用。
+
+    :return: TokenBucket 对象，不限速时返回 None。
+    """
+    global _bandwidth_bucket
+
+    limit = float(network_setting['bandwidth_limit'])
+    if limit <= 0:
+        return None
+
+    with BYTE_COUNTERS_LOCK:
+        if _bandwidth_bucket is None:
+            _bandwidth_bucket = TokenBucket(limit, max(float(network_setting['bandwidth_burst']), 1.0))
+            logger.info(f"全局带宽上限：{limit / 1024 / 1024:.2f} MB/s")
+
+    return _bandwidth_bucket
+
+
+def throttle_bytes(url, size, proxies=None):
+    """
+    记录下载的字节数（按主机与代理分别统计），并按全局带宽上限等待。
+
+    :param url: 下载 URL。
+    :param size: 本次读取的字节数。
+    :param proxies: 代理字典或代理地址。
+    :return: 实际等待的秒数。
+    """
+    if size <= 0:
+        return 0.0
+
+    parsed = urlparse(url)
+    proxy = proxies.get(parsed.scheme) if isinstance(proxies, dict) else proxies
+
+    with BYTE_COUNTERS_LOCK:
+        sites = BYTE_COUNTERS['sites']
+        sites[parsed.netloc] = sites.get(parsed.netloc, 0) + size
+        proxy_counters = BYTE_COUNTERS['proxies']
+        proxy_counters[proxy or 'direct'] = proxy_counters.get(proxy or 'direct', 0) + size
+
+    bucket = get_bandwidth_bucket()
+    if bucket is None:
+        return 0.0
+
+    return bucket.acquire(size)
+
+
+def get_byte_counters():
+    """
+    获取按主机与代理统计的下载字节数。
+
+    :return: {'sites': {主机: 字节数}, 'proxies': {代理: 字节数}}。
+    """
+    with BYTE_COUNTERS_LOCK:
+        return {key: dict(value) for key, value in BYTE_COUNTERS.items()}
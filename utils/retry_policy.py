@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: retry_policy.py
+Update: 2026.10.18
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+import config
+from logger import logger
+
+network_setting = config.load_config(config.NETWORK_SETTING_PATH, config.NETWORK_SETTING_DEFAULT_CONFIG)
+
+FATAL_STATUS_CODES = (400, 401, 404, 405, 410, 451)  # 重试也不会成功的状态码
+THROTTLED_STATUS_CODES = (403, 429, 503)  # 视为限流或封禁的状态码
+
+_BREAKERS = {}  # ('proxy' | 'host', 名称) -> CircuitBreaker
+_BREAKERS_LOCK = threading.Lock()
+
+
+class CircuitBreaker:
+    """
+    单个代理或主机的熔断器：连续失败达到阈值后熔断（open），冷却期内不再使用；
+    冷却结束后进入半开（half_open）状态放行试探请求，成功则恢复（closed），失败则重新熔断。
+    """
+
+    def __init__(self, kind, name, failure_threshold=None, cooldown=None):
+        """
+        :param kind: 类型：proxy 或 host。
+        :param name: 代理地址或主机名。
+        :param failure_threshold: 触发熔断的连续失败次数，默认读取网络配置。
+        :param cooldown: 熔断冷却时间（秒），默认读取网络配置。
+        """
+        self.kind = kind
+        self.name = name
+        self.failure_threshold = int(failure_threshold or network_setting['breaker_failure_threshold'])
+        self.cooldown = float(cooldown or network_setting['breaker_cooldown'])
+
+        self.state = 'closed'
+        self.failures = 0  # 连续失败次数
+        self.opened_at = 0.0
+        self.trial_at = None  # 半开状态下试探请求的开始时间
+        self.trip_count = 0  # 累计熔断次数
+        self.success_count = 0
+        self.failure_count = 0
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        """
+        :return: 距离冷却结束的秒数，未熔断返回 0。
+        """
+        with self.lock:
+            if self.state != 'open':
+                return 0.0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def is_available(self):
+        """
+        是否可以使用（不改变状态，供选择代理时过滤）。
+
+        :return: 未熔断或冷却已结束返回 True。
+        """
+        return self.remaining() <= 0
+
+    def allow(self):
+        """
+        申请发起一次请求：熔断冷却结束后只放行一个试探请求，其余请求继续等待。
+
+        :return: 是否放行。
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if now - self.opened_at < self.cooldown:
+                    return False
+                self.state = 'half_open'
+                self.trial_at = now
+                return True
+            # 试探请求长时间没有结果（例如调用方未报告）时允许新的试探
+            if now - self.trial_at >= self.cooldown:
+                self.trial_at = now
+                return True
+            return False
+
+    def record_success(self):
+        """
+        记录一次成功，恢复为正常状态。
+        """
+        with self.lock:
+            self.success_count += 1
+            self.failures = 0
+            if self.state != 'closed':
+                self.state = 'closed'
+                logger.info(f"[熔断] {self.kind} {self.name} 已恢复")
+
+    def record_failure(self, reason):
+        """
+        记录一次失败，连续失败达到阈值或半开试探失败时熔断。
+
+        :param reason: 失败原因（用于日志）。
+        """
+        with self.lock:
+            self.failure_count += 1
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.trip_count += 1
+                logger.warning(f"[熔断] {self.kind} {self.name} 连续失败 {self.failures} 次，暂停使用 {self.cooldown:.0f} 秒（{reason}）")
+
+
+def get_breaker(kind, name):
+    """
+    获取代理或主机的熔断器，不存在则新建。
+
+    :param kind: 类型：proxy 或 host。
+    :param name: 代理地址或主机名。
+    :return: CircuitBreaker 对象。
+    """
+    key = (kind, name)
+
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(kind, name)
+            _BREAKERS[key] = breaker
+
+    return breaker
+
+
+def is_proxy_available(proxy):
+    """
+    代理是否可用（未熔断或冷却已结束）。
+
+    :param proxy: 代理地址。
+    :return: 是否可用。
+    """
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(('proxy', proxy))
+
+    return breaker is None or breaker.is_available()
+
+
+def _get_proxy_name(proxy):
+    """
+    从代理地址或代理字典中取出代理地址。
+
+    :param proxy: 代理地址或 requests 的 proxies 字典。
+    :return: 代理地址，没有代理返回 None。
+    """
+    if isinstance(proxy, dict):
+        proxy = proxy.get('https') or proxy.get('http')
+
+    return proxy or None
+
+
+def _get_retry_after(response):
+    """
+    解析 Retry-After 响应头。
+
+    :param response: requests.Response 对象。
+    :return: 等待秒数，没有或无法解析返回 None。
+    """
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error):
+    """
+    对请求异常分类，决定是否重试以及计入哪个熔断器。
+
+    :param error: 异常对象。
+    :return: fatal（不再重试）、throttled（限流/封禁）、server（服务器错误）、timeout（超时）、
+             connection（连接或代理错误）或 unknown（其他异常）。
+    """
+    response = getattr(error, 'response', None)
+    status_code = response.status_code if response is not None else None
+
+    if status_code is not None:
+        if status_code in THROTTLED_STATUS_CODES:
+            return 'throttled'
+        if status_code >= 500:
+            return 'server'
+        if status_code in FATAL_STATUS_CODES or 400 <= status_code < 500:
+            return 'fatal'
+
+    if isinstance(error, (requests.exceptions.Timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                          requests.exceptions.InvalidSchema)):
+        return 'fatal'
+    if isinstance(error, (requests.exceptions.RequestException, ConnectionError)):
+        return 'connection'
+
+    return 'unknown'
+
+
+def backoff_delay(attempt, base_delay=None, max_delay=None):
+    """
+    计算指数退避的等待时间（full jitter：在 [0, min(上限, 基数 × 2^attempt)] 内均匀随机）。
+
+    :param attempt: 已失败的次数（从 0 开始）。
+    :param base_delay: 退避基数（秒），默认读取网络配置。
+    :param max_delay: 等待上限（秒），默认读取网络配置。
+    :return: 等待秒数。
+    """
+    base_delay = float(base_delay if base_delay is not None else network_setting['retry_base_delay'])
+    max_delay = float(max_delay if max_delay is not None else network_setting['retry_max_delay'])
+
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RetryPolicy:
+    """
+    单个任务的重试策略：失败按异常分类，不可恢复的错误（404 等）立即停止，其余按指数退避加随机抖动等待后重试；
+    同时维护代理与主机的熔断器，主机熔断期间的任务等待冷却而不是继续请求。用法::
+
+        retry = utils.RetryPolicy(url, max_attempts=5)
+        for _ in retry:
+            proxy = utils.get_random_proxy()
+            try:
+                ...
+                retry.succeed(proxy)
+                break
+            except requests.exceptions.RequestException as e:
+                retry.fail(e, proxy)
+    """
+
+    def __init__(self, url, max_attempts=None):
+        """
+        :param url: 请求 URL（用于确定主机熔断器）。
+        :param max_attempts: 最大尝试次数，默认读取网络配置。
+        """
+        self.url = url
+        self.max_attempts = int(max_attempts or network_setting['retry_max_attempts'])
+        self.host_breaker = get_breaker('host', urlparse(url).netloc or url)
+
+        self.attempt = 0
+        self.stopped = False
+        self.next_delay = 0.0
+
+    def __iter__(self):
+        """
+        依次产生尝试序号，两次尝试之间按退避时间等待；任务成功或遇到不可恢复的错误后停止。
+        """
+        while self.attempt < self.max_attempts and not self.stopped:
+            if self.attempt > 0 and self.next_delay > 0:
+                time.sleep(self.next_delay)
+
+            if not self.host_breaker.allow():
+                # 主机熔断中：等待冷却，本次计为一次失败的尝试
+                wait = self.host_breaker.remaining() or backoff_delay(self.attempt)
+                logger.info(f"[熔断] 主机 {self.host_breaker.name} 暂停中，等待 {wait:.1f} 秒: {self.url}")
+                self.attempt += 1
+                self.next_delay = wait
+                continue
+
+            self.next_delay = 0.0
+            yield self.attempt
+            self.attempt += 1
+
+    def succeed(self, proxy=None):
+        """
+        报告本次尝试成功。
+
+        :param proxy: 本次使用的代理地址或代理字典。
+        """
+        self.stopped = True
+        self.host_breaker.record_success()
+
+        proxy = _get_proxy_name(proxy)
+        if proxy:
+            get_breaker('proxy', proxy).record_success()
+
+    def fail(self, error, proxy=None):
+        """
+        报告本次尝试失败：按异常类型计入代理或主机熔断器，并计算下次重试前的等待时间。
+
+        :param error: 异常对象。
+        :param proxy: 本次使用的代理地址或代理字典。
+        :return: 异常分类。
+        """
+        kind = classify_error(error)
+        proxy = _get_proxy_name(proxy)
+        reason = f"{kind}: {error}"
+
+        if kind == 'fatal':
+            # 资源本身不可用，与代理和主机状态无关
+            self.stopped = True
+            logger.warning(f"不可恢复的错误，停止重试: {error}")
+            return kind
+
+        if kind in ('timeout', 'connection'):
+            # 连接类错误优先归咎于代理，没有代理时归咎于主机
+            if proxy:
+                get_breaker('proxy', proxy).record_failure(reason)
+            else:
+                self.host_breaker.record_failure(reason)
+        elif kind == 'throttled':
+            # 限流既说明主机压力大，也可能是该代理被封禁
+            self.host_breaker.record_failure(reason)
+            if proxy:
+                get_breaker('proxy', proxy).record_failure(reason)
+        elif kind == 'server':
+            self.host_breaker.record_failure(reason)
+
+        self.next_delay = backoff_delay(self.attempt)
+        retry_after = _get_retry_after(getattr(error, 'response', None))
+        if retry_after is not None:
+            self.next_delay = min(max(self.next_delay, retry_after), float(network_setting['retry_max_delay']))
+
+        return kind
+
+
+def get_breaker_states():
+    """
+    获取全部熔断器的状态与统计。
+
+    :return: {(类型, 名称): {'state', 'trips', 'success', 'failure', 'remaining'}}。
+    """
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.items())
+
+    return {
+        key: {
+            'state': breaker.state,
+            'trips': breaker.trip_count,
+            'success': breaker.success_count,
+            'failure': breaker.failure_count,
+            'remaining': breaker.remaining(),
+        }
+        for key, breaker in breakers
+    }
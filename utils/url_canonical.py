@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: url_canonical.py
+Update: 2026.10.18
+"""
+
+import re
+from urllib.parse import parse_qs, parse_qsl, unquote, urlencode, urlparse, urlunparse
+
+DOUYIN_ID_PATTERN = re.compile(r'^/(?:video|light|note)/(\d+)')  # 抖音作品页 /video/ID、/light/ID
+XHS_NOTE_PATTERN = re.compile(r'^/(?:search_result|explore|discovery/item)/([0-9a-f]{24})')  # 小红书笔记页
+BILIBILI_ID_PATTERN = re.compile(r'^/video/(BV[0-9A-Za-z]{10}|av\d+)', re.IGNORECASE)  # bilibili 视频页
+
+TRACKING_PARAMS = ('utm_', 'spm', 'from_source', 'vd_source')  # 通用的追踪参数前缀
+
+
+def _douyin_page(parsed):
+    """
+    抖音作品页：https://www.douyin.com/video/7234567890123456789、/light/7234567890123456789、?modal_id=7234567890123456789
+
+    :return: douyin:video:作品ID
+    """
+    match = DOUYIN_ID_PATTERN.match(parsed.path)
+    if match:
+        return f'douyin:video:{match.group(1)}'
+
+    modal_id = parse_qs(parsed.query).get('modal_id')
+    if modal_id and modal_id[0].isdigit():
+        return f'douyin:video:{modal_id[0]}'
+
+    return None
+
+
+def _douyin_media(parsed):
+    """
+    抖音视频 CDN：https://v3-web.douyinvod.com/签名/过期时间/video/tos/cn/tos-cn-ve-15/文件ID/?a=6383&br=1234&expire=...&signature=...
+    前两段路径与查询参数每次请求都不同，只保留 video/ 之后的对象路径（不同码率是不同的对象）。
+
+    :return: douyin:media:tos/cn/tos-cn-ve-15/文件ID
+    """
+    path = parsed.path.strip('/')
+    _, found, object_path = path.partition('video/tos/')
+    if found and object_path:
+        return f'douyin:media:tos/{object_path}'
+
+    return None
+
+
+def _xhs_page(parsed):
+    """
+    小红书笔记页：https://www.xiaohongshu.com/search_result/笔记ID?xsec_token=...&xsec_source=，以及 /explore/笔记ID、/discovery/item/笔记ID
+
+    :return: xhs:note:笔记ID
+    """
+    match = XHS_NOTE_PATTERN.match(parsed.path)
+    if match:
+        return f'xhs:note:{match.group(1)}'
+
+    return None
+
+
+def _xhs_media(parsed):
+    """
+    小红书 CDN：
+    图片 http://sns-webpic-qc.xhscdn.com/202410181234/签名/spectrum/1040g0k0...!nd_dft_wlteh_webp_3 与 https://ci.xiaohongshu.com/1040g0k0...?imageView2/...，
+    视频 http://sns-video-bd.xhscdn.com/stream/110/258/01e5..._258.mp4（不同节点主机名不同）。
+    去掉时间戳、签名、spectrum/ 目录、!样式后缀与查询参数，只保留图片 token 或视频对象路径，
+    同一图片在 xhscdn 与 ci.xiaohongshu.com 上得到相同的键。
+
+    :return: xhs:image:token 或 xhs:video:对象路径
+    """
+    path = unquote(parsed.path).split('!')[0].strip('/')
+    segments = path.split('/')
+    if len(segments) > 2 and segments[0].isdigit() and re.fullmatch(r'[0-9a-f]{32}', segments[1]):
+        segments = segments[2:]
+    if len(segments) > 1 and segments[0] == 'spectrum':
+        segments = segments[1:]
+    token = '/'.join(segments)
+    if not token:
+        return None
+
+    if parsed.netloc.lower().startswith('sns-video') or token.startswith('stream/'):
+        return f'xhs:video:{token}'
+
+    return f'xhs:image:{token}'
+
+
+def _bilibili_page(parsed):
+    """
+    bilibili 视频页：https://www.bilibili.com/video/BV1xx411c7mD/?spm_id_from=...&p=2
+
+    :return: bilibili:video:BV号（分P大于 1 时附加 :p分P）
+    """
+    match = BILIBILI_ID_PATTERN.match(parsed.path)
+    if not match:
+        return None
+
+    video_id = match.group(1)
+    page = parse_qs(parsed.query).get('p', ['1'])[0]
+    if page.isdigit() and int(page) > 1:
+        return f'bilibili:video:{video_id}:p{page}'
+
+    return f'bilibili:video:{video_id}'
+
+
+def _youtube_page(parsed):
+    """
+    YouTube 视频页：https://www.youtube.com/watch?v=视频ID&list=...、https://youtu.be/视频ID、/shorts/视频ID
+
+    :return: youtube:video:视频ID
+    """
+    if parsed.netloc.lower().endswith('youtu.be'):
+        video_id = parsed.path.strip('/').split('/')[0]
+    elif parsed.path.startswith('/shorts/'):
+        video_id = parsed.path.split('/')[2]
+    else:
+        video_id = parse_qs(parsed.query).get('v', [''])[0]
+
+    return f'youtube:video:{video_id}' if video_id else None
+
+
+CANONICALIZERS = {  # 按域名（最长后缀匹配）选择规范化方法，无法识别时退回通用规则
+    'douyin.com': _douyin_page,
+    'douyinvod.com': _douyin_media,
+    'xiaohongshu.com': _xhs_page,
+    'ci.xiaohongshu.com': _xhs_media,
+    'xhscdn.com': _xhs_media,
+    'bilibili.com': _bilibili_page,
+    'youtube.com': _youtube_page,
+    'youtu.be': _youtube_page,
+}
+
+
+def _generic(parsed):
+    """
+    通用规则：主机名小写，去掉片段与 utm_* 等追踪参数，其余参数保持不变（签名图片等参数可能决定内容）。
+
+    :return: 规范化后的 URL。
+    """
+    query = parsed.query
+    params = parse_qsl(query, keep_blank_values=True)
+    if any(key.lower().startswith(TRACKING_PARAMS) for key, _ in params):
+        query = urlencode([(key, value) for key, value in params if not key.lower().startswith(TRACKING_PARAMS)])
+
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path, parsed.params, query, ''))
+
+
+def canonicalize_url(url):
+    """
+    将 URL 映射为稳定的去重键：同一作品、笔记、图片或视频的不同 URL（签名、过期时间、追踪参数、/video 与 /light 等）得到相同的键，
+    用于已处理记录的查询与保存。
+
+    :param url: URL。
+    :return: 去重键，例如 douyin:video:7234567890123456789、xhs:note:64f1c2d3e4f5a6b7c8d9e0f1；无法解析时返回原 URL。
+    """
+    if not url or '://' not in url:
+        return url
+
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return url
+
+    host = parsed.netloc.split(':')[0].lower()
+    best = None
+    for domain in CANONICALIZERS:
+        if host == domain or host.endswith('.' + domain):
+            if best is None or len(domain) > len(best):
+                best = domain
+
+    key = CANONICALIZERS[best](parsed) if best else None
+
+    return key or _generic(parsed)
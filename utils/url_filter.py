@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: url_filter.py
+Update: 2026.10.18
+"""
+
+import glob
+import hashlib
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+
+from logger import logger
+
+INDEX_MAGIC = b'WCHIDX01'  # 索引文件头标识
+INDEX_HEADER = struct.Struct('<8sQQ')  # 标识、哈希数量、调用方提供的版本号（历史记录用重建时的数据库记录数）
+GENERATION_PATTERN = re.compile(r'\.(\d{8})\.u64$')
+
+
+def url_hash64(url):
+    """
+    计算 URL 的 64 位哈希（blake2b，跨进程、跨运行保持一致）。
+
+    :param url: URL。
+    :return: 64 位无符号整数。
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def url_hashes(urls):
+    """
+    批量计算 URL 的 64 位哈希。
+
+    :param urls: URL 列表。
+    :return: uint64 数组。
+    """
+    return np.fromiter((url_hash64(url) for url in urls), dtype=np.uint64)
+
+
+def write_hash_file(path, hashes, stamp=0):
+    """
+    原子地写入有序哈希文件（先写临时文件再替换）。
+
+    :param path: 文件路径。
+    :param hashes: 已排序去重的 uint64 数组。
+    :param stamp: 版本号。
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(hashes), stamp))
+        f.write(np.asarray(hashes, dtype='<u8').tobytes())
+    os.replace(temp_path, path)
+
+
+def map_hash_file(path):
+    """
+    以内存映射方式打开有序哈希文件，不读入内存，查询时由操作系统按页加载。
+
+    :param path: 文件路径。
+    :return: (uint64 数组, 版本号)，文件不存在或损坏返回 None。
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic, count, stamp = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+    except (OSError, struct.error):
+        return None
+
+    if magic != INDEX_MAGIC or os.path.getsize(path) != INDEX_HEADER.size + count * 8:
+        return None
+
+    if not count:
+        return np.empty(0, dtype=np.uint64), stamp
+
+    return np.memmap(path, dtype='<u8', mode='r', offset=INDEX_HEADER.size, shape=(count,)), stamp
+
+
+class HashIndex:
+    """
+    64 位 URL 哈希的有序索引：主体是内存映射的有序 uint64 文件，用 NumPy 二分查找，打开时无需加载；
+    新增的哈希记入内存集合并追加写入 .log 文件，达到 merge_threshold 条后由后台线程合并为新一代的有序文件。
+
+    有序文件按代编号（名称.00000001.u64），合并时写入新文件再切换映射，旧文件在不再映射后删除（Windows 无法替换已映射的文件）。
+    同一索引只应由一个进程写入。
+    """
+
+    def __init__(self, path, merge_threshold=65536):
+        """
+        :param path: 索引路径（不含代编号与扩展名）。
+        :param merge_threshold: 触发后台合并的新增哈希数量。
+        """
+        self.path = path
+        self.log_path = path + '.log'
+        self.merge_threshold = max(1, int(merge_threshold))
+
+        self.lock = threading.Lock()  # 保护新增集合与待写入日志
+        self.merge_lock = threading.Lock()  # 保证同一时间只有一次合并
+        self.merging = False
+
+        self.generation = 0
+        self.base = np.empty(0, dtype=np.uint64)
+        self.stamp = None  # 有序文件的版本号（合并时沿用），None 表示没有可用的有序文件
+        self.delta = set()
+        self.pending_log = []
+
+        for generation_path in sorted(glob.glob(glob.escape(path) + '.*.u64'), reverse=True):
+            match = GENERATION_PATTERN.search(generation_path)
+            mapped = map_hash_file(generation_path) if match else None
+            if mapped is not None:
+                self.generation = int(match.group(1))
+                self.base, self.stamp = mapped
+                break
+
+        if self.stamp is not None and os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as f:
+                data = f.read()
+            # 异常退出时最后一条可能只写入了一部分
+            self.delta.update(np.frombuffer(data[:len(data) // 8 * 8], dtype='<u8').tolist())
+
+        self._remove_old_generations()
+
+    def _generation_path(self, generation):
+        return f'{self.path}.{generation:08d}.u64'
+
+    def _remove_old_generations(self):
+        """
+        删除当前代之前的有序文件（仍被映射时删除失败，下次打开时再删除）。
+        """
+        for generation_path in glob.glob(glob.escape(self.path) + '.*.u64'):
+            match = GENERATION_PATTERN.search(generation_path)
+            if match and int(match.group(1)) < self.generation:
+                try:
+                    os.remove(generation_path)
+                except OSError:
+                    pass
+
+    @property
+    def log_count(self):
+        """
+        :return: 尚未合并进有序文件的哈希数量。
+        """
+        return len(self.delta)
+
+    def __len__(self):
+        return len(self.base) + len(self.delta)
+
+    def __contains__(self, value):
+        if value in self.delta:
+            return True
+
+        base = self.base
+        i = int(np.searchsorted(base, np.uint64(value)))
+
+        return i < len(base) and int(base[i]) == value
+
+    def _contains_base(self, values):
+        """
+        :param values: uint64 数组。
+        :return: 布尔数组，是否在有序文件中。
+        """
+        base = self.base
+        if not len(base):
+            return np.zeros(len(values), dtype=bool)
+        positions = np.minimum(np.searchsorted(base, values), len(base) - 1)
+
+        return base[positions] == values
+
+    def contains_many(self, values):
+        """
+        批量查询（向量化二分查找）。
+
+        :param values: uint64 数组。
+        :return: 布尔数组。
+        """
+        values = np.asarray(values, dtype=np.uint64)
+        found = self._contains_base(values)
+        if self.delta:
+            found |= np.isin(values, np.fromiter(self.delta, dtype=np.uint64, count=len(self.delta)))
+
+        return found
+
+    def add_many(self, values):
+        """
+        添加哈希（已存在的跳过，其余记入新增集合，待 sync 时追加写入日志），新增数量达到阈值时启动后台合并。
+
+        :param values: 64 位哈希列表或 uint64 数组。
+        """
+        values = np.asarray(values, dtype=np.uint64)
+        values = values[~self._contains_base(values)]
+        with self.lock:
+            for value in values.tolist():
+                if value not in self.delta:
+                    self.delta.add(value)
+                    self.pending_log.append(value)
+            start_merge = len(self.delta) >= self.merge_threshold and not self.merging
+            if start_merge:
+                self.merging = True
+
+        if start_merge:
+            threading.Thread(target=self._merge_in_background, daemon=True).start()
+
+    def sync(self):
+        """
+        将新增的哈希追加写入日志文件。
+        """
+        with self.lock:
+            pending, self.pending_log = self.pending_log, []
+
+        if pending:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'ab') as f:
+                f.write(np.array(pending, dtype='<u8').tobytes())
+
+    def _merge_in_background(self):
+        try:
+            self.merge()
+        except Exception as e:
+            logger.error(f"合并哈希索引失败 {self.path}: {e}")
+        finally:
+            with self.lock:
+                self.merging = False
+
+    def merge(self):
+        """
+        将新增的哈希合并进新一代的有序文件并切换映射，日志只保留合并期间新增的哈希。
+        合并期间查询与添加不受影响。
+        """
+        with self.merge_lock:
+            stamp = self.stamp or 0
+            with self.lock:
+                snapshot = np.fromiter(self.delta, dtype=np.uint64, count=len(self.delta))
+            if not len(snapshot):
+                return
+            base = self.base
+
+            merged = np.union1d(base, snapshot)
+            generation = self.generation + 1
+            write_hash_file(self._generation_path(generation), merged, stamp)
+            mapped, _ = map_hash_file(self._generation_path(generation))
+
+            with self.lock:
+                self.base, self.generation, self.stamp = mapped, generation, stamp
+                self.delta.difference_update(snapshot.tolist())
+                # 日志重写为尚未合并的哈希，待写入的部分一并写入
+                remaining = np.fromiter(self.delta, dtype=np.uint64, count=len(self.delta))
+                self.pending_log = []
+                temp_path = self.log_path + '.tmp'
+                with open(temp_path, 'wb') as f:
+                    f.write(remaining.astype('<u8').tobytes())
+                os.replace(temp_path, self.log_path)
+
+            del base
+            self._remove_old_generations()
+
+    def rebuild(self, hashes, stamp=0):
+        """
+        用给定的全部哈希重建索引（数据库与索引不一致时使用），清空日志。
+
+        :param hashes: uint64 数组。
+        :param stamp: 版本号。
+        """
+        with self.merge_lock:
+            generation = self.generation + 1
+            write_hash_file(self._generation_path(generation), np.unique(np.asarray(hashes, dtype=np.uint64)), stamp)
+            mapped, _ = map_hash_file(self._generation_path(generation))
+
+            with self.lock:
+                self.base, self.generation, self.stamp = mapped, generation, stamp
+                self.delta = set()
+                self.pending_log = []
+                if os.path.exists(self.log_path):
+                    os.remove(self.log_path)
+
+            self._remove_old_generations()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: video_classifier.py
+Update: 2026.10.18
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import config
+from logger import logger
+from .media_store import rename_media
+
+media_setting = config.load_config(config.MEDIA_SETTING_PATH, config.MEDIA_SETTING_DEFAULT_CONFIG)
+
+CLASSIFY_QUEUE = queue.Queue()  # 待分类的视频路径
+CLASSIFY_LOCK = threading.Lock()  # 用于保护进程池与调度线程的创建
+
+_executor = None
+_dispatcher = None
+
+
+def _sample_frames(cap, sample_count, max_width):
+    """
+    在视频中均匀抽取若干帧并缩小尺寸。
+
+    :param cap: cv2.VideoCapture 对象。
+    :param sample_count: 抽帧数量。
+    :param max_width: 缩小后的最大宽度。
+    :return: 帧列表（BGR）。
+    """
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if frame_count > sample_count:
+        positions = np.linspace(0, frame_count - 1, sample_count).astype(int)
+    else:
+        positions = [None] * sample_count  # 无法获取帧数时顺序读取
+
+    frames = []
+    for position in positions:
+        if position is not None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+        ret, frame = cap.read()
+        if not ret:
+            continue
+
+        height, width = frame.shape[:2]
+        if width > max_width:
+            frame = cv2.resize(frame, (max_width, max(1, height * max_width // width)), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+
+    return frames
+
+
+def classify_frames(frames, channel_tolerance=None, saturation_threshold=None):
+    """
+    根据通道差异与饱和度判断帧是否为红外（灰度）画面。
+
+    OpenCV 总是以 3 通道 BGR 返回帧，红外视频表现为三个通道几乎相等、饱和度接近 0。
+
+    :param frames: 帧列表（BGR 或单通道）。
+    :param channel_tolerance: 通道间平均差异的上限。
+    :param saturation_threshold: 平均饱和度（0~1）的上限。
+    :return: 'IR' 或 'RGB'。
+    """
+    channel_tolerance = float(channel_tolerance if channel_tolerance is not None else media_setting['ir_channel_tolerance'])
+    saturation_threshold = float(saturation_threshold if saturation_threshold is not None else media_setting['ir_saturation_threshold'])
+
+    pixels = np.concatenate([frame.reshape(-1, frame.shape[2] if frame.ndim == 3 else 1) for frame in frames])
+    if pixels.shape[1] == 1:
+        return 'IR'
+
+    pixels = pixels[:, :3].astype(np.int16)
+    channel_diff = np.abs(pixels[:, 0] - pixels[:, 1]).mean() + np.abs(pixels[:, 1] - pixels[:, 2]).mean()
+
+    max_value = pixels.max(axis=1)
+    min_value = pixels.min(axis=1)
+    saturation = np.where(max_value > 0, (max_value - min_value) / np.maximum(max_value, 1), 0).mean()
+
+    if channel_diff <= channel_tolerance and saturation <= saturation_threshold:
+        return 'IR'
+
+    return 'RGB'
+
+
+def classify_video(video_path, sample_count=None, max_width=None):
+    """
+    抽取若干缩小后的帧判断视频是 RGB 还是 IR（红外）。
+
+    :param video_path: 视频路径。
+    :param sample_count: 抽帧数量，默认读取媒体配置。
+    :param max_width: 缩小后的最大宽度，默认读取媒体配置。
+    :return: 视频类型 ('RGB' 或 'IR')，如果出错则返回 None。
+    """
+    sample_count = int(sample_count or media_setting['classify_sample_frames'])
+    max_width = int(max_width or media_setting['classify_max_width'])
+
+    cap = None
+    try:
+        cap = cv2.VideoCapture(video_path)
+
+        if not cap.isOpened():
+            logger.warning(f"判断视频类型失败，无法打开视频: {video_path}")
+            return None
+
+        frames = _sample_frames(cap, sample_count, max_width)
+        if not frames:
+            logger.warning(f"判断视频类型失败，无法读取视频帧: {video_path}")
+            return None
+
+        return classify_frames(frames)
+
+    except Exception as e:
+        logger.error(f"判断视频类型时发生异常: {str(e)}")
+        return None
+
+    finally:
+        if cap is not None:
+            cap.release()  # 释放资源
+
+
+def _apply_video_type(video_path, future):
+    """
+    分类完成后的回调：IR 视频将文件名中的 _RGB 改为 _IR。
+
+    :param video_path: 视频路径。
+    :param future: 分类任务。
+    """
+    try:
+        video_type = future.result()
+        if video_type == 'IR':
+            directory, filename = os.path.split(video_path)
+            new_save_path = os.path.join(directory, filename.replace('_RGB.', '_IR.'))
+            rename_media(video_path, new_save_path)
+            logger.info(f"红外视频已重命名为 {new_save_path}")
+    except Exception as e:
+        logger.error(f"视频分类或重命名失败 {video_path}: {e}")
+    finally:
+        CLASSIFY_QUEUE.task_done()
+
+
+def _dispatch_loop(max_pending):
+    """
+    调度线程：从队列取出视频提交到进程池，同时最多 max_pending 个任务在进程池中。
+
+    :param max_pending: 进程池中最大排队任务数。
+    """
+    pending = threading.BoundedSemaphore(max_pending)
+
+    while True:
+        video_path = CLASSIFY_QUEUE.get()
+        pending.acquire()
+        try:
+            future = _executor.submit(classify_video, video_path)
+        except Exception as e:
+            pending.release()
+            logger.error(f"提交视频分类任务失败 {video_path}: {e}")
+            CLASSIFY_QUEUE.task_done()
+            continue
+
+        def _on_done(f, path=video_path):
+            pending.release()
+            _apply_video_type(path, f)
+
+        future.add_done_callback(_on_done)
+
+
+def submit_video_classification(video_path):
+    """
+    将下载完成的视频加入分类队列，由进程池异步判断类型并在需要时重命名，下载线程无需等待。
+
+    :param video_path: 视频路径（文件名以 _RGB 结尾）。
+    """
+    global _executor, _dispatcher
+
+    with CLASSIFY_LOCK:
+        if _executor is None:
+            workers = int(media_setting['classify_workers']) or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _dispatcher = threading.Thread(target=_dispatch_loop, args=(workers * 2,), daemon=True)
+            _dispatcher.start()
+            logger.info(f"视频分类进程池已启动（{workers} 个进程）")
+
+    CLASSIFY_QUEUE.put(video_path)
+
+
+def wait_video_classification():
+    """
+    等待队列中的视频全部分类与重命名完成。
+    """
+    if _executor is None:
+        return
+
+    CLASSIFY_QUEUE.join()
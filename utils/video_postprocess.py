@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: video_postprocess.py
+Update: 2026.10.18
+"""
+
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import config
+from logger import logger
+from .download_utils import remove_file
+
+media_setting = config.load_config(config.MEDIA_SETTING_PATH, config.MEDIA_SETTING_DEFAULT_CONFIG)
+
+POSTPROCESS_LOCK = threading.Lock()  # 用于保护进程池、未完成任务与统计信息
+RESULT_QUEUE = queue.Queue()  # 进程池完成的任务 (future, 输入文件路径, 回调)，由结果线程保存
+
+BENCH_PATTERN = re.compile(r'utime=([\d.]+)s\s+stime=([\d.]+)s')  # ffmpeg -benchmark 输出的 CPU 时间
+INPUT_PATTERN = re.compile(r'^Input #0, (.+?), from ', re.MULTILINE)  # ffmpeg -i 输出的容器格式
+VIDEO_PATTERN = re.compile(r'Stream #0:\d+.*?: Video: (\w+)')  # ffmpeg -i 输出的第一个视频流编码
+
+MP4_COPY_CODECS = ('h264', 'hevc', 'av1', 'mpeg4')  # 可以直接封装进 MP4 的视频编码
+
+POSTPROCESS_STATS = {
+    'jobs': 0,  # 完成的任务数
+    'copy_jobs': 0,  # 直接复制视频流（不重新编码）的任务数
+    'failed': 0,  # 失败的任务数
+    'cpu_seconds': 0.0,  # ffmpeg 累计 CPU 时间
+    'max_cpu_seconds': 0.0,  # 单个任务的最大 CPU 时间
+    'wall_seconds': 0.0,  # 累计处理耗时
+    'max_queue_depth': 0,  # 观察到的最大排队任务数
+}
+
+_executor = None
+_slots = None
+_result_thread = None
+_futures = set()
+
+
+def probe_video(input_path):
+    """
+    探测视频的容器格式与视频编码（解析 ffmpeg -i 的输出，无需单独的 ffprobe）。
+
+    :param input_path: 视频文件路径。
+    :return: (容器格式列表, 视频编码)，无法识别的项为空。
+    """
+    result = subprocess.run([media_setting['ffmpeg_path'], '-hide_banner', '-i', input_path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = result.stderr.decode('utf-8', errors='replace')
+
+    container = INPUT_PATTERN.search(stderr)
+    codec = VIDEO_PATTERN.search(stderr)
+
+    return (container.group(1).split(',') if container else []), (codec.group(1) if codec else None)
+
+
+def get_strip_audio_args(input_path):
+    """
+    选择去除音频并输出 MP4 的 ffmpeg 参数：视频编码可以直接封装进 MP4 时只复制视频流，否则重新编码。
+
+    :param input_path: 视频文件路径。
+    :return: (输出参数列表, 处理方式：copy 或 transcode)。
+    """
+    if media_setting['postprocess_mode'] == 'copy':
+        _, codec = probe_video(input_path)
+        # 容器由输出文件扩展名决定，flv、mkv、webm 中的 H.264 等编码同样可以直接重新封装为 MP4
+        if codec in MP4_COPY_CODECS:
+            args = ['-map', '0:v:0', '-c:v', 'copy', '-an', '-movflags', '+faststart']
+            if codec == 'hevc':
+                args += ['-tag:v', 'hvc1']  # 兼容 QuickTime 等播放器
+            return args, 'copy'
+
+    return ['-an'], 'transcode'
+
+
+def strip_audio(input_path, output_path):
+    """
+    去除视频音频并输出 MP4（在进程池中执行），直接复制视频流失败时退回重新编码。
+
+    :param input_path: 输入文件路径（处理成功后删除）。
+    :param output_path: 输出文件路径。
+    :return: (输出文件路径, CPU 时间（秒）, 耗时（秒）, 处理方式)。
+    """
+    output_args, method = get_strip_audio_args(input_path)
+    if method == 'copy':
+        try:
+            return run_ffmpeg(input_path, output_path, output_args, method)
+        except RuntimeError:
+            pass
+
+    return run_ffmpeg(input_path, output_path, ['-an'], 'transcode')
+
+
+def run_ffmpeg(input_path, output_path, output_args, method='transcode'):
+    """
+    在子进程中运行 ffmpeg 处理单个视频，成功后删除输入文件（在进程池中执行）。
+
+    :param input_path: 输入文件路径。
+    :param output_path: 输出文件路径。
+    :param output_args: 输出参数列表，例如 ['-an']。
+    :param method: 处理方式（用于统计）：copy 或 transcode。
+    :return: (输出文件路径, CPU 时间（秒）, 耗时（秒）, 处理方式)。
+    """
+    command = [media_setting['ffmpeg_path'], '-hide_banner', '-nostats', '-benchmark', '-y',
+               '-i', input_path, *output_args, output_path]
+
+    start_time = time.time()
+    start_times = os.times()
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    end_times = os.times()
+    elapsed = time.time() - start_time
+
+    stderr = result.stderr.decode('utf-8', errors='replace')
+    if result.returncode != 0:
+        remove_file(output_path)
+        raise RuntimeError(f"ffmpeg 处理失败（返回码 {result.returncode}）: {stderr.strip()[-500:]}")
+
+    # 优先使用 ffmpeg 自身统计的 CPU 时间，Windows 上 os.times 无法统计子进程
+    match = BENCH_PATTERN.search(stderr)
+    if match:
+        cpu_time = float(match.group(1)) + float(match.group(2))
+    else:
+        cpu_time = (end_times.children_user - start_times.children_user) + (end_times.children_system - start_times.children_system)
+
+    remove_file(input_path)
+
+    return output_path, cpu_time, elapsed, method
+
+
+def _handle_result(future, input_path, on_done):
+    """
+    统计单个后处理任务的结果，成功时调用回调保存视频（在结果线程中执行）。
+
+    :param future: 已完成的 Future 对象。
+    :param input_path: 输入文件路径（用于日志）。
+    :param on_done: 处理成功后的回调，调用方式为 on_done(output_path)。
+    """
+    try:
+        path, cpu_time, elapsed, method = future.result()
+        with POSTPROCESS_LOCK:
+            POSTPROCESS_STATS['jobs'] += 1
+            POSTPROCESS_STATS['copy_jobs'] += method == 'copy'
+            POSTPROCESS_STATS['cpu_seconds'] += cpu_time
+            POSTPROCESS_STATS['max_cpu_seconds'] = max(POSTPROCESS_STATS['max_cpu_seconds'], cpu_time)
+            POSTPROCESS_STATS['wall_seconds'] += elapsed
+        logger.info(f"视频后处理完成（{'复制视频流' if method == 'copy' else '重新编码'}，CPU {cpu_time:.2f} 秒，耗时 {elapsed:.2f} 秒）: {path}")
+        on_done(path)
+    except Exception as e:
+        with POSTPROCESS_LOCK:
+            POSTPROCESS_STATS['failed'] += 1
+        logger.error(f"视频后处理失败 {input_path}: {e}")
+
+
+def _result_loop():
+    """
+    结果线程：依次保存进程池完成的视频（哈希、媒体库、数据库写入），不占用进程池的管理线程。
+    """
+    while True:
+        future, input_path, on_done = RESULT_QUEUE.get()
+        try:
+            _handle_result(future, input_path, on_done)
+        finally:
+            RESULT_QUEUE.task_done()
+
+
+def _get_executor():
+    """
+    获取后处理进程池与结果线程，不存在则新建。
+
+    :return: (ProcessPoolExecutor 对象, 控制排队数量的信号量)。
+    """
+    global _executor, _slots, _result_thread
+
+    with POSTPROCESS_LOCK:
+        if _executor is None:
+            workers = int(media_setting['postprocess_workers']) or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _slots = threading.BoundedSemaphore(workers + int(media_setting['postprocess_queue_size']))
+            _result_thread = threading.Thread(target=_result_loop, daemon=True)
+            _result_thread.start()
+            logger.info(f"视频后处理进程池已启动（{workers} 个进程，最多排队 {media_setting['postprocess_queue_size']} 个任务）")
+
+    return _executor, _slots
+
+
+def submit_postprocess(input_path, output_path, output_args, on_done):
+    """
+    将下载完成的视频交给进程池做 ffmpeg 后处理，下载线程立即返回继续下一个下载；
+    排队任务达到上限时阻塞，避免下载远快于处理时临时文件无限堆积。
+
+    :param input_path: 输入文件路径（处理成功后删除）。
+    :param output_path: 输出文件路径。
+    :param output_args: ffmpeg 输出参数列表，为空时去除音频并输出 MP4（按 postprocess_mode 决定是否直接复制视频流）。
+    :param on_done: 处理成功后的回调，调用方式为 on_done(output_path)，在后处理模块的结果线程中执行。
+    """
+    executor, slots = _get_executor()
+    slots.acquire()
+
+    try:
+        if output_args is None:
+            future = executor.submit(strip_audio, input_path, output_path)
+        else:
+            future = executor.submit(run_ffmpeg, input_path, output_path, output_args)
+    except Exception:
+        slots.release()
+        raise
+
+    with POSTPROCESS_LOCK:
+        _futures.add(future)
+        POSTPROCESS_STATS['max_queue_depth'] = max(POSTPROCESS_STATS['max_queue_depth'], len(_futures))
+
+    def _on_done(f):
+        # 在进程池的管理线程中执行，只交给结果线程保存；先入队再移出未完成集合，wait_postprocess 不会漏等
+        slots.release()
+        RESULT_QUEUE.put((f, input_path, on_done))
+        with POSTPROCESS_LOCK:
+            _futures.discard(f)
+
+    future.add_done_callback(_on_done)
+
+
+def wait_postprocess():
+    """
+    等待全部后处理任务（包括结果线程中的回调）完成。
+    """
+    while True:
+        with POSTPROCESS_LOCK:
+            futures = list(_futures)
+        if not futures:
+            break
+        wait(futures)
+        time.sleep(0.01)  # 等待完成回调把任务交给结果线程并从未完成集合中移除
+
+    RESULT_QUEUE.join()
+
+
+def get_postprocess_stats():
+    """
+    获取后处理统计信息。
+
+    :return: 统计信息字典（jobs, copy_jobs, failed, cpu_seconds, max_cpu_seconds, wall_seconds, max_queue_depth, queue_depth）。
+    """
+    with POSTPROCESS_LOCK:
+        stats = dict(POSTPROCESS_STATS)
+        stats['queue_depth'] = len(_futures)
+
+    return stats
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Project Name: web_crawler
+File Created: 2026.10.18
+Author: ZhangYuetao
+File Name: ytdlp_engine.py
+Update: 2026.10.18
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from yt_dlp import YoutubeDL
+
+import config
+from logger import logger
+from .rate_limiter import throttle_bytes
+
+network_setting = config.load_config(config.NETWORK_SETTING_PATH, config.NETWORK_SETTING_DEFAULT_CONFIG)
+
+TEMP_DIR_NAME = '.ytdlp'  # 保存目录下存放未改名视频的子目录
+
+
+class YtdlpEngine:
+    """
+    可复用的 yt-dlp 下载引擎：每个工作线程持有一个长期存在的 YoutubeDL 实例（提取器、cookie 与连接只初始化一次），
+    多个视频并行下载，单个视频的分片也并发下载。
+
+    视频先按 提取器_视频ID 下载到保存目录下的 .ytdlp 子目录，正式文件名由调用方在下载完成后生成，
+    并发时索引与时间戳不会冲突。用法::
+
+        with utils.YtdlpEngine(ydl_opts, save_dir) as engine:
+            engine.run(urls, lambda url: download_one(url, engine))
+    """
+
+    def __init__(self, ydl_opts, save_dir, workers=None, concurrent_fragments=None):
+        """
+        :param ydl_opts: yt-dlp 参数（outtmpl 由引擎设置）。
+        :param save_dir: 保存目录。
+        :param workers: 并行下载的视频数量，默认读取网络配置。
+        :param concurrent_fragments: 单个视频并发下载的分片数量，默认读取网络配置。
+        """
+        self.workers = max(1, int(workers or network_setting['ytdlp_workers']))
+        self.temp_dir = os.path.join(save_dir, TEMP_DIR_NAME)
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+        self.ydl_opts = dict(ydl_opts)
+        self.ydl_opts['outtmpl'] = os.path.join(self.temp_dir, '%(extractor_key)s_%(id)s.%(ext)s')
+        self.ydl_opts['concurrent_fragment_downloads'] = max(1, int(concurrent_fragments or network_setting['ytdlp_concurrent_fragments']))
+        if self.workers > 1:
+            self.ydl_opts['noprogress'] = True  # 多个视频同时下载时进度条会互相覆盖
+        self.ydl_opts['progress_hooks'] = list(self.ydl_opts.get('progress_hooks', [])) + [self._count_bytes]
+
+        self._local = threading.local()
+        self._instances = []
+        self._instances_lock = threading.Lock()
+        self._downloaded = {}  # 文件名 -> 已统计的字节数
+        self._downloaded_lock = threading.Lock()
+
+    def _count_bytes(self, status):
+        """
+        下载进度回调：把新增的字节数计入流量统计，并按全局带宽上限等待（阻塞 yt-dlp 的下载线程）。
+
+        :param status: yt-dlp 的进度信息。
+        """
+        filename = status.get('filename')
+        downloaded = status.get('downloaded_bytes') or 0
+
+        with self._downloaded_lock:
+            delta = downloaded - self._downloaded.get(filename, 0)
+            if status.get('status') == 'finished':
+                self._downloaded.pop(filename, None)
+            elif delta > 0:
+                self._downloaded[filename] = downloaded
+
+        if delta > 0:
+            info = status.get('info_dict') or {}
+            throttle_bytes(info.get('url') or info.get('webpage_url') or '', delta, self.ydl_opts.get('proxy'))
+
+    def _get_ydl(self):
+        """
+        获取当前线程的 YoutubeDL 实例，不存在则新建（YoutubeDL 不是线程安全的，每个线程各用一个）。
+
+        :return: YoutubeDL 对象。
+        """
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = YoutubeDL(self.ydl_opts)
+            self._local.ydl = ydl
+            with self._instances_lock:
+                self._instances.append(ydl)
+
+        return ydl
+
+    def download(self, url):
+        """
+        在当前线程下载单个视频（包括后处理）。
+
+        :param url: 视频网页地址。
+        :return: 下载完成的临时文件路径。
+        """
+        return self.download_info(url)[0]
+
+    def download_info(self, url):
+        """
+        在当前线程下载单个视频（包括后处理），同时返回选中格式的信息（vcodec、acodec、height 等）。
+
+        :param url: 视频网页地址。
+        :return: (下载完成的临时文件路径, 视频信息字典)。
+        """
+        ydl = self._get_ydl()
+        info = ydl.extract_info(url, download=True)
+        if info.get('_type') == 'playlist':
+            info = next(entry for entry in info['entries'] if entry)
+
+        # 后处理（转换格式等）后的最终路径记录在 requested_downloads 中
+        downloads = info.get('requested_downloads') or [info]
+        file_path = downloads[-1].get('filepath') or ydl.prepare_filename(info)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"yt-dlp 未生成文件: {file_path}")
+
+        return file_path, info
+
+    def run(self, urls, func):
+        """
+        并行处理视频列表，同一 URL 只处理一次。
+
+        :param urls: 视频网页地址列表。
+        :param func: 处理函数，调用方式为 func(url)，在工作线程中执行并通常调用 download。
+        """
+        urls = list(dict.fromkeys(url for url in urls if url))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(func, url): url for url in urls}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"视频处理失败 {futures[future]}: {e}")
+
+    def close(self):
+        """
+        关闭全部 YoutubeDL 实例。
+        """
+        with self._instances_lock:
+            instances, self._instances = self._instances, []
+
+        for ydl in instances:
+            ydl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()